@@ -0,0 +1,100 @@
+import asyncio
+import concurrent.futures
+import time
+from typing import Callable, Optional
+
+from PpSpDevice import DMA_BUFFER_SIZE, open_device
+from QueueMsg import Mode
+from TransferEngine import TransferEngine, TransferResult
+
+_default_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+
+def default_executor(max_workers: int = 16) -> concurrent.futures.ThreadPoolExecutor:
+    # one bounded pool shared by all devices; START_TX blocks a worker until
+    # the interrupt arrives, so this bounds the number of transfers in flight
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pp_sp_io"
+        )
+    return _default_executor
+
+
+class AsyncDevice:
+    def __init__(
+        self,
+        engine: TransferEngine,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ):
+        self.engine = engine
+        self.name = engine.filename
+        self.executor = executor if executor is not None else default_executor()
+        # the card has a single DMA engine per interface and the transfer
+        # engine shares its DMA mirror, stager and register modules between
+        # transfers, so one operation per device at a time
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def open(
+        cls,
+        char_dev_filename: str,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> "AsyncDevice":
+        loop = asyncio.get_running_loop()
+        executor = executor if executor is not None else default_executor()
+        dev = await loop.run_in_executor(executor, open_device, char_dev_filename)
+        return cls(TransferEngine(dev), executor)
+
+    async def _run(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def transfer(self, mode: Mode, size_bytes: int) -> TransferResult:
+        return await self._run(self.engine.transfer, mode, size_bytes)
+
+    async def read_buffer(self, buf: Optional[bytearray] = None) -> bytearray:
+        if buf is None:
+            buf = bytearray(DMA_BUFFER_SIZE)
+        await self._run(self.engine.dev.get_buffer, buf)
+        return buf
+
+    async def write_buffer(self, buf: bytearray):
+        await self._run(self.engine.dev.set_buffer, buf)
+
+    async def poll(
+        self,
+        read_fn: Callable[[], int],
+        cond: Callable[[int], bool],
+        interval_s: float = 1e-3,
+        timeout_s: float = 1.0,
+    ) -> int:
+        # register reads are plain loads from BAR0, no need for the executor
+        deadline = time.monotonic() + timeout_s
+        while True:
+            val = read_fn()
+            if cond(val):
+                return val
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError(f"{self.name}: poll timed out")
+            await asyncio.sleep(interval_s)
+
+    async def wait_gen_idle(self, **kwargs) -> int:
+        return await self.poll(
+            lambda: self.engine.st_gen.get_state()[0],
+            lambda state: state == 0,
+            **kwargs,
+        )
+
+    async def get_check_stats(self):
+        return self.engine.st_check.get_stats()
+
+    def close(self):
+        self.engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
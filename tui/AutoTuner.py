@@ -0,0 +1,136 @@
+import dataclasses
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from QueueMsg import TRANSFER_SIZE_MAX, TRANSFER_SIZE_MIN, Mode
+from TransferEngine import TransferEngine
+
+# two-sided 95 % normal quantile
+Z_95 = 1.96
+
+
+@dataclasses.dataclass
+class TunePoint:
+    size_bytes: int
+    iterations: int
+    throughput_mean_mbps: float
+    throughput_median_mbps: float
+    # half width of the 95 % confidence interval of the mean
+    throughput_ci_mbps: float
+
+
+@dataclasses.dataclass
+class TuneResult:
+    mode: str
+    target_mbps: float
+    # smallest size whose mean throughput reaches the target, None if the
+    # largest transfer size does not reach it
+    min_size_bytes: Optional[int]
+    # end of the steep part of the throughput curve over log2(size)
+    knee_size_bytes: int
+    points: List[TunePoint]
+
+
+class AutoTuner:
+    # Measures each size with repetitions in batches until the confidence
+    # interval of the mean throughput is within rel_ci of the mean, sweeps
+    # powers of two to bracket the target and bisects inside the bracket.
+
+    def __init__(
+        self,
+        engine: TransferEngine,
+        rel_ci: float = 0.01,
+        batch: int = 16,
+        max_iters: int = 1024,
+        align: int = TRANSFER_SIZE_MIN,
+        size_min: int = TRANSFER_SIZE_MIN,
+        size_max: int = TRANSFER_SIZE_MAX,
+    ):
+        # the DMA engine moves whole 32-bit words
+        if align <= 0 or align % 4:
+            raise ValueError("align must be a positive multiple of 4")
+        if size_min <= 0 or size_min % 4:
+            raise ValueError("size_min must be a positive multiple of 4")
+        if size_min > size_max:
+            raise ValueError("size_min must not exceed size_max")
+        self.engine = engine
+        self.rel_ci = rel_ci
+        self.batch = batch
+        self.max_iters = max_iters
+        self.align = align
+        self.size_min = size_min
+        self.size_max = size_max
+        self._points: Dict[Tuple[Mode, int], TunePoint] = {}
+
+    def measure(self, mode: Mode, size_bytes: int) -> TunePoint:
+        try:
+            return self._points[(mode, size_bytes)]
+        except KeyError:
+            pass
+
+        durations = np.empty(self.max_iters, dtype=np.float64)
+        n = 0
+        while n < self.max_iters:
+            for _ in range(min(self.batch, self.max_iters - n)):
+                durations[n] = self.engine.transfer(mode, size_bytes).duration_ns
+                n += 1
+            tp = size_bytes * 1e3 / durations[:n]
+            mean = float(np.mean(tp))
+            ci = Z_95 * float(np.std(tp, ddof=1)) / math.sqrt(n)
+            if ci <= self.rel_ci * mean:
+                break
+
+        point = TunePoint(size_bytes, n, mean, float(np.median(tp)), ci)
+        self._points[(mode, size_bytes)] = point
+        return point
+
+    def tune(self, mode: Mode, target_mbps: float) -> TuneResult:
+        self._points = {}
+
+        size = self.size_min
+        lo = hi = None
+        while size <= self.size_max:
+            if self.measure(mode, size).throughput_mean_mbps >= target_mbps:
+                hi = size
+                break
+            lo = size
+            size *= 2
+
+        if hi is not None and lo is not None:
+            # invariant: lo misses the target, hi reaches it
+            while hi - lo > self.align:
+                mid = (lo + hi) // 2 // self.align * self.align
+                if mid <= lo:
+                    break
+                if self.measure(mode, mid).throughput_mean_mbps >= target_mbps:
+                    hi = mid
+                else:
+                    lo = mid
+
+        # the knee needs the whole curve, complete the power-of-two sweep
+        while size <= self.size_max:
+            self.measure(mode, size)
+            size *= 2
+
+        points = sorted(self._points.values(), key=lambda p: p.size_bytes)
+        return TuneResult(
+            mode=mode.name,
+            target_mbps=target_mbps,
+            min_size_bytes=hi,
+            knee_size_bytes=find_knee(points),
+            points=points,
+        )
+
+
+def find_knee(points: List[TunePoint]) -> int:
+    # Kneedle: normalize throughput over log2(size) to the unit square and
+    # take the point furthest above the chord between the end points
+    x = np.log2([p.size_bytes for p in points])
+    y = np.array([p.throughput_mean_mbps for p in points])
+    if len(points) < 3 or x[-1] == x[0] or y[-1] == y[0]:
+        return points[-1].size_bytes
+    xn = (x - x[0]) / (x[-1] - x[0])
+    yn = (y - y[0]) / (y[-1] - y[0])
+    return points[int(np.argmax(yn - xn))].size_bytes
@@ -0,0 +1,222 @@
+import dataclasses
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from QueueMsg import Mode
+from Recorder import MAGIC, Recording
+
+# samples kept per (mode, size) in a saved baseline
+SAMPLES_MAX = 20000
+# samples resampled per group and bootstrap replicates for the median CI
+BOOTSTRAP_SAMPLES_MAX = 4000
+BOOTSTRAP_REPS = 2000
+
+Key = Tuple[str, int]
+
+
+@dataclasses.dataclass
+class Comparison:
+    mode: str
+    size_bytes: int
+    n_baseline: int
+    n_new: int
+    baseline_median_mbps: float
+    new_median_mbps: float
+    # relative change of the median throughput and its bootstrap CI
+    change: float
+    change_ci_low: float
+    change_ci_high: float
+    # two-sided rank test, and adjusted for the number of groups compared
+    p_value: float
+    p_adjusted: float
+    # Cliff's delta, P(new > baseline) - P(new < baseline), -1 to 1
+    cliffs_delta: float
+    verdict: str = "unchanged"
+
+
+def rank_test(baseline: np.ndarray, new: np.ndarray) -> Tuple[float, float]:
+    # Mann-Whitney U with tie correction and the normal approximation, the
+    # per-group sample counts are far beyond what exact tables cover.
+    # Returns the two-sided p-value and Cliff's delta.
+    n1, n2 = len(baseline), len(new)
+    n = n1 + n2
+    x = np.concatenate((baseline, new))
+    order = np.argsort(x, kind="stable")
+    xs = x[order]
+
+    # ties share the mean of the 1-based ranks they span
+    starts = np.flatnonzero(np.r_[True, xs[1:] != xs[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    ranks = np.empty(n, dtype=np.float64)
+    ranks[order] = np.repeat(starts + (counts + 1) / 2, counts)
+
+    u_new = ranks[n1:].sum() - n2 * (n2 + 1) / 2
+    delta = float(2 * u_new / (n1 * n2) - 1)
+
+    ties = float(np.sum(counts.astype(np.float64) ** 3 - counts))
+    var = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if var <= 0:
+        return 1.0, delta
+    # continuity correction towards the mean
+    diff = u_new - n1 * n2 / 2
+    z = max(abs(diff) - 0.5, 0.0) / math.sqrt(var)
+    return math.erfc(z / math.sqrt(2)), delta
+
+
+def bootstrap_change(
+    baseline: np.ndarray,
+    new: np.ndarray,
+    rng: np.random.Generator,
+    confidence: float = 0.95,
+) -> Tuple[float, float]:
+    # percentile CI of median(new) / median(baseline) - 1
+    if len(baseline) > BOOTSTRAP_SAMPLES_MAX:
+        baseline = rng.choice(baseline, BOOTSTRAP_SAMPLES_MAX, replace=False)
+    if len(new) > BOOTSTRAP_SAMPLES_MAX:
+        new = rng.choice(new, BOOTSTRAP_SAMPLES_MAX, replace=False)
+
+    changes = np.empty(BOOTSTRAP_REPS, dtype=np.float64)
+    batch = 200
+    for i in range(0, BOOTSTRAP_REPS, batch):
+        m = min(batch, BOOTSTRAP_REPS - i)
+        b = np.median(rng.choice(baseline, (m, len(baseline))), axis=1)
+        c = np.median(rng.choice(new, (m, len(new))), axis=1)
+        changes[i : i + m] = c / b - 1
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(changes, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def effect_size_label(delta: float) -> str:
+    # conventional thresholds for |Cliff's delta| (Romano et al. 2006)
+    d = abs(delta)
+    if d < 0.147:
+        return "negligible"
+    elif d < 0.33:
+        return "small"
+    elif d < 0.474:
+        return "medium"
+    return "large"
+
+
+def holm(p_values: List[float]) -> List[float]:
+    # Holm-Bonferroni adjusted p-values, monotone in the sorted order
+    m = len(p_values)
+    adjusted = [0.0] * m
+    running = 0.0
+    for rank, idx in enumerate(sorted(range(m), key=lambda i: p_values[i])):
+        running = max(running, min(1.0, (m - rank) * p_values[idx]))
+        adjusted[idx] = running
+    return adjusted
+
+
+class Baseline:
+    # Per-transfer throughput samples per (mode, size), pooled over the
+    # interfaces and recordings they came from. Saved as a compressed .npz
+    # with at most SAMPLES_MAX samples per group, drawn at random so the
+    # distribution is kept and not just the start of a run.
+
+    def __init__(self, samples: Dict[Key, np.ndarray], metadata: Optional[dict] = None):
+        self.samples = samples
+        self.metadata = metadata or {}
+
+    @classmethod
+    def from_recordings(
+        cls, filenames: List[str], interface: Optional[int] = None
+    ) -> "Baseline":
+        parts: Dict[Key, List[np.ndarray]] = {}
+        sources = []
+        for filename in filenames:
+            recording = Recording(filename)
+            r = recording.records
+            if interface is not None:
+                r = r[r["interface"] == interface]
+            throughput = recording.throughput_mbps(r)
+            keys = np.stack([r["mode"], r["size_bytes"]]).astype(np.int64)
+            for mode, size in np.unique(keys, axis=1).T:
+                sel = (keys[0] == mode) & (keys[1] == size)
+                key = (Mode(int(mode)).name, int(size))
+                parts.setdefault(key, []).append(throughput[sel])
+            sources.append({"filename": filename, "metadata": recording.metadata})
+
+        samples = {k: np.concatenate(v) for k, v in parts.items()}
+        return cls(samples, {"sources": sources, "interface": interface})
+
+    @classmethod
+    def load(cls, filename: str, interface: Optional[int] = None) -> "Baseline":
+        # a saved baseline or a recording
+        with open(filename, "rb") as f:
+            is_recording = f.read(len(MAGIC)) == MAGIC
+        if is_recording:
+            return cls.from_recordings([filename], interface)
+
+        with np.load(filename) as npz:
+            metadata = json.loads(str(npz["metadata"]))
+            samples = {}
+            for name in npz.files:
+                if name == "metadata":
+                    continue
+                mode, _, size = name.partition("_")
+                samples[(mode, int(size))] = npz[name]
+        return cls(samples, metadata)
+
+    def save(self, filename: str, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        arrays = {}
+        for (mode, size), tp in self.samples.items():
+            if len(tp) > SAMPLES_MAX:
+                tp = rng.choice(tp, SAMPLES_MAX, replace=False)
+            arrays[f"{mode}_{size}"] = tp.astype(np.float64)
+        # np.savez appends .npz to other names, write through a file object
+        with open(filename, "wb") as f:
+            np.savez_compressed(f, metadata=json.dumps(self.metadata), **arrays)
+
+    def compare(
+        self,
+        new: "Baseline",
+        alpha: float = 0.01,
+        min_change: float = 0.01,
+        seed: int = 0,
+    ) -> List[Comparison]:
+        # A group regresses if the rank test is significant after the Holm
+        # correction over all groups and the whole CI of the median change
+        # lies below -min_change, so noise and negligible shifts both pass.
+        rng = np.random.default_rng(seed)
+        keys = sorted(set(self.samples) & set(new.samples))
+        rows = []
+        for mode, size in keys:
+            base = self.samples[(mode, size)].astype(np.float64)
+            cur = new.samples[(mode, size)].astype(np.float64)
+            if len(base) < 2 or len(cur) < 2:
+                continue
+            p, delta = rank_test(base, cur)
+            low, high = bootstrap_change(base, cur, rng)
+            base_median = float(np.median(base))
+            new_median = float(np.median(cur))
+            rows.append(
+                Comparison(
+                    mode=mode,
+                    size_bytes=size,
+                    n_baseline=len(base),
+                    n_new=len(cur),
+                    baseline_median_mbps=base_median,
+                    new_median_mbps=new_median,
+                    change=new_median / base_median - 1,
+                    change_ci_low=low,
+                    change_ci_high=high,
+                    p_value=p,
+                    p_adjusted=p,
+                    cliffs_delta=delta,
+                )
+            )
+
+        for row, p_adj in zip(rows, holm([row.p_value for row in rows])):
+            row.p_adjusted = p_adj
+            if p_adj < alpha and row.change_ci_high < -min_change:
+                row.verdict = "regression"
+            elif p_adj < alpha and row.change_ci_low > min_change:
+                row.verdict = "improvement"
+        return rows
@@ -1,32 +1,117 @@
 import curses
+import dataclasses
 import datetime
 import queue
+import selectors
+import sys
 import time
-from typing import Optional
+from typing import List, Optional
 
-from GuiElements import Bar, MessagePane, RadioList, TransferSizeSel
-from QueueMsg import Mode, MsgCmd, MsgResp
+from GuiElements import Bar, HistoryChart, MessagePane, RadioList, TransferSizeSel
+from QueueMsg import Mode, MsgCmd, MsgResp, RespChannel
+from PcieLinkModel import PcieLinkModel
 from PcieStats import PcieStatsResult
+from ThroughputHistory import ThroughputHistory
+from Wakeup import Wakeup
+
+
+# subsystem device IDs of the two x8 interfaces of the x16 card
+LANES_LABELS = {0x1: "PCIe lanes 0 - 7", 0x2: "PCIe lanes 8 - 15"}
+
+PANEL_H = 22
+PANEL_MIN_W = 36
+MSG_PANE_MIN_H = 5
+HISTORY_H = 10
+
+
+@dataclasses.dataclass
+class Interface:
+    char_dev_filename: str
+    pcie_stats: PcieStatsResult
+    cmd_queue: queue.Queue
+    resp_queue: RespChannel
+
+
+class InterfacePanel:
+    def __init__(self, stdscr, idx: int, iface: Interface, y0: int, x0: int, w: int):
+        self.idx = idx
+        self.iface = iface
+
+        s = f"Interface #{idx}"
+        stdscr.addstr(y0, x0 + w // 2 - len(s) // 2, s, curses.A_BOLD)
+
+        subsys = iface.pcie_stats.subsystem_device
+        s = LANES_LABELS.get(subsys, f"Subsystem device 0x{subsys:x}")
+        stdscr.addstr(y0 + 1, x0 + w // 2 - len(s) // 2, s)
+
+        stdscr.addstr(y0 + 3, x0 + 3, "Read speed, % of ceiling:")
+        # full scale is the protocol ceiling of each direction, not the line rate
+        link_model = PcieLinkModel.from_stats(iface.pcie_stats)
+        bar_max_val = link_model.ceiling_MBps(Mode.READ)
+        self.bar_read = Bar(4, w - 4, y0 + 4, x0 + 2, max_val=bar_max_val)
+
+        stdscr.addstr(y0 + 8, x0 + 3, "Write speed, % of ceiling:")
+        bar_max_val = link_model.ceiling_MBps(Mode.WRITE)
+        self.bar_write = Bar(4, w - 4, y0 + 9, x0 + 2, max_val=bar_max_val)
+
+        stdscr.addstr(y0 + 13, x0 + 3, "Mode:")
+        self.radio = RadioList(6, 14, y0 + 14, x0 + 2)
+        stdscr.addstr(y0 + 13, x0 + 21, "Tr. size:")
+        self.ts = TransferSizeSel(3, 12, y0 + 14, x0 + 20)
+
+        s = f"Filename: {iface.char_dev_filename}"
+        stdscr.addstr(y0 + 20, x0 + 2, s[: w - 3])
+        pcie_stats = iface.pcie_stats
+        s = (
+            f"Link width = {pcie_stats.link_width}, speed = {pcie_stats.link_speed}, "
+            f"MPS = {pcie_stats.max_payload}, MRRS = {pcie_stats.max_read_req}"
+        )
+        stdscr.addstr(y0 + 21, x0 + 2, s[: w - 3])
+
+        self.controls = [self.radio, self.ts]
+        self.widgets = [self.bar_read, self.bar_write] + self.controls
+
+        self.history_read = ThroughputHistory()
+        self.history_write = ThroughputHistory()
+        self.last_cmd = None
+
+    def add_sample(self, resp: MsgResp):
+        # zero is reported for the direction not in use, keep it out of the
+        # statistics and the history so idle stretches show as gaps and not
+        # as dips
+        if resp.read_throughput > 0:
+            self.bar_read.add_sample(resp.read_throughput)
+            self.history_read.add(resp.read_throughput)
+        if resp.write_throughput > 0:
+            self.bar_write.add_sample(resp.write_throughput)
+            self.history_write.add(resp.write_throughput)
+
+    def show_latest(self, resp: MsgResp):
+        self.bar_read.set_value(resp.read_throughput)
+        self.bar_write.set_value(resp.write_throughput)
+
+    def send_cmd(self):
+        mode = Mode(self.radio.sel)
+        # the bar statistics describe one mode and size, like the IoThread's
+        if (mode, self.ts.size) != self.last_cmd:
+            self.last_cmd = (mode, self.ts.size)
+            self.bar_read.reset_stats()
+            self.bar_write.reset_stats()
+        self.iface.cmd_queue.put(MsgCmd(False, self.ts.size, mode))
 
 
 class Gui:
     def __init__(
         self,
         stdscr,
-        char_dev_filename0: Optional[str],
-        pcie_stats0: Optional[PcieStatsResult],
-        cmd_queue0: Optional[queue.Queue],
-        resp_queue0: Optional[queue.Queue],
-        char_dev_filename1: Optional[str],
-        pcie_stats1: Optional[PcieStatsResult],
-        cmd_queue1: Optional[queue.Queue],
-        resp_queue1: Optional[queue.Queue],
+        interfaces: List[Interface],
+        wakeup: Optional[Wakeup] = None,
+        max_fps: float = 30.0,
     ):
         self.stdscr = stdscr
-        self.cmd_queue0 = cmd_queue0
-        self.resp_queue0 = resp_queue0
-        self.cmd_queue1 = cmd_queue1
-        self.resp_queue1 = resp_queue1
+        self.wakeup = wakeup
+        self.max_fps = max_fps
+        self.interfaces = interfaces
 
         curses.noecho()
         curses.cbreak()
@@ -50,143 +135,154 @@ class Gui:
             curses.A_BOLD | curses.color_pair(3),
         )
 
-        for posy in range(3, 25):
-            self.stdscr.addstr(posy, w // 2, "|")
+        # panels are laid out in a grid, as many as fit above the log pane
+        ncols = max(1, min(len(interfaces), w // PANEL_MIN_W))
+        max_rows = max(1, (h - 4 - MSG_PANE_MIN_H - 2) // PANEL_H)
+        nrows = min(max_rows, (len(interfaces) + ncols - 1) // ncols)
+        panel_w = w // ncols
 
-        # ====================================================================
-        s = "Interface #0"
-        self.stdscr.addstr(3, w // 4 - len(s) // 2, s, curses.A_BOLD)
+        self.panels = []
+        self.controls = []
+        self.widgets = []
 
-        s = "PCIe lanes 0 - 7"
-        self.stdscr.addstr(4, w // 4 - len(s) // 2, s)
+        for idx, iface in enumerate(interfaces[: nrows * ncols]):
+            y0 = 3 + (idx // ncols) * PANEL_H
+            x0 = (idx % ncols) * panel_w
+            if x0 > 0:
+                for posy in range(y0, y0 + PANEL_H):
+                    self.stdscr.addstr(posy, x0, "|")
+            panel = InterfacePanel(self.stdscr, idx, iface, y0, x0, panel_w)
+            self.panels.append(panel)
+            self.controls += panel.controls
+            self.widgets += panel.widgets
 
-        self.controls = []
+        self.controls_sel = 0
+        self.controls[self.controls_sel].set_highlight(True)
+
+        msg_pane_y = 3 + nrows * PANEL_H + 1
+
+        # throughput history above the log pane, if there is room for both
+        self.history = None
+        if h - msg_pane_y - 1 >= HISTORY_H + MSG_PANE_MIN_H:
+            views = []
+            for panel in self.panels:
+                views.append((f"if{panel.idx} read", panel.history_read))
+                views.append((f"if{panel.idx} write", panel.history_write))
+            self.history = HistoryChart(HISTORY_H, w - 4, msg_pane_y, 2, views)
+            self.widgets.append(self.history)
+            msg_pane_y += HISTORY_H
+
+        self.msg_pane = MessagePane(h - msg_pane_y - 1, w - 4, msg_pane_y, 2)
+        self.msg_pane_title = "Log messages"
+        self.msg_pane.set_title(self.msg_pane_title)
+        self.widgets.append(self.msg_pane)
 
-        if char_dev_filename0 is not None:
-            self.stdscr.addstr(6, 3, "Read speed:")
-            self.stdscr.refresh()
-            bar_max_val = int(pcie_stats0.max_speed_GBps * 1000)
-            self.bar_left_read = Bar(4, w // 2 - 4, 7, 2, max_val=bar_max_val)
-
-            self.stdscr.refresh()
-            self.stdscr.addstr(11, 3, "Write speed:")
-            self.bar_left_write = Bar(4, w // 2 - 4, 12, 2, max_val=bar_max_val)
-
-            self.stdscr.addstr(16, 3, "Mode:")
-            self.radio_left = RadioList(5, 14, 17, 2)
-            self.stdscr.addstr(16, 21, "Tr. size:")
-            self.ts_left = TransferSizeSel(3, 12, 17, 20)
-
-            self.controls.append(self.radio_left)
-            self.controls.append(self.ts_left)
-
-            self.stdscr.addstr(23, 2, f"Filename: {char_dev_filename0}")
-            status_str = f"Link width = {pcie_stats0.link_width}, speed = {pcie_stats0.link_speed}"
-            self.stdscr.addstr(24, 2, status_str)
-
-        # ====================================================================
-        s = "Interface #1"
-        self.stdscr.addstr(3, w // 2 + w // 4 - len(s) // 2, s, curses.A_BOLD)
-
-        s = "PCIe lanes 8 - 15"
-        self.stdscr.addstr(4, w // 2 + w // 4 - len(s) // 2, s)
-
-        if char_dev_filename1 is not None:
-            self.stdscr.addstr(6, w // 2 + 3, "Read speed:")
-            self.stdscr.refresh()
-            bar_max_val = int(pcie_stats1.max_speed_GBps * 1000)
-            self.bar_right_read = Bar(4, w // 2 - 4, 7, w // 2 + 2, max_val=bar_max_val)
-
-            self.stdscr.refresh()
-            self.stdscr.addstr(11, w // 2 + 3, "Write speed:")
-            self.bar_right_write = Bar(
-                4, w // 2 - 4, 12, w // 2 + 2, max_val=bar_max_val
+        nr_hidden = len(interfaces) - len(self.panels)
+        if nr_hidden:
+            self.msg_pane.append_msg(
+                f"{nr_hidden} interface(s) do not fit on the screen and stay idle"
             )
 
-            self.stdscr.addstr(16, w // 2 + 3, "Mode:")
-            self.radio_right = RadioList(5, 14, 17, w // 2 + 2)
-            self.stdscr.addstr(16, w // 2 + 21, "Tr. size:")
-            self.ts_right = TransferSizeSel(3, 12, 17, w // 2 + 20)
+        # static labels are drawn once, below all widgets
+        self.stdscr.noutrefresh()
+        self.render()
 
-            self.controls.append(self.radio_right)
-            self.controls.append(self.ts_right)
+    def render(self):
+        for widget in self.widgets:
+            widget.draw()
+        curses.doupdate()
 
-            self.stdscr.addstr(23, w // 2 + 2, f"Filename: {char_dev_filename1}")
-            status_str = f"Link width = {pcie_stats1.link_width}, speed = {pcie_stats1.link_speed}"
-            self.stdscr.addstr(24, w // 2 + 2, status_str)
+    def _handle_resp(self, resp: MsgResp, panel: InterfacePanel):
+        panel.add_sample(resp)
+        dt_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        self.msg_pane.append_msg(f"[{dt_str}] if{panel.idx}: {resp.msg}")
+        if resp.detail is not None:
+            self.msg_pane.append_msg(f"[{dt_str}] if{panel.idx}: {resp.detail}")
 
-        # ====================================================================
+    def _process_responses(self):
+        title = "Log messages"
+        for panel in self.panels:
+            resp_queue = panel.iface.resp_queue
+            latest = resp_queue.take_latest()
+            for resp in resp_queue.drain_samples():
+                self._handle_resp(resp, panel)
+            if latest is not None:
+                panel.show_latest(latest)
+            if resp_queue.nr_overrun:
+                title += f" | if{panel.idx}: {resp_queue.nr_overrun} dropped"
 
-        self.controls_sel = 0
-        self.controls[self.controls_sel].set_highlight(True)
-        self.controls[self.controls_sel].refresh()
+        # a live chart moves with time
+        if self.history is not None and self.history.t_end is None:
+            self.history.refresh()
 
-        self.msg_pane = MessagePane(h - 27, w - 4, 26, 2)
-        self.msg_pane.set_title("Log messages")
-        self.msg_pane.refresh()
+        if title != self.msg_pane_title:
+            self.msg_pane_title = title
+            self.msg_pane.set_title(title)
+
+    def _handle_key(self, char):
+        if self.history is not None and self.history.cmd(char):
+            return
+        if char == curses.KEY_RIGHT and self.controls_sel < len(self.controls) - 1:
+            self.controls[self.controls_sel].set_highlight(False)
+            self.controls_sel += 1
+            self.controls[self.controls_sel].set_highlight(True)
+        elif char == curses.KEY_LEFT and self.controls_sel > 0:
+            self.controls[self.controls_sel].set_highlight(False)
+            self.controls_sel -= 1
+            self.controls[self.controls_sel].set_highlight(True)
+        elif char in (
+            curses.KEY_UP,
+            curses.KEY_DOWN,
+            curses.KEY_ENTER,
+            ord("\n"),
+        ):
+            self.controls[self.controls_sel].cmd(char)
+            for panel in self.panels:
+                panel.send_cmd()
 
     def run(self):
+        # Sleep in select() until a key is pressed or an I/O thread signals a
+        # new response. Responses are drained at most max_fps times a second,
+        # without a wakeup fd the channels are polled at that rate instead.
         self.stdscr.nodelay(1)
+        sel = selectors.DefaultSelector()
+        sel.register(sys.stdin, selectors.EVENT_READ)
+        if self.wakeup is not None:
+            sel.register(self.wakeup, selectors.EVENT_READ)
+
+        frame_period = 1 / self.max_fps
+        next_frame = 0.0
+        resp_pending = True
+
         while True:
             try:
-                char = self.stdscr.getch()
-                if char == -1:
-                    if self.resp_queue0 is not None:
-                        try:
-                            resp: MsgResp = self.resp_queue0.get_nowait()
-                            self.bar_left_read.set_value(resp.read_throughput)
-                            self.bar_left_write.set_value(resp.write_throughput)
-                            dt_str = datetime.datetime.now().strftime(
-                                "%Y-%m-%d %H:%M:%S.%f"
-                            )
-                            self.msg_pane.append_msg(f"[{dt_str}] if0: {resp.msg}")
-                        except queue.Empty:
-                            pass
-
-                    if self.resp_queue1 is not None:
-                        try:
-                            resp: MsgResp = self.resp_queue1.get_nowait()
-                            self.bar_right_read.set_value(resp.read_throughput)
-                            self.bar_right_write.set_value(resp.write_throughput)
-                            dt_str = datetime.datetime.now().strftime(
-                                "%Y-%m-%d %H:%M:%S.%f"
-                            )
-                            self.msg_pane.append_msg(f"[{dt_str}] if1: {resp.msg}")
-                        except queue.Empty:
-                            pass
-                    # time.sleep(0.01)
-                elif (
-                    char == curses.KEY_RIGHT
-                    and self.controls_sel < len(self.controls) - 1
-                ):
-                    self.controls[self.controls_sel].set_highlight(False)
-                    self.controls[self.controls_sel].refresh()
-                    self.controls_sel += 1
-                    self.controls[self.controls_sel].set_highlight(True)
-                    self.controls[self.controls_sel].refresh()
-                elif char == curses.KEY_LEFT and self.controls_sel > 0:
-                    self.controls[self.controls_sel].set_highlight(False)
-                    self.controls[self.controls_sel].refresh()
-                    self.controls_sel -= 1
-                    self.controls[self.controls_sel].set_highlight(True)
-                    self.controls[self.controls_sel].refresh()
-                elif char in (
-                    curses.KEY_UP,
-                    curses.KEY_DOWN,
-                    curses.KEY_ENTER,
-                    ord("\n"),
-                ):
-                    self.controls[self.controls_sel].cmd(char)
-                    self.controls[self.controls_sel].refresh()
-                    if self.cmd_queue0 is not None:
-                        mode = Mode(self.radio_left.sel)
-                        self.cmd_queue0.put(MsgCmd(False, self.ts_left.size, mode))
-                    if self.cmd_queue1 is not None:
-                        mode = Mode(self.radio_right.sel)
-                        self.cmd_queue1.put(MsgCmd(False, self.ts_right.size, mode))
+                if resp_pending:
+                    timeout = max(0.0, next_frame - time.monotonic())
+                else:
+                    timeout = None if self.wakeup is not None else frame_period
+
+                for key, _ in sel.select(timeout):
+                    if key.fileobj is self.wakeup:
+                        self.wakeup.drain()
+                        resp_pending = True
+                    else:
+                        while True:
+                            char = self.stdscr.getch()
+                            if char == -1:
+                                break
+                            self._handle_key(char)
+                        self.render()
+
+                if self.wakeup is None:
+                    resp_pending = True
+
+                now = time.monotonic()
+                if resp_pending and now >= next_frame:
+                    resp_pending = False
+                    next_frame = now + frame_period
+                    self._process_responses()
+                    self.render()
             except KeyboardInterrupt:
-                if self.cmd_queue0 is not None:
-                    self.cmd_queue0.put(MsgCmd(True, None, None))
-                if self.cmd_queue1 is not None:
-                    self.cmd_queue1.put(MsgCmd(True, None, None))
+                for iface in self.interfaces:
+                    iface.cmd_queue.put(MsgCmd(True, None, None))
                 break
@@ -1,93 +1,231 @@
+import collections
 import curses
+import time
 from abc import ABC, abstractmethod
+from typing import List, Tuple
 
 import numpy as np
 
+from QueueMsg import TRANSFER_SIZE_MAX, TRANSFER_SIZE_MIN
+from StreamStats import StreamStats
+from ThroughputHistory import ThroughputHistory
+
+
+class Widget(ABC):
+    # Widgets only mark themselves dirty in refresh(); draw() stages the dirty
+    # ones with noutrefresh() and the owner flushes a frame with doupdate().
 
-class MessagePane:
     def __init__(self, nlines: int, ncols: int, begin_y: int, begin_x: int):
-        self.lines = []  # str(idx) * 10 for idx in range(nlines - 2)]
+        self.win = curses.newwin(nlines, ncols, begin_y, begin_x)
+        self.dirty = True
+
+    def refresh(self):
+        self.dirty = True
+
+    def draw(self):
+        if not self.dirty:
+            return
+        self._draw()
+        self.win.noutrefresh()
+        self.dirty = False
+
+    @abstractmethod
+    def _draw(self):
+        ...
+
+
+class MessagePane(Widget):
+    def __init__(self, nlines: int, ncols: int, begin_y: int, begin_x: int):
+        super().__init__(nlines, ncols, begin_y, begin_x)
+        self.lines = collections.deque(maxlen=nlines - 2)
         self.nlines = nlines
+        self.title = ""
 
-        self.win = curses.newwin(nlines, ncols, begin_y, begin_x)
         self.win.border()
         self.win.bkgd(" ", curses.color_pair(1))
-        self.win.refresh()
 
     def set_title(self, title):
-        title = " " + title + " "
-        h, w = self.win.getmaxyx()
-        self.win.addstr(0, w // 2 - len(title) // 2, title, curses.A_BOLD)
-        self.win.refresh()
+        self.title = " " + title + " "
+        self.win.border()
+        self.refresh()
 
-    def refresh(self):
+    def _draw(self):
         h, w = self.win.getmaxyx()
 
-        for idx, line in enumerate(self.lines):
-            self.win.addstr(1 + idx, 1, line.ljust(w - 2))
+        if self.title:
+            x = w // 2 - len(self.title) // 2
+            self.win.addstr(0, x, self.title, curses.A_BOLD)
 
-        self.win.refresh()
+        for idx, line in enumerate(self.lines):
+            self.win.addstr(1 + idx, 1, line[: w - 2].ljust(w - 2))
 
     def append_msg(self, msg):
         self.lines.append(msg)
-        if len(self.lines) > self.nlines - 2:
-            del self.lines[0]
         self.refresh()
 
 
-class Bar:
+class Bar(Widget):
     def __init__(
         self, nlines: int, ncols: int, begin_y: int, begin_x: int, max_val: float
     ):
+        super().__init__(nlines, ncols, begin_y, begin_x)
         self.txt = ""
         self.fill_perc = 0
         self.max_val = max_val
-        self.prev_vals = []
-        self.stats_txt = ""
+        self.stats = StreamStats(window=100, hist_min=0.1, hist_max=1e6)
 
-        self.win = curses.newwin(nlines, ncols, begin_y, begin_x)
         self.win.border()
         self.win.bkgd(" ", curses.color_pair(2) | curses.A_BOLD)
-        self.win.refresh()
-        self.refresh()
 
     def set_value(self, val: float):
-        self.txt = f" {val:8.2f} MB/s"
         self.fill_perc = val * 100 / self.max_val
-        self.prev_vals.append(val)
-        if len(self.prev_vals) > 100:
-            del self.prev_vals[0]
-
-        prev_vals_np = np.array(self.prev_vals)
-        stats_min = np.min(prev_vals_np)
-        stats_max = np.max(prev_vals_np)
-        stats_mean = np.mean(prev_vals_np)
-
-        self.stats_txt = (
-            f"{stats_min:7.2f} MB/s | {stats_mean:7.2f} MB/s | {stats_max:7.2f} MB/s"
-        )
-        val_min = np.min(self.prev_vals)
+        self.txt = f" {val:8.2f} MB/s {self.fill_perc:5.1f} %"
         self.refresh()
 
-    def refresh(self):
+    def add_sample(self, val: float):
+        self.stats.update(val)
+        self.refresh()
+
+    def reset_stats(self):
+        self.stats.reset()
+        self.refresh()
+
+    def _draw(self):
         h, w = self.win.getmaxyx()
-        w_fill = int((w - 2) * self.fill_perc / 100)
+        w_fill = min(int((w - 2) * self.fill_perc / 100), w - 2)
 
         txt = self.txt.ljust(w - 2)
         self.win.addstr(1, 1, txt[:w_fill], curses.color_pair(6))
-        self.win.addstr(1, 1 + w_fill, txt[w_fill:], curses.color_pair(2))
+        self.win.addstr(1, 1 + w_fill, txt[w_fill : w - 2], curses.color_pair(2))
+
+        stats_txt = ""
+        if self.stats.count:
+            # low percentiles of the throughput are the slow tail, they come
+            # first and the window statistics only as far as the width allows
+            p1, p50 = self.stats.percentiles(1, 50)
+            parts = [
+                f"p50 {p50:.1f}",
+                f"p1 {p1:.1f}",
+                f"min {self.stats.window_min:.1f}",
+                f"mean {self.stats.window_mean:.1f}",
+                f"max {self.stats.window_max:.1f}",
+            ]
+            for part in parts:
+                s = f"{stats_txt}  {part}" if stats_txt else part
+                if len(s) > w - 2:
+                    break
+                stats_txt = s
+        self.win.addstr(2, 1, stats_txt.ljust(w - 2))
+
+
+class HistoryChart(Widget):
+    # Throughput over time of one of several histories. Each column is the
+    # min/max/mean of its time slice: '#' up to the minimum, '|' from there
+    # to the maximum and '-' at the mean, so a short dip shows as a notch in
+    # the '#' area however far out the chart is zoomed. The drawing reads
+    # one value set per column, its cost depends on the width only.
+
+    SPANS_S = [10, 30, 60, 300, 600, 1800, 3600, 3 * 3600, 6 * 3600, 24 * 3600]
 
-        self.win.addstr(2, 1, self.stats_txt)
-        self.win.refresh()
+    def __init__(
+        self,
+        nlines: int,
+        ncols: int,
+        begin_y: int,
+        begin_x: int,
+        views: List[Tuple[str, ThroughputHistory]],
+    ):
+        super().__init__(nlines, ncols, begin_y, begin_x)
+        self.views = views
+        self.view = 0
+        self.span_idx = 3
+        # end of the shown window, None follows the newest sample
+        self.t_end = None
 
+        self.win.bkgd(" ", curses.color_pair(2))
 
-class ControlElement(ABC):
-    @abstractmethod
-    def cmd(self, char):
-        ...
+    @staticmethod
+    def _span_str(span_s: float) -> str:
+        if span_s >= 3600:
+            return f"{span_s / 3600:.3g} h"
+        if span_s >= 60:
+            return f"{span_s / 60:.3g} min"
+        return f"{span_s:.3g} s"
+
+    def cmd(self, char) -> bool:
+        # keys handled by the chart, independent of the selected control
+        span_s = self.SPANS_S[self.span_idx]
+        if char == ord("v"):
+            self.view = (self.view + 1) % len(self.views)
+        elif char == ord("+") and self.span_idx > 0:
+            self.span_idx -= 1
+        elif char == ord("-") and self.span_idx < len(self.SPANS_S) - 1:
+            self.span_idx += 1
+        elif char in (ord("<"), ord(">")):
+            now = time.monotonic()
+            t_end = self.t_end if self.t_end is not None else now
+            t_end += span_s / 2 if char == ord(">") else -span_s / 2
+            oldest = self.views[self.view][1].oldest()
+            if oldest is not None:
+                t_end = max(t_end, oldest + span_s)
+            self.t_end = None if t_end >= now else t_end
+        elif char == ord("f"):
+            self.t_end = None
+        else:
+            return False
+        self.refresh()
+        return True
+
+    def _draw(self):
+        h, w = self.win.getmaxyx()
+        name, history = self.views[self.view]
+        span_s = self.SPANS_S[self.span_idx]
+        t_end = self.t_end if self.t_end is not None else time.monotonic()
+        nrows = h - 2
+        ncols = w - 2
+
+        mins, maxs, means = history.query(t_end - span_s, t_end, ncols)
+        has = ~np.isnan(mins)
+        top = float(np.max(maxs[has])) if has.any() else 0.0
+        top = top if top > 0 else 1.0
+
+        # per cell the value its row stands for, bottom row first
+        levels = (np.arange(nrows) + 0.5) * top / nrows
+        mean_row = np.where(has, np.floor(np.nan_to_num(means) / top * nrows), -1)
+        with np.errstate(invalid="ignore"):
+            below_min = levels[:, None] <= mins[None, :]
+            below_max = levels[:, None] <= maxs[None, :]
+        cells = np.full((nrows, ncols), " ")
+        cells[below_max] = "|"
+        cells[below_min] = "#"
+        rows = np.arange(nrows)[:, None]
+        cells[(rows == np.minimum(mean_row, nrows - 1)[None, :]) & ~below_min] = "-"
+
+        self.win.erase()
+        self.win.border()
+        if self.t_end is None:
+            where = "live"
+        else:
+            age_s = round(max(time.monotonic() - self.t_end, 0.0))
+            where = f"{self._span_str(age_s)} ago"
+        title = f" {name}, {self._span_str(span_s)} to {where} "
+        if has.any():
+            title += (
+                f"| {np.min(mins[has]):.2f} / {np.mean(means[has]):.2f} / "
+                f"{top:.2f} MB/s "
+            )
+        self.win.addstr(0, 2, title[: w - 4], curses.A_BOLD)
+        keys = " v view  +/- zoom  </> scroll  f live "
+        if len(keys) + len(title) + 6 < w:
+            self.win.addstr(h - 1, w - len(keys) - 2, keys)
+        for r in range(nrows):
+            line = "".join(cells[nrows - 1 - r])
+            self.win.addstr(1 + r, 1, line, curses.color_pair(1))
 
+
+class ControlElement(Widget):
     @abstractmethod
-    def refresh(self):
+    def cmd(self, char):
         ...
 
     @abstractmethod
@@ -97,18 +235,16 @@ class ControlElement(ABC):
 
 class RadioList(ControlElement):
     def __init__(self, nlines: int, ncols: int, begin_y: int, begin_x: int):
-        self.els = ["Idle", "Write", "Read"]
+        super().__init__(nlines, ncols, begin_y, begin_x)
+        self.els = ["Idle", "Write", "Read", "Duplex"]
         self.sel = 0
         self.highlight = False
         self.sel_highlight = 0
 
-        self.win = curses.newwin(nlines, ncols, begin_y, begin_x)
         self.win.border()
         self.win.bkgd(" ", curses.color_pair(2))
-        self.win.refresh()
-        self.refresh()
 
-    def refresh(self):
+    def _draw(self):
         h, w = self.win.getmaxyx()
 
         for idx, el in enumerate(self.els):
@@ -120,7 +256,6 @@ class RadioList(ControlElement):
                 else curses.color_pair(4)
             )
             self.win.addstr(1 + idx, 1, s, color)
-            self.win.refresh()
 
     def cmd(self, char):
         if char == curses.KEY_DOWN and self.sel_highlight < len(self.els) - 1:
@@ -133,20 +268,19 @@ class RadioList(ControlElement):
 
     def set_highlight(self, highlighted):
         self.highlight = highlighted
+        self.refresh()
 
 
 class TransferSizeSel(ControlElement):
     def __init__(self, nlines: int, ncols: int, begin_y: int, begin_x: int):
+        super().__init__(nlines, ncols, begin_y, begin_x)
         self.size = 1024
         self.highlight = False
 
-        self.win = curses.newwin(nlines, ncols, begin_y, begin_x)
         self.win.border()
         self.win.bkgd(" ", curses.color_pair(2))
-        self.win.refresh()
-        self.refresh()
 
-    def refresh(self):
+    def _draw(self):
         h, w = self.win.getmaxyx()
 
         prefixes = [
@@ -166,15 +300,16 @@ class TransferSizeSel(ControlElement):
 
         color = curses.color_pair(5) if self.highlight else curses.color_pair(4)
         self.win.addstr(1, 1, s, color)
-        self.win.refresh()
 
     def cmd(self, char):
         if char == curses.KEY_DOWN:
-            if self.size > 128:
+            if self.size > TRANSFER_SIZE_MIN:
                 self.size //= 2
         elif char == curses.KEY_UP:
-            if self.size < 4 * 1024 * 1024:
+            if self.size < TRANSFER_SIZE_MAX:
                 self.size *= 2
+        self.refresh()
 
     def set_highlight(self, highlighted):
         self.highlight = highlighted
+        self.refresh()
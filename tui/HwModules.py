@@ -1,27 +1,81 @@
 #! /usr/bin/env python3
 
 import ctypes
+import dataclasses
 import os
 import mmap
-import struct
 import fcntl
+from typing import Dict, Iterable, Tuple
 
 from PpSpIoctls import PpSpIoctls, pp_sp_tx_cmd_resp_size
 
+AVALON_ST_CHECK_OFFS = 0x10000
+AVALON_ST_GEN_OFFS = 0x11000
+
+
+@dataclasses.dataclass(frozen=True)
+class Reg:
+    name: str
+    addr: int
+
 
 class _Module:
+    # declarative register map, overridden by the concrete modules
+    REGS: Tuple[Reg, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # precompute word indices so that the accessors do no address math
+        cls._reg_idx = {reg.name: reg.addr // 4 for reg in cls.REGS}
+        # contiguous runs of mapped words as (first index, names), so that a
+        # snapshot never touches the unmapped words in between
+        cls._runs = []
+        for name, idx in sorted(cls._reg_idx.items(), key=lambda item: item[1]):
+            run = cls._runs[-1] if cls._runs else None
+            if run is not None and run[0] + len(run[1]) == idx:
+                run[1].append(name)
+            else:
+                cls._runs.append((idx, [name]))
+
     def __init__(self, mem, offs):
         self.mem = mem
         self.offs = offs
+        # accept either a raw BAR mapping or an already word-addressed view
+        if getattr(mem, "format", None) == "I":
+            self.regs32 = mem
+        else:
+            self.regs32 = memoryview(mem).cast("I")
+        self._base = offs // 4
 
     def _rd32(self, addr):
-        bs = self.mem[self.offs + addr : self.offs + addr + 4]
-        val = struct.unpack("I", bs)[0]
-        return val
+        return self.regs32[self._base + addr // 4]
 
     def _wr32(self, addr, data):
-        bs = struct.pack("I", data)
-        self.mem[self.offs + addr : self.offs + addr + 4] = bs
+        self.regs32[self._base + addr // 4] = data
+
+    def read_reg(self, name: str) -> int:
+        return self.regs32[self._base + self._reg_idx[name]]
+
+    def write_reg(self, name: str, data: int):
+        self.regs32[self._base + self._reg_idx[name]] = data
+
+    def read_regs(self, *names: str) -> Tuple[int, ...]:
+        regs32, base, reg_idx = self.regs32, self._base, self._reg_idx
+        return tuple(regs32[base + reg_idx[name]] for name in names)
+
+    def write_regs(self, writes: Iterable[Tuple[str, int]]):
+        # writes are issued in the given order, e.g. configuration before start
+        regs32, base, reg_idx = self.regs32, self._base, self._reg_idx
+        for name, data in writes:
+            regs32[base + reg_idx[name]] = data
+
+    def snapshot(self) -> Dict[str, int]:
+        # one 32-bit read per mapped register, a slice per contiguous run
+        regs32, base = self.regs32, self._base
+        snap = {}
+        for lo, names in self._runs:
+            snap.update(zip(names, regs32[base + lo : base + lo + len(names)].tolist()))
+        return snap
 
 
 class AvalonStGen(_Module):
@@ -32,19 +86,25 @@ class AvalonStGen(_Module):
     ADDR_SAMPLES = 0x20
     ADDR_SAMPLES_TX = 0x24
 
+    REGS = (
+        Reg("ID_REG", ADDR_ID_REG),
+        Reg("VERSION", ADDR_VERSION),
+        Reg("STATUS", ADDR_STATUS),
+        Reg("CTRL", ADDR_CTRL),
+        Reg("SAMPLES", ADDR_SAMPLES),
+        Reg("SAMPLES_TX", ADDR_SAMPLES_TX),
+    )
+
     def __init__(self, mem, offs):
         super().__init__(mem, offs)
-        id_reg = self._rd32(self.ADDR_ID_REG)
-        version = self._rd32(self.ADDR_VERSION)
+        id_reg, version = self.read_regs("ID_REG", "VERSION")
 
     def start(self, nr_samp):
-        self._wr32(self.ADDR_SAMPLES, nr_samp)
-        self._wr32(self.ADDR_CTRL, 1)
+        self.write_regs((("SAMPLES", nr_samp), ("CTRL", 1)))
 
     def get_state(self):
-        state = self._rd32(self.ADDR_STATUS) & 1
-        samp_tx = self._rd32(self.ADDR_SAMPLES_TX)
-        return (state, samp_tx)
+        status, samp_tx = self.read_regs("STATUS", "SAMPLES_TX")
+        return (status & 1, samp_tx)
 
 
 class AvalonStCheck(_Module):
@@ -53,18 +113,22 @@ class AvalonStCheck(_Module):
     ADDR_SAMP_TOT = 0x10
     ADDR_SAMP_OK = 0x14
 
+    REGS = (
+        Reg("ID_REG", ADDR_ID_REG),
+        Reg("VERSION", ADDR_VERSION),
+        Reg("SAMP_TOT", ADDR_SAMP_TOT),
+        Reg("SAMP_OK", ADDR_SAMP_OK),
+    )
+
     def __init__(self, mem, offs):
         super().__init__(mem, offs)
-        id_reg = self._rd32(self.ADDR_ID_REG)
-        version = self._rd32(self.ADDR_VERSION)
+        id_reg, version = self.read_regs("ID_REG", "VERSION")
 
     def get_stats(self):
-        tot = self._rd32(self.ADDR_SAMP_TOT)
-        ok = self._rd32(self.ADDR_SAMP_OK)
-        return (tot, ok)
+        return self.read_regs("SAMP_TOT", "SAMP_OK")
 
     def clear(self):
-        self._wr32(self.ADDR_SAMP_TOT, 1)
+        self.write_reg("SAMP_TOT", 1)
 
 
 class pp_sp_tx_cmd_resp(ctypes.Structure):
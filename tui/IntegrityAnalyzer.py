@@ -0,0 +1,162 @@
+import dataclasses
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_SAMPLES = 64 * 1024
+NR_SEGMENTS = 64
+MAX_RUNS = 16
+SAMPLE_BITS = 16
+BYTES_PER_SAMP = SAMPLE_BITS // 8
+
+
+@dataclasses.dataclass
+class IntegrityReport:
+    size_bytes: int
+    # mismatching samples
+    mismatches: int = 0
+    first_bad_offset: Optional[int] = None
+    last_bad_offset: Optional[int] = None
+    nr_runs: int = 0
+    longest_run_bytes: int = 0
+    # (offset, length) in bytes of the first MAX_RUNS runs of errors
+    runs: List[Tuple[int, int]] = dataclasses.field(default_factory=list)
+    # run lengths in samples, bin i counts runs of 2**i .. 2**(i+1)-1
+    run_length_hist: np.ndarray = None
+    # number of mismatching samples in which bit i differs
+    bit_flips: np.ndarray = None
+    # mismatching samples per 1/NR_SEGMENTS of the buffer
+    segments: np.ndarray = None
+
+    @property
+    def ok(self) -> bool:
+        return self.mismatches == 0
+
+    # check counts in bytes, like the AvalonStCheck counters
+    @property
+    def samp_tot(self) -> int:
+        return self.size_bytes
+
+    @property
+    def samp_ok(self) -> int:
+        return self.size_bytes - self.mismatches * BYTES_PER_SAMP
+
+    def diagnosis(self, tlp_bytes: Optional[int] = None) -> str:
+        if self.ok:
+            return "ok"
+
+        # (nearly) everything wrong from the first error to the end; stale
+        # data may still match the counter pattern in a few places
+        tail_bytes = self.size_bytes - self.first_bad_offset
+        last_samp = self.size_bytes - BYTES_PER_SAMP
+        if (
+            self.last_bad_offset == last_samp
+            and self.mismatches * BYTES_PER_SAMP >= 0.99 * tail_bytes
+        ):
+            return f"tail truncation after {self.first_bad_offset} B"
+
+        bits = np.flatnonzero(self.bit_flips == self.mismatches)
+        if len(bits) == 1 and self.bit_flips.sum() == self.mismatches:
+            return f"stuck bit {bits[0]}"
+
+        if tlp_bytes is not None and self.nr_runs <= MAX_RUNS:
+            if all(off % tlp_bytes == 0 and l % tlp_bytes == 0 for off, l in self.runs):
+                return f"{self.nr_runs} run(s) of whole {tlp_bytes} B payloads"
+
+        if self.longest_run_bytes == BYTES_PER_SAMP:
+            return "scattered single-sample errors"
+        return "mixed errors"
+
+    def summary(self, tlp_bytes: Optional[int] = None) -> str:
+        if self.ok:
+            return "ok"
+        bits = ",".join(str(b) for b in np.flatnonzero(self.bit_flips))
+        return (
+            f"{self.diagnosis(tlp_bytes)}: first bad @0x{self.first_bad_offset:x}, "
+            f"{self.nr_runs} run(s), longest {self.longest_run_bytes} B, "
+            f"bits [{bits}]"
+        )
+
+
+class IntegrityAnalyzer:
+    # Compares a buffer against its expected pattern chunk by chunk, with
+    # scratch space for a single chunk. Clean chunks only cost a compare and
+    # a count, the localization work is done for chunks with errors.
+
+    def __init__(self, chunk_samples: int = CHUNK_SAMPLES):
+        self.chunk_samples = chunk_samples
+        self.neq = np.empty(chunk_samples, dtype=bool)
+
+    def analyze(self, actual: np.ndarray, expected: np.ndarray) -> IntegrityReport:
+        n = len(expected)
+        rep = IntegrityReport(
+            size_bytes=n * BYTES_PER_SAMP,
+            run_length_hist=np.zeros(n.bit_length() + 1, dtype=np.int64),
+            bit_flips=np.zeros(SAMPLE_BITS, dtype=np.int64),
+            segments=np.zeros(NR_SEGMENTS, dtype=np.int64),
+        )
+        # start of a run of errors still open at the end of the previous chunk
+        run_start = None
+
+        for c0 in range(0, n, self.chunk_samples):
+            c1 = min(c0 + self.chunk_samples, n)
+            act, exp = actual[c0:c1], expected[c0:c1]
+            neq = np.not_equal(act, exp, out=self.neq[: c1 - c0])
+            nr_bad = int(np.count_nonzero(neq))
+            if nr_bad == 0:
+                if run_start is not None:
+                    self._add_runs(rep, [run_start], [c0])
+                    run_start = None
+                continue
+
+            rep.mismatches += nr_bad
+            bad = np.flatnonzero(neq)
+            if rep.first_bad_offset is None:
+                rep.first_bad_offset = (c0 + int(bad[0])) * BYTES_PER_SAMP
+            rep.last_bad_offset = (c0 + int(bad[-1])) * BYTES_PER_SAMP
+
+            xor = np.bitwise_xor(act[bad], exp[bad])
+            flipped = np.unpackbits(xor.view(np.uint8), bitorder="little")
+            # little-endian samples, so bit i of the sample is column i
+            rep.bit_flips += flipped.reshape(-1, SAMPLE_BITS).sum(
+                axis=0, dtype=np.int64
+            )
+
+            rep.segments += np.bincount(
+                (c0 + bad) * NR_SEGMENTS // n, minlength=NR_SEGMENTS
+            )
+
+            # run boundaries: a start where the previous sample was good, an
+            # end where the next one is good
+            brk = np.flatnonzero(np.diff(bad) != 1)
+            starts = np.concatenate(([bad[0]], bad[brk + 1])) + c0
+            ends = np.concatenate((bad[brk], [bad[-1]])) + c0 + 1
+            if run_start is not None:
+                if starts[0] == c0:
+                    starts[0] = run_start
+                else:
+                    self._add_runs(rep, [run_start], [c0])
+            run_start = None
+            if ends[-1] == c1 and c1 < n:
+                run_start = int(starts[-1])
+                starts, ends = starts[:-1], ends[:-1]
+            if len(starts):
+                self._add_runs(rep, starts, ends)
+
+        if run_start is not None:
+            self._add_runs(rep, [run_start], [n])
+
+        return rep
+
+    @staticmethod
+    def _add_runs(rep: IntegrityReport, starts, ends):
+        starts = np.asarray(starts)
+        lengths = np.asarray(ends) - starts
+        rep.nr_runs += len(lengths)
+        # frexp exponent - 1 is floor(log2(length)) for integers
+        log2_len = np.frexp(lengths)[1] - 1
+        rep.run_length_hist += np.bincount(log2_len, minlength=len(rep.run_length_hist))
+        longest = int(lengths.max()) * BYTES_PER_SAMP
+        rep.longest_run_bytes = max(rep.longest_run_bytes, longest)
+        for s, l in zip(starts[: MAX_RUNS - len(rep.runs)], lengths):
+            rep.runs.append((int(s) * BYTES_PER_SAMP, int(l) * BYTES_PER_SAMP))
@@ -1,112 +1,441 @@
-import ctypes
-import fcntl
-import mmap
-import os
+import collections
+import dataclasses
 import queue
-import struct
 import threading
 import time
+from concurrent.futures import Future
+from typing import Deque, List, Optional, Tuple, Union
 
-import numpy as np
+from IntegrityAnalyzer import IntegrityReport
+from MetricsExporter import InterfaceMetrics
+from PayloadStager import Payload
+from PcieLinkModel import PcieLinkModel
+from PpSpDevice import PpSpDevice
+from QueueMsg import Mode, MsgCmd, MsgResp, RespChannel
+from Recorder import Recorder
+from StreamStats import StreamStats
+from TransferEngine import TransferEngine, TransferResult
+from VerifyPool import VerifyPool
 
-from HwModules import AvalonStGen, AvalonStCheck, pp_sp_tx_cmd_resp
-from PpSpIoctls import PpSpIoctls, pp_sp_tx_cmd_resp_size
-from QueueMsg import Mode, MsgCmd, MsgResp
+
+@dataclasses.dataclass
+class Pacing:
+    # saturate: issue transfers back-to-back and report once per interval
+    saturate: bool = False
+    # fraction of wall time spent in transfers, the rest is idle
+    duty_cycle: float = 1.0
+    # upper bound on the transfer issue rate
+    target_rate_hz: Optional[float] = None
+    report_interval_s: float = 0.5
+    # READ:WRITE transfers per round in DUPLEX mode
+    duplex_ratio: Tuple[int, int] = (1, 1)
+
+
+def duplex_round(reads: int, writes: int) -> List[Mode]:
+    # directions of one DUPLEX round, each direction's transfers spread
+    # evenly over the round instead of in blocks
+    if reads < 1 or writes < 1:
+        raise ValueError("DUPLEX ratio needs at least one READ and one WRITE")
+    slots = [((k + 0.5) / reads, 0, Mode.READ) for k in range(reads)]
+    slots += [((k + 0.5) / writes, 1, Mode.WRITE) for k in range(writes)]
+    return [mode for _, _, mode in sorted(slots)]
+
+
+@dataclasses.dataclass
+class DirectionStats:
+    count: int = 0
+    size_bytes: int = 0
+    busy_ns: int = 0
+    samp_tot: int = 0
+    samp_ok: int = 0
+    samp_expected: int = 0
+
+    def add(self, res: TransferResult):
+        self.count += 1
+        self.size_bytes += res.size_bytes
+        self.busy_ns += res.duration_ns
+        self.samp_tot += res.samp_tot
+        self.samp_ok += res.samp_ok
+        if res.samp_expected is not None:
+            self.samp_expected += res.samp_expected
+        else:
+            self.samp_expected += res.samp_tot
+
+
+@dataclasses.dataclass
+class IntervalStats:
+    start: float = 0.0
+    count: int = 0
+    size_bytes: int = 0
+    busy_ns: int = 0
+    samp_tot: int = 0
+    samp_ok: int = 0
+    # first transfer of the interval that failed the host-side check
+    first_bad: Optional[IntegrityReport] = None
+    # per direction, only both in use in DUPLEX mode
+    read: DirectionStats = dataclasses.field(default_factory=DirectionStats)
+    write: DirectionStats = dataclasses.field(default_factory=DirectionStats)
+
+    def add(self, res: TransferResult):
+        if self.first_bad is None and res.integrity and not res.integrity.ok:
+            self.first_bad = res.integrity
+        self.count += 1
+        self.size_bytes += res.size_bytes
+        self.busy_ns += res.duration_ns
+        self.samp_tot += res.samp_tot
+        self.samp_ok += res.samp_ok
+        if res.mode == Mode.READ:
+            self.read.add(res)
+        else:
+            self.write.add(res)
 
 
 class IoThread(threading.Thread):
     def __init__(
-        self, char_dev_filename: str, cmd_queue: queue.Queue, resp_queue: queue.Queue
+        self,
+        char_dev_filename: Union[str, PpSpDevice],
+        cmd_queue: Optional[queue.Queue] = None,
+        resp_queue: Optional[RespChannel] = None,
+        pacing: Optional[Pacing] = None,
+        recorder: Optional[Recorder] = None,
+        rec_interface: int = 0,
+        metrics: Optional[InterfaceMetrics] = None,
+        payload: Optional[Payload] = None,
+        verify_pool: Optional[VerifyPool] = None,
+        timing: bool = False,
     ):
         self.size_bytes = 1024
         self.mode = Mode.IDLE
         self.cmd_queue = cmd_queue
         self.resp_queue = resp_queue
+        self.pacing = pacing if pacing is not None else Pacing()
+        self.recorder = recorder
+        self.rec_interface = rec_interface
+        self.metrics = metrics
+        self.interval = IntervalStats()
+        self.next_issue = 0.0
+        # DUPLEX: directions of a round and the position in it, interfaces
+        # started at different phases run opposing directions
+        self.duplex_round = duplex_round(*self.pacing.duplex_ratio)
+        self.duplex_phase = 0
+        self.duplex_idx = 0
+
+        self.engine = TransferEngine(char_dev_filename, payload, verify_pool, timing)
+        # issued transfers in order, with the future of their WRITE check
+        self.verifying: Deque[
+            Tuple[TransferResult, Optional[Future]]
+        ] = collections.deque()
+
+        try:
+            self.link_model = PcieLinkModel.from_stats(self.engine.dev.get_pcie_stats())
+        except OSError:
+            self.link_model = None
 
-        self.filename = char_dev_filename
-        self.fd = os.open(self.filename, os.O_RDWR)
-        self.mem = mmap.mmap(self.fd, 4 * 1024 * 1024)
-        self.st_gen = AvalonStGen(self.mem, 0x11000)
-        self.st_check = AvalonStCheck(self.mem, 0x10000)
+        # driver-measured duration of the current mode and size, in ns
+        self.duration_stats = StreamStats(hist_min=100, hist_max=1e11)
 
         super().__init__()
 
+    def _completed(
+        self, res: TransferResult, fut: Optional[Future]
+    ) -> List[TransferResult]:
+        # results whose checks are done, in issue order
+        if fut is None and not self.verifying:
+            return [res]
+        self.verifying.append((res, fut))
+        done = []
+        while self.verifying:
+            res, fut = self.verifying[0]
+            if fut is not None:
+                if not fut.done():
+                    break
+                self.engine.attach(res, fut.result())
+            self.verifying.popleft()
+            done.append(res)
+        return done
+
+    def _drain_verifying(self):
+        while self.verifying:
+            res, fut = self.verifying.popleft()
+            if fut is not None:
+                self.engine.attach(res, fut.result())
+            self._account(res)
+            self.interval.add(res)
+        # the interval is reset for the next command, report what it holds
+        # under the mode and size it ran with
+        if self.interval.count:
+            self._report_interval(time.perf_counter())
+
+    def _account(self, res: TransferResult):
+        self.duration_stats.update(res.duration_ns)
+        if self.recorder is not None:
+            self.recorder.append(self.rec_interface, res)
+        if self.metrics is not None:
+            self.metrics.observe(res)
+
+    def _next_mode(self) -> Mode:
+        if self.mode != Mode.DUPLEX:
+            return self.mode
+        mode = self.duplex_round[self.duplex_idx % len(self.duplex_round)]
+        self.duplex_idx += 1
+        return mode
+
+    def _reset_interval(self):
+        self.interval = IntervalStats(start=time.perf_counter())
+        self.next_issue = self.interval.start
+
+    def _ceiling_str(self, throughput_mbps: float, mode: Optional[Mode] = None) -> str:
+        if self.link_model is None:
+            return ""
+        perc = self.link_model.percent_of_ceiling(
+            mode if mode is not None else self.mode, self.size_bytes, throughput_mbps
+        )
+        return f" ({perc:.1f} % of ceiling)"
+
+    def _duplex_ceiling_str(self, throughput_mbps: float) -> str:
+        if self.link_model is None:
+            return ""
+        reads, writes = self.pacing.duplex_ratio
+        perc = self.link_model.percent_of_duplex_ceiling(
+            reads, writes, self.size_bytes, throughput_mbps
+        )
+        return f" ({perc:.1f} % of ceiling)"
+
+    def _integrity_str(self, integrity: Optional[IntegrityReport]) -> str:
+        if integrity is None or integrity.ok:
+            return ""
+        # the card writes to host memory in TLPs of up to max payload size
+        tlp_bytes = self.link_model.max_payload if self.link_model else None
+        return f", {integrity.summary(tlp_bytes)}"
+
+    def _p99_str(self) -> str:
+        # driver-measured DMA duration, and the ioctl as seen from user space
+        # at the same percentile if timing is enabled
+        s = f"p99 {self.duration_stats.p99 / 1000:.3f} us"
+        tm = self.engine.timer
+        if tm is not None and "ioctl" in tm.phases:
+            wall_us = tm.phases["ioctl"].percentile(99) / 1000
+            s += f", wall ioctl p99 {wall_us:.3f} us"
+        return s
+
+    def _phase_detail(self) -> Optional[str]:
+        if self.engine.timer is None:
+            return None
+        return f"phases p50/p99 us: {self.engine.timer.format()}"
+
+    def _ratio_str(self) -> str:
+        reads, writes = self.pacing.duplex_ratio
+        return f"{self.mode} {reads}:{writes}"
+
+    def _direction_check_str(self, d: DirectionStats) -> str:
+        check_percent = d.samp_ok / d.samp_tot * 100 if d.samp_tot else 0.0
+        s = f"{d.samp_ok}/{d.samp_tot} ({check_percent:.2f} %)"
+        if d.samp_expected != d.samp_tot:
+            s += f" (expected {d.samp_expected}, {self.engine.stager.payload.name})"
+        return s
+
+    def _report_round(self, iv: IntervalStats):
+        # one DUPLEX round, throughput of each direction while in DMA
+        read_mbps = iv.read.size_bytes * 1e3 / iv.read.busy_ns
+        write_mbps = iv.write.size_bytes * 1e3 / iv.write.busy_ns
+        combined_mbps = iv.size_bytes * 1e3 / iv.busy_ns
+
+        self.resp_queue.put(
+            MsgResp(
+                f"{self._ratio_str()}, {self.size_bytes} B, "
+                f"read {read_mbps:.2f} MB/s{self._ceiling_str(read_mbps, Mode.READ)}, "
+                f"write {write_mbps:.2f} MB/s"
+                f"{self._ceiling_str(write_mbps, Mode.WRITE)}, "
+                f"combined {combined_mbps:.2f} MB/s"
+                f"{self._duplex_ceiling_str(combined_mbps)} ({self._p99_str()}), "
+                f"check read = {self._direction_check_str(iv.read)}, "
+                f"write = {self._direction_check_str(iv.write)}"
+                f"{self._integrity_str(iv.first_bad)}",
+                read_mbps,
+                write_mbps,
+                self._phase_detail(),
+            )
+        )
+
+    def _report_single(self, res: TransferResult):
+        if self.mode == Mode.READ:
+            throughput_read_mbps = res.throughput_mbps
+            throughput_write_mbps = 0
+        else:
+            throughput_read_mbps = 0
+            throughput_write_mbps = res.throughput_mbps
+
+        check_percent = res.samp_ok / res.samp_tot * 100
+        msg_check = f", check = {res.samp_ok}/{res.samp_tot} ({check_percent:.2f} %)"
+        msg_check += self._integrity_str(res.integrity)
+        if res.samp_expected is not None and res.samp_expected != res.samp_tot:
+            msg_check += (
+                f" (expected {res.samp_expected}, {self.engine.stager.payload.name})"
+            )
+
+        duration_us = res.duration_ns / 1000
+        self.resp_queue.put(
+            MsgResp(
+                f"{self.mode}, {self.size_bytes} B, {duration_us:.3f} us "
+                f"({self._p99_str()}), "
+                f"{res.throughput_mbps:.2f} MB/s"
+                f"{self._ceiling_str(res.throughput_mbps)}{msg_check}",
+                throughput_read_mbps,
+                throughput_write_mbps,
+                self._phase_detail(),
+            )
+        )
+
+    def _report_interval_duplex(self, now: float):
+        iv = self.interval
+        elapsed = now - iv.start
+        read_mbps = iv.read.size_bytes / 1e6 / elapsed
+        write_mbps = iv.write.size_bytes / 1e6 / elapsed
+        # a direction may not have completed a transfer in a short interval
+        read_busy_mbps = iv.read.size_bytes * 1e3 / max(iv.read.busy_ns, 1)
+        write_busy_mbps = iv.write.size_bytes * 1e3 / max(iv.write.busy_ns, 1)
+        busy_mbps = iv.size_bytes * 1e3 / max(iv.busy_ns, 1)
+
+        self.resp_queue.put(
+            MsgResp(
+                f"{self._ratio_str()}, {self.size_bytes} B, {iv.count} tx in "
+                f"{elapsed:.3f} s ({iv.count / elapsed:.0f} tx/s), "
+                f"read {read_mbps:.2f} + write {write_mbps:.2f} = "
+                f"{read_mbps + write_mbps:.2f} MB/s sustained, in DMA "
+                f"read {read_busy_mbps:.2f}"
+                f"{self._ceiling_str(read_busy_mbps, Mode.READ)} "
+                f"write {write_busy_mbps:.2f}"
+                f"{self._ceiling_str(write_busy_mbps, Mode.WRITE)} "
+                f"combined {busy_mbps:.2f}{self._duplex_ceiling_str(busy_mbps)} MB/s, "
+                f"{self._p99_str()}, "
+                f"check read = {self._direction_check_str(iv.read)}, "
+                f"write = {self._direction_check_str(iv.write)}"
+                f"{self._integrity_str(iv.first_bad)}",
+                read_mbps,
+                write_mbps,
+                self._phase_detail(),
+            )
+        )
+        self._reset_interval()
+
+    def _report_interval(self, now: float):
+        # with checks in flight no transfer may have completed yet, keep the
+        # interval open until one has
+        if self.interval.count == 0:
+            return
+        if self.mode == Mode.DUPLEX:
+            self._report_interval_duplex(now)
+            return
+
+        iv = self.interval
+        elapsed = now - iv.start
+        # sustained throughput over wall time vs. throughput while in DMA
+        throughput_mbps = iv.size_bytes / 1e6 / elapsed
+        busy_mbps = iv.size_bytes * 1e3 / iv.busy_ns
+        check_percent = iv.samp_ok / iv.samp_tot * 100
+
+        if self.mode == Mode.READ:
+            throughput_read_mbps = throughput_mbps
+            throughput_write_mbps = 0
+        else:
+            throughput_read_mbps = 0
+            throughput_write_mbps = throughput_mbps
+
+        self.resp_queue.put(
+            MsgResp(
+                f"{self.mode}, {self.size_bytes} B, {iv.count} tx in {elapsed:.3f} s "
+                f"({iv.count / elapsed:.0f} tx/s), {throughput_mbps:.2f} MB/s "
+                f"sustained, {busy_mbps:.2f} MB/s in DMA"
+                f"{self._ceiling_str(busy_mbps)}, {self._p99_str()}, "
+                f"check = {iv.samp_ok}/{iv.samp_tot} ({check_percent:.2f} %)"
+                f"{self._integrity_str(iv.first_bad)}",
+                throughput_read_mbps,
+                throughput_write_mbps,
+                self._phase_detail(),
+            )
+        )
+        self._reset_interval()
+
+    def _step_saturated(self):
+        pacing = self.pacing
+
+        t0 = time.perf_counter()
+        res, fut = self.engine.issue(self._next_mode(), self.size_bytes)
+        t1 = time.perf_counter()
+        for res in self._completed(res, fut):
+            self._account(res)
+            self.interval.add(res)
+        tm = self.engine.timer
+        if tm is not None:
+            tm.mark("account")
+
+        if t1 - self.interval.start >= pacing.report_interval_s:
+            self._report_interval(t1)
+            if tm is not None:
+                tm.mark("report")
+
+        delay = 0.0
+        if pacing.duty_cycle < 1.0:
+            delay = (t1 - t0) * (1.0 - pacing.duty_cycle) / pacing.duty_cycle
+        if pacing.target_rate_hz is not None:
+            period = 1.0 / pacing.target_rate_hz
+            # do not build up a burst of catch-up transfers after a stall
+            self.next_issue = max(self.next_issue + period, t1 - period)
+            delay = max(delay, self.next_issue - t1)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _step_round(self):
+        iv = IntervalStats()
+        tm = self.engine.timer
+        for _ in self.duplex_round:
+            res = self.engine.transfer(self._next_mode(), self.size_bytes)
+            self._account(res)
+            iv.add(res)
+            if tm is not None:
+                tm.mark("account")
+        self._report_round(iv)
+        if tm is not None:
+            tm.mark("report")
+
     def run(self):
         self.resp_queue.put(MsgResp("from IoThread: thread started", 0, 0))
         while True:
             try:
                 cmd: MsgCmd = self.cmd_queue.get_nowait()
+                self._drain_verifying()
                 if cmd.stop:
                     return
 
+                if (cmd.mode, cmd.size_bytes) != (self.mode, self.size_bytes):
+                    self.duration_stats.reset()
+                    if self.engine.timer is not None:
+                        self.engine.timer.reset()
                 self.mode = cmd.mode
                 self.size_bytes = cmd.size_bytes
+                self.duplex_idx = self.duplex_phase
+                self._reset_interval()
 
             except queue.Empty:
                 if self.mode == Mode.IDLE:
                     time.sleep(0.1)
                     continue
 
-                if self.mode == Mode.READ:
-                    self.st_check.clear()
-                elif self.mode == Mode.WRITE:
-                    self.st_gen.start(self.size_bytes)
-                    state, samp_tx = self.st_gen.get_state()
-                    assert state == 1
-
-                cmd_mode = 1 if self.mode == Mode.WRITE else 0
-                cmd_resp = pp_sp_tx_cmd_resp(cmd_mode, self.size_bytes, 0)
-                ret = fcntl.ioctl(
-                    self.fd, PpSpIoctls.PP_SP_IOCTL_START_TX, bytes(cmd_resp)
-                )
-                ret_cmd_resp = pp_sp_tx_cmd_resp.from_buffer_copy(ret)
-
-                throughput_mbps = (self.size_bytes / 1000 / 1000) / (
-                    ret_cmd_resp.duration_ns * 1e-9
-                )
-
-                if self.mode == Mode.READ:
-                    throughput_read_mbps = throughput_mbps
-                    throughput_write_mbps = 0
-                    samp_tot, samp_ok = self.st_check.get_stats()
-                    check_percent = samp_ok / samp_tot * 100
-                    msg_check = (
-                        f", check = {samp_ok}/{samp_tot} ({check_percent:.2f} %)"
-                    )
-                elif self.mode == Mode.WRITE:
-                    state, samp_tx = self.st_gen.get_state()
-                    assert state == 0
-                    assert samp_tx == self.size_bytes
-                    throughput_read_mbps = 0
-                    throughput_write_mbps = throughput_mbps
-
-                    cmd_resp = bytearray(4 * 1024 * 1024)
-                    fcntl.ioctl(
-                        self.fd, PpSpIoctls.PP_SP_IOCTL_GET_BUFFER, cmd_resp, True
-                    )
-                    buf = np.frombuffer(cmd_resp, dtype="uint16")
-
-                    l = self.size_bytes // 2
-                    expected = np.arange(0, l, dtype="uint16")
-                    BYTES_PER_SAMP = 2
-                    samp_tot = l * BYTES_PER_SAMP
-                    samp_ok = np.sum(buf[0:l] == expected) * BYTES_PER_SAMP
-
-                    check_percent = samp_ok / samp_tot * 100
-                    msg_check = (
-                        f", check = {samp_ok}/{samp_tot} ({check_percent:.2f} %)"
-                    )
-                else:
-                    throughput_read_mbps = 0
-                    throughput_write_mbps = 0
-                    msg_check = ""
-
-                duration_us = ret_cmd_resp.duration_ns / 1000
-                self.resp_queue.put(
-                    MsgResp(
-                        f"{self.mode}, {self.size_bytes} B, {duration_us:.3f} us{msg_check}",
-                        throughput_read_mbps,
-                        throughput_write_mbps,
-                    )
-                )
+                if self.pacing.saturate:
+                    self._step_saturated()
+                    continue
+
+                if self.mode == Mode.DUPLEX:
+                    self._step_round()
+                    time.sleep(0.1)
+                    continue
+
+                res = self.engine.transfer(self.mode, self.size_bytes)
+                tm = self.engine.timer
+                self._account(res)
+                if tm is not None:
+                    tm.mark("account")
+                self._report_single(res)
+                if tm is not None:
+                    tm.mark("report")
                 time.sleep(0.1)
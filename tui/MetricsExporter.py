@@ -0,0 +1,166 @@
+import bisect
+import http.server
+import threading
+from typing import TYPE_CHECKING, List, Optional
+
+from QueueMsg import Mode, RespChannel
+
+if TYPE_CHECKING:
+    from TransferEngine import TransferResult
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+METRICS_PORT = 9464
+
+# upper bounds of the duration histogram buckets: 1-2-5 steps from 1 us to 1 s
+DURATION_BUCKETS_S = [m * 10.0**e for e in range(-6, 0) for m in (1, 2, 5)] + [1.0]
+_DURATION_BUCKETS_NS = [round(b * 1e9) for b in DURATION_BUCKETS_S]
+
+_MODES = (Mode.WRITE, Mode.READ)
+
+
+class _ModeCounters:
+    def __init__(self):
+        self.transfers = 0
+        self.bytes = 0
+        self.samp_tot = 0
+        self.samp_ok = 0
+        self.duration_sum_ns = 0
+        # non-cumulative, the last bucket counts durations above 1 s
+        self.duration_hist = [0] * (len(_DURATION_BUCKETS_NS) + 1)
+
+
+class InterfaceMetrics:
+    # Counters of one interface. They are only written by its IoThread and
+    # read by the scraper without a lock, so the transfer loop never waits
+    # for a scrape. A scrape may see one transfer half accounted, which the
+    # next scrape corrects.
+
+    def __init__(
+        self, interface: int, char_dev: str, resp_queue: Optional[RespChannel] = None
+    ):
+        self.interface = interface
+        self.char_dev = char_dev
+        self.resp_queue = resp_queue
+        self.modes = {mode: _ModeCounters() for mode in _MODES}
+
+    def observe(self, res: "TransferResult"):
+        c = self.modes[res.mode]
+        c.duration_hist[bisect.bisect_left(_DURATION_BUCKETS_NS, res.duration_ns)] += 1
+        c.duration_sum_ns += res.duration_ns
+        c.samp_tot += res.samp_tot
+        c.samp_ok += res.samp_ok
+        c.bytes += res.size_bytes
+        c.transfers += 1
+
+
+def _escape(val: str) -> str:
+    return val.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsExporter:
+    # OpenMetrics text exposition of all interfaces on a loopback HTTP port,
+    # served from a daemon thread
+
+    def __init__(self, port: int = METRICS_PORT, host: str = "127.0.0.1"):
+        self.interfaces: List[InterfaceMetrics] = []
+        self.server = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.exporter = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def add_interface(
+        self, char_dev: str, resp_queue: Optional[RespChannel] = None
+    ) -> InterfaceMetrics:
+        metrics = InterfaceMetrics(len(self.interfaces), char_dev, resp_queue)
+        self.interfaces.append(metrics)
+        return metrics
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def render(self) -> str:
+        lines = []
+
+        def family(name, type_, help_, unit=None):
+            lines.append(f"# TYPE {name} {type_}")
+            if unit is not None:
+                lines.append(f"# UNIT {name} {unit}")
+            lines.append(f"# HELP {name} {help_}")
+
+        def mode_labels(m, mode):
+            return (
+                f'interface="{m.interface}",char_dev="{_escape(m.char_dev)}",'
+                f'mode="{mode.name.lower()}"'
+            )
+
+        counters = [
+            ("pp_sp_transfers", "transfers", None, "completed DMA transfers"),
+            ("pp_sp_transferred_bytes", "bytes", "bytes", "bytes moved by DMA"),
+            ("pp_sp_check_samples", "samp_tot", None, "samples checked"),
+            ("pp_sp_check_ok_samples", "samp_ok", None, "samples matching"),
+        ]
+        for name, attr, unit, help_ in counters:
+            family(name, "counter", help_, unit)
+            for m in self.interfaces:
+                for mode in _MODES:
+                    val = getattr(m.modes[mode], attr)
+                    lines.append(f"{name}_total{{{mode_labels(m, mode)}}} {val}")
+
+        name = "pp_sp_transfer_duration_seconds"
+        family(name, "histogram", "driver-measured transfer duration", "seconds")
+        for m in self.interfaces:
+            for mode in _MODES:
+                c = m.modes[mode]
+                labels = mode_labels(m, mode)
+                hist = list(c.duration_hist)
+                cum = 0
+                for le, n in zip(DURATION_BUCKETS_S, hist):
+                    cum += n
+                    lines.append(f'{name}_bucket{{{labels},le="{le:g}"}} {cum}')
+                cum += hist[-1]
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cum}')
+                lines.append(f"{name}_count{{{labels}}} {cum}")
+                lines.append(f"{name}_sum{{{labels}}} {c.duration_sum_ns * 1e-9}")
+
+        channels = [m for m in self.interfaces if m.resp_queue is not None]
+        if channels:
+            family("pp_sp_resp_backlog", "gauge", "responses not yet consumed")
+            for m in channels:
+                lines.append(
+                    f'pp_sp_resp_backlog{{interface="{m.interface}"}} '
+                    f"{m.resp_queue.backlog()}"
+                )
+            family("pp_sp_resp_dropped", "counter", "responses dropped unread")
+            for m in channels:
+                lines.append(
+                    f'pp_sp_resp_dropped_total{{interface="{m.interface}"}} '
+                    f"{m.resp_queue.nr_overrun}"
+                )
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.exporter.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the curses screen clean
+        pass
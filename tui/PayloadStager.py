@@ -0,0 +1,153 @@
+import hashlib
+import mmap
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+
+from PpSpDevice import DMA_BUFFER_SIZE, PpSpDevice
+
+BYTES_PER_SAMP = 2
+
+
+class Payload(ABC):
+    name: str
+
+    @abstractmethod
+    def fill(self, buf: bytearray):
+        # fill the whole staging buffer
+        ...
+
+
+class CounterPayload(Payload):
+    # the uint16 counter AvalonStCheck compares against
+    name = "counter"
+
+    def fill(self, buf: bytearray):
+        u16 = np.frombuffer(buf, dtype="uint16")
+        u16[:] = np.arange(0, len(u16), dtype="uint16")
+
+
+def prbs31_bits(nr_bits: int, seed: int = 1) -> np.ndarray:
+    # x[n] = x[n-28] ^ x[n-31], and by squaring the polynomial also
+    # x[n] = x[n-28m] ^ x[n-31m] for m = 2**k. Stepping with the largest m
+    # the generated prefix allows produces 28m bits per vector operation.
+    seed &= (1 << 31) - 1
+    if seed == 0:
+        raise ValueError("PRBS31 seed must be non-zero")
+    x = np.empty(max(nr_bits, 31), dtype=np.uint8)
+    x[:31] = (seed >> np.arange(31)) & 1
+    l = 31
+    while l < nr_bits:
+        m = 1 << ((l // 31).bit_length() - 1)
+        cnt = min(28 * m, nr_bits - l)
+        np.bitwise_xor(
+            x[l - 28 * m : l - 28 * m + cnt],
+            x[l - 31 * m : l - 31 * m + cnt],
+            out=x[l : l + cnt],
+        )
+        l += cnt
+    return x[:nr_bits]
+
+
+class PrbsPayload(Payload):
+    def __init__(self, seed: int = 1):
+        self.seed = seed
+        self.name = f"prbs31:{seed}"
+
+    def fill(self, buf: bytearray):
+        bits = prbs31_bits(len(buf) * 8, self.seed)
+        buf[:] = np.packbits(bits).tobytes()
+
+
+class FilePayload(Payload):
+    # file contents repeated up to the buffer size
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.name = f"file:{os.path.basename(filename)}"
+
+    def fill(self, buf: bytearray):
+        with open(self.filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"{self.filename}: empty payload file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                n = min(len(m), len(buf))
+                buf[0:n] = m[0:n]
+        while n < len(buf):
+            l = min(n, len(buf) - n)
+            buf[n : n + l] = buf[0:l]
+            n += l
+
+
+def parse_payload(spec: str) -> Payload:
+    # "counter", "prbs31[:seed]" or "file:<path>"
+    kind, _, arg = spec.partition(":")
+    if kind == "counter":
+        return CounterPayload()
+    elif kind in ("prbs", "prbs31"):
+        return PrbsPayload(int(arg, 0) if arg else 1)
+    elif kind == "file" and arg:
+        return FilePayload(arg)
+    raise ValueError(f"unknown payload '{spec}'")
+
+
+class PayloadStager:
+    # Keeps the card-visible DMA buffer loaded with a payload for READ
+    # transfers. SET_BUFFER copies the full 4 MiB, so the payload is
+    # generated once for the whole buffer and uploaded only if its content
+    # hash differs from the last upload. WRITE transfers overwrite the
+    # buffer and are reported through card_wrote().
+
+    def __init__(self, dev: PpSpDevice, payload: Optional[Payload] = None):
+        self.dev = dev
+        self.payload = payload if payload is not None else CounterPayload()
+        self.buf = bytearray(DMA_BUFFER_SIZE)
+        self.buf_u16 = np.frombuffer(self.buf, dtype="uint16")
+
+        self.dirty = True  # staging buffer needs to be regenerated
+        self.content_hash: Optional[bytes] = None
+        self.uploaded_hash: Optional[bytes] = None
+        self.nr_uploads = 0
+        self._expected_ok: Dict[int, int] = {}
+
+    def set_payload(self, payload: Payload):
+        self.payload = payload
+        self.dirty = True
+
+    def invalidate(self):
+        self.uploaded_hash = None
+
+    def card_wrote(self, size_bytes: int, counter_ok: bool):
+        # the generator writes its counter, which leaves the buffer unchanged
+        # if that is what the staged payload holds there
+        if counter_ok and not self.dirty:
+            if self.expected_check_ok(size_bytes) == size_bytes:
+                return
+        self.invalidate()
+
+    def stage(self) -> bool:
+        if self.dirty:
+            self.payload.fill(self.buf)
+            self.content_hash = hashlib.blake2b(self.buf, digest_size=16).digest()
+            self._expected_ok.clear()
+            self.dirty = False
+
+        if self.uploaded_hash == self.content_hash:
+            return False
+        self.dev.set_buffer(self.buf)
+        self.uploaded_hash = self.content_hash
+        self.nr_uploads += 1
+        return True
+
+    def expected_check_ok(self, size_bytes: int) -> int:
+        # AvalonStCheck counts samples matching its counter, so a payload
+        # other than the counter only matches by chance
+        try:
+            return self._expected_ok[size_bytes]
+        except KeyError:
+            pass
+        n = size_bytes // BYTES_PER_SAMP
+        nr_ok = np.count_nonzero(self.buf_u16[0:n] == np.arange(n, dtype="uint16"))
+        self._expected_ok[size_bytes] = int(nr_ok) * BYTES_PER_SAMP
+        return self._expected_ok[size_bytes]
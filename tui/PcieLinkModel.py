@@ -0,0 +1,137 @@
+import math
+from typing import Optional, Tuple
+
+from PcieStats import PcieStatsResult, encoding_efficiency
+from QueueMsg import Mode
+
+# Per-TLP overhead on the wire, in bytes: framing (STP/END or the Gen3+ STP
+# token), sequence number, header and LCRC. ECRC is assumed to be disabled.
+TLP_HDR_3DW = 12
+TLP_HDR_4DW = 16
+TLP_SEQ_LCRC = 2 + 4
+DLLP_BYTES = 8  # 6-byte DLLP + framing
+
+
+def framing_bytes(lane_rate_gtps: float) -> int:
+    return 2 if lane_rate_gtps <= 5.0 else 4
+
+
+class PcieLinkModel:
+    # Achievable TLP throughput of a link in one direction.
+    #
+    # WRITE (card to host) is carried by posted memory writes of up to Max
+    # Payload Size. READ (host to card) is carried by completions: the card
+    # issues one read request per Max Read Request Size bytes, and the root
+    # complex answers each with completions split at the Read Completion
+    # Boundary. The read requests travel in the other direction and are
+    # charged there. ACK and flow-control DLLPs are charged to the direction
+    # of the TLPs they acknowledge, one of each every `tlps_per_dllp` TLPs.
+
+    def __init__(
+        self,
+        lane_rate_gtps: float,
+        link_width: int,
+        max_payload: int = 128,
+        max_read_req: int = 512,
+        read_compl_boundary: int = 64,
+        addr64: bool = True,
+        tlps_per_dllp: int = 4,
+        completion_bytes: Optional[int] = None,
+    ):
+        self.lane_rate_gtps = lane_rate_gtps
+        self.link_width = link_width
+        self.max_payload = max_payload
+        self.max_read_req = max_read_req
+        self.read_compl_boundary = read_compl_boundary
+        self.addr64 = addr64
+        self.tlps_per_dllp = tlps_per_dllp
+        # completions larger than the RCB are allowed but root complexes
+        # commonly return RCB-sized ones, which is the conservative default
+        if completion_bytes is None:
+            completion_bytes = read_compl_boundary
+        self.completion_bytes = min(completion_bytes, max_payload, max_read_req)
+
+    @classmethod
+    def from_stats(cls, stats: PcieStatsResult, **kwargs) -> "PcieLinkModel":
+        return cls(
+            lane_rate_gtps=float(stats.link_speed.split(" ")[0]),
+            link_width=int(stats.link_width),
+            max_payload=stats.max_payload,
+            max_read_req=stats.max_read_req,
+            read_compl_boundary=stats.read_compl_boundary,
+            **kwargs,
+        )
+
+    @property
+    def link_MBps(self) -> float:
+        # bytes per second after line encoding, before any protocol overhead
+        eff = encoding_efficiency(self.lane_rate_gtps)
+        return self.lane_rate_gtps * 1e3 * eff * self.link_width / 8
+
+    def _tlp_overhead(self, hdr_bytes: int) -> float:
+        dllp = 2 * DLLP_BYTES / self.tlps_per_dllp
+        return framing_bytes(self.lane_rate_gtps) + TLP_SEQ_LCRC + hdr_bytes + dllp
+
+    def _mem_hdr(self) -> int:
+        return TLP_HDR_4DW if self.addr64 else TLP_HDR_3DW
+
+    def _wire_bytes(self, mode: Mode, size_bytes: int) -> Tuple[float, float]:
+        # bytes on the wire for one transfer, in the data direction and in
+        # the opposite direction
+        if mode == Mode.WRITE:
+            nr_tlps = math.ceil(size_bytes / self.max_payload)
+            return size_bytes + nr_tlps * self._tlp_overhead(self._mem_hdr()), 0.0
+
+        # one request per MRRS bytes, each answered by completions of up to
+        # completion_bytes, which always carry a 3DW header
+        nr_full, rest = divmod(size_bytes, self.max_read_req)
+        nr_req = nr_full + (rest > 0)
+        nr_cpl = nr_full * math.ceil(self.max_read_req / self.completion_bytes)
+        nr_cpl += math.ceil(rest / self.completion_bytes)
+        data = size_bytes + nr_cpl * self._tlp_overhead(TLP_HDR_3DW)
+        requests = nr_req * self._tlp_overhead(self._mem_hdr())
+        return data, requests
+
+    def _unit_bytes(self, mode: Mode) -> int:
+        # the repeating unit of an endless transfer
+        return self.max_payload if mode == Mode.WRITE else self.max_read_req
+
+    def efficiency(self, mode: Mode) -> float:
+        # payload share of the data direction
+        unit = self._unit_bytes(mode)
+        return unit / self._wire_bytes(mode, unit)[0]
+
+    def ceiling_MBps(self, mode: Mode, size_bytes: Optional[int] = None) -> float:
+        # asymptotic ceiling, or the ceiling for one transfer of size_bytes
+        # including the rounding up to whole TLPs. A READ is also bounded by
+        # its requests in the other direction, which only matters for tiny
+        # MRRS.
+        if size_bytes is None:
+            size_bytes = self._unit_bytes(mode)
+        data, opposite = self._wire_bytes(mode, size_bytes)
+        return self.link_MBps * size_bytes / max(data, opposite)
+
+    def duplex_ceiling_MBps(
+        self, reads: int, writes: int, size_bytes: Optional[int] = None
+    ) -> float:
+        # combined ceiling of a DUPLEX round of reads:writes transfers. The
+        # driver runs one DMA at a time, so the round takes the sum of the
+        # time of its transfers, each READ bounded by its completions and by
+        # its requests in the other direction.
+        if size_bytes is None:
+            size_bytes = math.lcm(self.max_payload, self.max_read_req)
+        read_s = size_bytes / self.ceiling_MBps(Mode.READ, size_bytes)
+        write_s = size_bytes / self.ceiling_MBps(Mode.WRITE, size_bytes)
+        return (reads + writes) * size_bytes / (reads * read_s + writes * write_s)
+
+    def percent_of_ceiling(
+        self, mode: Mode, size_bytes: int, throughput_mbps: float
+    ) -> float:
+        return throughput_mbps * 100 / self.ceiling_MBps(mode, size_bytes)
+
+    def percent_of_duplex_ceiling(
+        self, reads: int, writes: int, size_bytes: int, throughput_mbps: float
+    ) -> float:
+        return (
+            throughput_mbps * 100 / self.duplex_ceiling_MBps(reads, writes, size_bytes)
+        )
@@ -1,4 +1,14 @@
 import dataclasses
+import functools
+import os
+import re
+import struct
+from typing import List, Optional, Tuple
+
+SYSFS_DRIVER_PATH = "/sys/module/pp_sp_pcie/drivers/pci:pp_sp_pcie"
+CHAR_DEV_PREFIX = "pp_sp_pcie"
+
+_PCI_ADDR_RE = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$")
 
 
 @dataclasses.dataclass
@@ -8,14 +18,79 @@ class PcieStatsResult:
     max_speed_GBps: float
     subsystem_vendor: int
     subsystem_device: int
+    numa_node: int = -1
+    local_cpus: List[int] = dataclasses.field(default_factory=list)
+    # from the PCIe capability in config space, conservative defaults if the
+    # capability is not readable (unprivileged users only see 64 bytes)
+    max_payload: int = 128
+    max_read_req: int = 512
+    read_compl_boundary: int = 64
+    caps_from_config: bool = False
+
+
+PCI_CAP_PTR = 0x34
+PCI_CAP_ID_EXP = 0x10
+PCI_EXP_DEVCTL = 0x08
+PCI_EXP_LNKCTL = 0x10
+
+
+def encoding_efficiency(lane_rate_gtps: float) -> float:
+    if lane_rate_gtps <= 5.0:
+        return 8 / 10
+    elif lane_rate_gtps <= 32.0:
+        return 128 / 130
+    # Gen6 FLIT mode: 236 TLP bytes per 256-byte FLIT (DLP, CRC and FEC)
+    return 236 / 256
+
+
+def parse_pcie_caps(config: bytes) -> Optional[Tuple[int, int, int]]:
+    # walk the capability list for the PCI Express capability and return
+    # (max payload size, max read request size, read completion boundary)
+    if len(config) <= PCI_CAP_PTR:
+        return None
+    ptr = config[PCI_CAP_PTR] & 0xFC
+    visited = set()
+    while ptr and ptr not in visited and ptr + PCI_EXP_LNKCTL + 2 <= len(config):
+        visited.add(ptr)
+        if config[ptr] == PCI_CAP_ID_EXP:
+            (devctl,) = struct.unpack_from("<H", config, ptr + PCI_EXP_DEVCTL)
+            (lnkctl,) = struct.unpack_from("<H", config, ptr + PCI_EXP_LNKCTL)
+            max_payload = 128 << ((devctl >> 5) & 0x7)
+            max_read_req = 128 << ((devctl >> 12) & 0x7)
+            read_compl_boundary = 128 if lnkctl & (1 << 3) else 64
+            return max_payload, max_read_req, read_compl_boundary
+        ptr = config[ptr + 1] & 0xFC
+    return None
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    # sysfs cpulist format, e.g. "0-7,16-23"
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
 
 
 class PcieStats:
     @staticmethod
     def get_stats(char_dev_filename: str) -> PcieStatsResult:
+        dev_addr = PcieTopology.pci_addr(char_dev_filename)
+        if dev_addr is None:
+            # not bound to the driver (yet), assume the driver's naming
+            dev_addr = char_dev_filename.split("_")[-1]
+        return PcieStats.get_stats_by_addr(dev_addr)
 
-        dev_addr = char_dev_filename.split("_")[-1]
-        sysfs_path = f"/sys/module/pp_sp_pcie/drivers/pci:pp_sp_pcie/{dev_addr}"
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_stats_by_addr(dev_addr: str) -> PcieStatsResult:
+        # sysfs is read once per device, PcieTopology.scan(refresh=True) clears
+        sysfs_path = f"{SYSFS_DRIVER_PATH}/{dev_addr}"
 
         link_width_path = f"{sysfs_path}/current_link_width"
         link_width = open(link_width_path, "r").read().strip()
@@ -24,10 +99,7 @@ class PcieStats:
         link_speed = open(link_speed_path, "r").read().strip()
 
         lane_rate_gbps = float(link_speed.split(" ")[0])
-        if lane_rate_gbps == 2.5 or lane_rate_gbps == 5.0:
-            lane_rate_gbps *= 8 / 10
-        elif lane_rate_gbps == 8.0:
-            lane_rate_gbps *= 128 / 130
+        lane_rate_gbps *= encoding_efficiency(lane_rate_gbps)
 
         max_speed_GBps = lane_rate_gbps * int(link_width) / 8
 
@@ -39,10 +111,87 @@ class PcieStats:
         subsystem_device = open(subsystem_device_path, "r").read().strip()
         subsystem_device = int(subsystem_device, 0)
 
-        return PcieStatsResult(
+        numa_node_path = f"{sysfs_path}/numa_node"
+        numa_node = int(open(numa_node_path, "r").read().strip())
+
+        local_cpulist_path = f"{sysfs_path}/local_cpulist"
+        if os.path.exists(local_cpulist_path):
+            local_cpus = parse_cpulist(open(local_cpulist_path, "r").read())
+        else:
+            local_cpus = sorted(os.sched_getaffinity(0))
+
+        with open(f"{sysfs_path}/config", "rb") as f:
+            pcie_caps = parse_pcie_caps(f.read())
+
+        stats = PcieStatsResult(
             link_width=link_width,
             link_speed=link_speed,
             max_speed_GBps=max_speed_GBps,
             subsystem_vendor=subsystem_vendor,
             subsystem_device=subsystem_device,
+            numa_node=numa_node,
+            local_cpus=local_cpus,
         )
+        if pcie_caps is not None:
+            stats.max_payload = pcie_caps[0]
+            stats.max_read_req = pcie_caps[1]
+            stats.read_compl_boundary = pcie_caps[2]
+            stats.caps_from_config = True
+        return stats
+
+
+@dataclasses.dataclass
+class PcieInterface:
+    pci_addr: str
+    char_dev: str
+    stats: PcieStatsResult
+
+
+class PcieTopology:
+    _interfaces: Optional[List[PcieInterface]] = None
+
+    @classmethod
+    def scan(cls, refresh: bool = False) -> List[PcieInterface]:
+        # every interface bound to the driver, scanned once and cached
+        if cls._interfaces is not None and not refresh:
+            return cls._interfaces
+
+        PcieStats.get_stats_by_addr.cache_clear()
+        interfaces = []
+        if os.path.isdir(SYSFS_DRIVER_PATH):
+            for entry in sorted(os.listdir(SYSFS_DRIVER_PATH)):
+                if not _PCI_ADDR_RE.match(entry):
+                    continue
+                interfaces.append(
+                    PcieInterface(
+                        pci_addr=entry,
+                        char_dev=cls._char_dev(entry),
+                        stats=PcieStats.get_stats_by_addr(entry),
+                    )
+                )
+
+        cls._interfaces = interfaces
+        return interfaces
+
+    @classmethod
+    def pci_addr(cls, char_dev_filename: str) -> Optional[str]:
+        # PCI address of the interface behind a character device, also when
+        # it is opened through a link
+        path = os.path.realpath(char_dev_filename)
+        try:
+            interfaces = cls.scan()
+        except OSError:
+            return None
+        for iface in interfaces:
+            if os.path.realpath(iface.char_dev) == path:
+                return iface.pci_addr
+        return None
+
+    @staticmethod
+    def _char_dev(pci_addr: str) -> str:
+        class_path = f"{SYSFS_DRIVER_PATH}/{pci_addr}/{CHAR_DEV_PREFIX}"
+        if os.path.isdir(class_path):
+            names = os.listdir(class_path)
+            if names:
+                return f"/dev/{names[0]}"
+        return f"/dev/{CHAR_DEV_PREFIX}_{pci_addr}"
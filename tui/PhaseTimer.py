@@ -0,0 +1,102 @@
+import time
+from typing import Dict
+
+# 4 bins per octave of nanoseconds, up to 2**40 ns
+BINS_PER_OCTAVE = 4
+NR_BINS = 41 * BINS_PER_OCTAVE
+
+
+class PhaseHist:
+    __slots__ = ("count", "sum", "max", "bins")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.bins = [0] * NR_BINS
+
+    def add(self, ns: int):
+        self.count += 1
+        self.sum += ns
+        if ns > self.max:
+            self.max = ns
+        # bit length selects the octave, the two bits below the top bit the
+        # quarter within it
+        if ns < 4:
+            idx = max(ns, 0)
+        else:
+            b = ns.bit_length()
+            idx = min(b * BINS_PER_OCTAVE + ((ns >> (b - 3)) & 3), NR_BINS - 1)
+        self.bins[idx] += 1
+
+    @staticmethod
+    def _bin_mid(idx: int) -> float:
+        b, quarter = divmod(idx, BINS_PER_OCTAVE)
+        if b < 3:
+            return float(idx)
+        return (2 * (4 + quarter) + 1) * 2.0 ** (b - 4)
+
+    def percentile(self, q: float) -> float:
+        # middle of the bin holding the q-th percentile, within 12.5 %
+        if self.count == 0:
+            return float("nan")
+        rank = q / 100 * self.count
+        acc = 0
+        for idx, n in enumerate(self.bins):
+            acc += n
+            if n and acc >= rank:
+                return min(self._bin_mid(idx), float(self.max))
+        return float(self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else float("nan")
+
+
+class PhaseTimer:
+    # Spans between consecutive mark() calls, each added to the histogram
+    # of the phase that just ended. Callers skip all calls if no timer is
+    # configured, so a disabled timer costs one None check per phase.
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseHist] = {}
+        self.t_last = 0
+
+    def start(self):
+        self.t_last = time.perf_counter_ns()
+
+    def mark(self, phase: str) -> int:
+        now = time.perf_counter_ns()
+        ns = now - self.t_last
+        self.t_last = now
+        self.add(phase, ns)
+        return ns
+
+    def add(self, phase: str, ns: int):
+        try:
+            self.phases[phase].add(ns)
+        except KeyError:
+            self.phases[phase] = PhaseHist()
+            self.phases[phase].add(ns)
+
+    def reset(self):
+        self.phases = {}
+
+    def summary(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "count": h.count,
+                "mean_ns": h.mean,
+                "p50_ns": h.percentile(50),
+                "p99_ns": h.percentile(99),
+                "max_ns": h.max,
+            }
+            for name, h in self.phases.items()
+        }
+
+    def format(self) -> str:
+        # p50/p99 per phase in us
+        return ", ".join(
+            f"{name} {h.percentile(50) / 1000:.1f}/{h.percentile(99) / 1000:.1f}"
+            for name, h in self.phases.items()
+        )
@@ -0,0 +1,218 @@
+import array
+import errno
+import fcntl
+import mmap
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from HwModules import (
+    AVALON_ST_CHECK_OFFS,
+    AVALON_ST_GEN_OFFS,
+    AvalonStCheck,
+    AvalonStGen,
+    pp_sp_tx_cmd_resp,
+)
+from PcieStats import PcieStats, PcieStatsResult, encoding_efficiency
+from PpSpIoctls import PpSpIoctls
+
+BAR0_SIZE = 4 * 1024 * 1024
+DMA_BUFFER_SIZE = 4 * 1024 * 1024
+
+SIM_PREFIX = "sim"
+
+
+class PpSpDevice(ABC):
+    name: str
+    # BAR0, either a raw mapping or a word-addressed register view
+    bar0: object
+    # 32-bit word view of BAR0 shared by all register modules of the device
+    regs32: object
+
+    @abstractmethod
+    def start_tx(self, dir_wr_rd_n: int, size_bytes: int) -> int:
+        ...
+
+    @abstractmethod
+    def get_buffer(self, buf: bytearray):
+        ...
+
+    @abstractmethod
+    def set_buffer(self, buf: bytearray):
+        ...
+
+    @abstractmethod
+    def get_pcie_stats(self) -> PcieStatsResult:
+        ...
+
+    def close(self):
+        pass
+
+
+class CharDevice(PpSpDevice):
+    def __init__(self, char_dev_filename: str):
+        self.name = char_dev_filename
+        self.fd = os.open(char_dev_filename, os.O_RDWR)
+        self.bar0 = mmap.mmap(self.fd, BAR0_SIZE)
+        # the only export of the mapping, so that close() can release it
+        self.regs32 = memoryview(self.bar0).cast("I")
+
+    def start_tx(self, dir_wr_rd_n: int, size_bytes: int) -> int:
+        cmd_resp = pp_sp_tx_cmd_resp(dir_wr_rd_n, size_bytes, 0)
+        ret = fcntl.ioctl(self.fd, PpSpIoctls.PP_SP_IOCTL_START_TX, bytes(cmd_resp))
+        return pp_sp_tx_cmd_resp.from_buffer_copy(ret).duration_ns
+
+    def get_buffer(self, buf: bytearray):
+        # buf is larger than 1024 B, fcntl passes the pointer directly
+        fcntl.ioctl(self.fd, PpSpIoctls.PP_SP_IOCTL_GET_BUFFER, buf, True)
+
+    def set_buffer(self, buf: bytearray):
+        fcntl.ioctl(self.fd, PpSpIoctls.PP_SP_IOCTL_SET_BUFFER, buf, False)
+
+    def get_pcie_stats(self) -> PcieStatsResult:
+        return PcieStats.get_stats(self.name)
+
+    def close(self):
+        self.regs32.release()
+        self.bar0.close()
+        os.close(self.fd)
+
+
+class SimRegs:
+    format = "I"
+
+    def __init__(self, nr_words: int):
+        self.words = array.array("I", bytes(4 * nr_words))
+        self.view = memoryview(self.words)
+        self.on_write = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, idx):
+        return self.view[idx]
+
+    def __setitem__(self, idx, data):
+        self.words[idx] = data
+        handler = self.on_write.get(idx)
+        if handler is not None:
+            handler(data)
+
+
+class SimDevice(PpSpDevice):
+    def __init__(
+        self,
+        name: str = SIM_PREFIX,
+        bandwidth_mbps: float = 3000.0,
+        latency_us: float = 5.0,
+        subsystem_device: int = 0x1,
+        realtime: bool = True,
+    ):
+        self.name = name
+        self.bandwidth_mbps = bandwidth_mbps
+        self.latency_us = latency_us
+        self.subsystem_device = subsystem_device
+        self.realtime = realtime
+
+        self.bar0 = SimRegs(BAR0_SIZE // 4)
+        self.regs32 = self.bar0
+        self.dma_buf = bytearray(DMA_BUFFER_SIZE)
+        self.dma_buf_u16 = np.frombuffer(self.dma_buf, dtype="uint16")
+        self.pattern_u16 = np.arange(0, DMA_BUFFER_SIZE // 2, dtype="uint16")
+        self.lock = threading.Lock()
+
+        gen = AVALON_ST_GEN_OFFS // 4
+        check = AVALON_ST_CHECK_OFFS // 4
+        self.gen_idx = {reg.name: gen + reg.addr // 4 for reg in AvalonStGen.REGS}
+        self.check_idx = {reg.name: check + reg.addr // 4 for reg in AvalonStCheck.REGS}
+        self.bar0.on_write[self.gen_idx["CTRL"]] = self._gen_ctrl_write
+        self.bar0.on_write[self.check_idx["SAMP_TOT"]] = self._check_clear_write
+
+    def _gen_ctrl_write(self, data: int):
+        if data & 1:
+            self.bar0.words[self.gen_idx["STATUS"]] = 1
+            self.bar0.words[self.gen_idx["SAMPLES_TX"]] = 0
+
+    def _check_clear_write(self, data: int):
+        self.bar0.words[self.check_idx["SAMP_TOT"]] = 0
+        self.bar0.words[self.check_idx["SAMP_OK"]] = 0
+
+    def model_duration_ns(self, size_bytes: int) -> int:
+        return int(self.latency_us * 1e3 + size_bytes * 1e3 / self.bandwidth_mbps)
+
+    def start_tx(self, dir_wr_rd_n: int, size_bytes: int) -> int:
+        if (size_bytes & 3) or size_bytes == 0 or size_bytes > DMA_BUFFER_SIZE:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+
+        duration_ns = self.model_duration_ns(size_bytes)
+        t0 = time.perf_counter_ns()
+
+        words = self.bar0.words
+        nr_samp = size_bytes // 2
+        with self.lock:
+            if dir_wr_rd_n:
+                # generator streams the counter pattern into host memory
+                if words[self.gen_idx["STATUS"]] & 1:
+                    nr_bytes = min(words[self.gen_idx["SAMPLES"]], size_bytes)
+                    n = nr_bytes // 2
+                    self.dma_buf_u16[0:n] = self.pattern_u16[0:n]
+                    words[self.gen_idx["SAMPLES_TX"]] = nr_bytes
+                    words[self.gen_idx["STATUS"]] = 0
+            else:
+                # checker compares host memory against the counter pattern
+                nr_ok = np.count_nonzero(
+                    self.dma_buf_u16[0:nr_samp] == self.pattern_u16[0:nr_samp]
+                )
+                words[self.check_idx["SAMP_TOT"]] += size_bytes
+                words[self.check_idx["SAMP_OK"]] += int(nr_ok) * 2
+
+        if self.realtime:
+            remaining_ns = duration_ns - (time.perf_counter_ns() - t0)
+            if remaining_ns > 0:
+                time.sleep(remaining_ns * 1e-9)
+
+        return duration_ns
+
+    def get_buffer(self, buf: bytearray):
+        with self.lock:
+            buf[0:DMA_BUFFER_SIZE] = self.dma_buf
+
+    def set_buffer(self, buf: bytearray):
+        with self.lock:
+            self.dma_buf[:] = buf[0:DMA_BUFFER_SIZE]
+
+    def get_pcie_stats(self) -> PcieStatsResult:
+        return PcieStatsResult(
+            link_width="8",
+            link_speed="8.0 GT/s PCIe",
+            max_speed_GBps=8.0 * encoding_efficiency(8.0) * 8 / 8,
+            subsystem_vendor=0x1A2,
+            subsystem_device=self.subsystem_device,
+            local_cpus=sorted(os.sched_getaffinity(0)),
+            max_payload=256,
+            max_read_req=512,
+            read_compl_boundary=64,
+        )
+
+
+def open_device(name: str) -> PpSpDevice:
+    # "sim[:key=val,...]" selects the simulator, e.g. "sim:bw=2500,lat=8,if=1"
+    if not name.startswith(SIM_PREFIX):
+        return CharDevice(name)
+
+    opts = {}
+    if ":" in name:
+        for opt in name.split(":", 1)[1].split(","):
+            key, val = opt.split("=")
+            opts[key.strip()] = val.strip()
+
+    return SimDevice(
+        name=name,
+        bandwidth_mbps=float(opts.get("bw", 3000.0)),
+        latency_us=float(opts.get("lat", 5.0)),
+        subsystem_device=int(opts.get("if", 0)) + 1,
+        realtime=opts.get("realtime", "1") != "0",
+    )
@@ -1,11 +1,21 @@
+import collections
 import dataclasses
 import enum
+import threading
+from typing import List, Optional
+
+from Wakeup import Wakeup
+
+TRANSFER_SIZE_MIN = 128
+TRANSFER_SIZE_MAX = 4 * 1024 * 1024
 
 
 class Mode(enum.Enum):
     IDLE = 0
     WRITE = 1
     READ = 2
+    # READ and WRITE transfers interleaved on one interface
+    DUPLEX = 3
 
 
 @dataclasses.dataclass
@@ -20,3 +30,51 @@ class MsgResp:
     msg: str
     read_throughput: float
     write_throughput: float
+    # extra line for the log, e.g. per-phase timings
+    detail: Optional[str] = None
+
+
+class RespChannel:
+    # Responses from an IoThread to the GUI. The latest response is kept in a
+    # mailbox for the gauges, all responses go to a bounded ring for the
+    # statistics. When the consumer falls behind, the oldest samples are
+    # dropped and counted instead of the backlog growing.
+
+    def __init__(self, ring_size: int = 1024, wakeup: Optional[Wakeup] = None):
+        self.lock = threading.Lock()
+        self.wakeup = wakeup
+        self.latest: Optional[MsgResp] = None
+        self.ring = collections.deque(maxlen=ring_size)
+
+        self.nr_put = 0
+        self.nr_overrun = 0  # samples pushed out of the ring before being read
+        self.nr_coalesced = 0  # mailbox values replaced before being read
+
+    def put(self, resp: MsgResp):
+        with self.lock:
+            was_empty = self.latest is None
+            if not was_empty:
+                self.nr_coalesced += 1
+            self.latest = resp
+            if len(self.ring) == self.ring.maxlen:
+                self.nr_overrun += 1
+            self.ring.append(resp)
+            self.nr_put += 1
+
+        # one wakeup per batch, the consumer drains everything at once
+        if was_empty and self.wakeup is not None:
+            self.wakeup.notify()
+
+    def take_latest(self) -> Optional[MsgResp]:
+        with self.lock:
+            resp, self.latest = self.latest, None
+            return resp
+
+    def drain_samples(self) -> List[MsgResp]:
+        with self.lock:
+            samples = list(self.ring)
+            self.ring.clear()
+            return samples
+
+    def backlog(self) -> int:
+        return len(self.ring)
@@ -0,0 +1,219 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from QueueMsg import Mode, MsgResp, RespChannel
+
+if TYPE_CHECKING:
+    from TransferEngine import TransferResult
+
+# File layout: a header followed by fixed-width records.
+#
+#   0  magic       8 B   b"PPSPREC1"
+#   8  rec_size    4 B
+#  12  meta_len    4 B   length of the JSON metadata that follows at 24
+#  16  count       8 B   number of valid records, updated on flush
+#  24  metadata    JSON (interfaces, start time, ...)
+#
+# Records start at the next page boundary after the metadata and are
+# appended through a memory map that is grown in chunks, so appending a
+# record is a few stores.
+
+MAGIC = b"PPSPREC1"
+PAGE_SIZE = 4096
+_HDR_FMT = "<8sIIQ"
+_HDR_SIZE = struct.calcsize(_HDR_FMT)
+
+
+def _data_offset(meta_len: int) -> int:
+    return -(-(_HDR_SIZE + meta_len) // PAGE_SIZE) * PAGE_SIZE
+
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp_ns", "<u8"),
+        ("duration_ns", "<u8"),
+        ("samp_tot", "<u8"),
+        ("samp_ok", "<u8"),
+        ("size_bytes", "<u4"),
+        ("interface", "<u2"),
+        ("mode", "u1"),
+        ("_pad", "u1"),
+    ]
+)
+
+
+class Recorder:
+    def __init__(
+        self, filename: str, metadata: Optional[dict] = None, chunk: int = 1 << 20
+    ):
+        meta = json.dumps(metadata or {}).encode()
+
+        self.filename = filename
+        self.chunk = chunk
+        self.lock = threading.Lock()
+        self.count = 0
+        self.capacity = 0
+        self.data_offs = _data_offset(len(meta))
+
+        self.f = open(filename, "w+b")
+        hdr = struct.pack(_HDR_FMT, MAGIC, RECORD_DTYPE.itemsize, len(meta), 0)
+        self.f.write(hdr + meta)
+        self._mmap = None
+        self.records = None
+        self._grow()
+
+    def _unmap(self):
+        # the record array exports the mapping, drop it before closing
+        self.records = None
+        self._mmap.flush()
+        self._mmap.close()
+        self._mmap = None
+
+    def _grow(self):
+        if self._mmap is not None:
+            self._unmap()
+        self.capacity += self.chunk
+        size = self.capacity * RECORD_DTYPE.itemsize
+        self.f.truncate(self.data_offs + size)
+        self._mmap = mmap.mmap(self.f.fileno(), size, offset=self.data_offs)
+        self.records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE)
+
+    def append(
+        self, interface: int, res: "TransferResult", timestamp_ns: Optional[int] = None
+    ):
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        with self.lock:
+            if self.count == self.capacity:
+                self._grow()
+            self.records[self.count] = (
+                timestamp_ns,
+                res.duration_ns,
+                res.samp_tot,
+                res.samp_ok,
+                res.size_bytes,
+                interface,
+                res.mode.value,
+                0,
+            )
+            self.count += 1
+
+    def flush(self):
+        with self.lock:
+            self._mmap.flush()
+            self.f.seek(16)
+            self.f.write(struct.pack("<Q", self.count))
+            self.f.flush()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self._unmap()
+            # drop the unused preallocated tail
+            self.f.truncate(self.data_offs + self.count * RECORD_DTYPE.itemsize)
+            self.f.close()
+
+
+class Recording:
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            magic, rec_size, meta_len, count = struct.unpack(
+                _HDR_FMT, f.read(_HDR_SIZE)
+            )
+            if magic != MAGIC or rec_size != RECORD_DTYPE.itemsize:
+                raise ValueError(f"{filename}: not a recording")
+            self.metadata = json.loads(f.read(meta_len))
+
+        data_offs = _data_offset(meta_len)
+        capacity = (os.path.getsize(filename) - data_offs) // rec_size
+        if capacity <= 0:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+            return
+        records = np.memmap(
+            filename, dtype=RECORD_DTYPE, mode="r", offset=data_offs, shape=(capacity,)
+        )
+        # a recording that was not closed cleanly may hold records past the
+        # last flushed count, the preallocated tail is zero
+        if count < capacity:
+            tail = np.flatnonzero(records["timestamp_ns"][count:])
+            if len(tail):
+                count += int(tail[-1]) + 1
+        self.records = records[:count]
+
+    def __len__(self):
+        return len(self.records)
+
+    def throughput_mbps(self, records: Optional[np.ndarray] = None) -> np.ndarray:
+        r = self.records if records is None else records
+        return r["size_bytes"] * 1e3 / r["duration_ns"]
+
+    def summarize(self) -> List[Dict]:
+        # one row per (interface, mode, size), computed on whole columns
+        r = self.records
+        if len(r) == 0:
+            return []
+        keys = np.stack([r["interface"], r["mode"], r["size_bytes"]]).astype(np.int64)
+        uniq, inverse = np.unique(keys, axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(uniq.shape[1] + 1))
+
+        throughput = self.throughput_mbps()
+        rows = []
+        for i in range(uniq.shape[1]):
+            idx = order[bounds[i] : bounds[i + 1]]
+            tp = throughput[idx]
+            dur = r["duration_ns"][idx]
+            rows.append(
+                {
+                    "interface": int(uniq[0, i]),
+                    "mode": Mode(int(uniq[1, i])).name,
+                    "size_bytes": int(uniq[2, i]),
+                    "count": int(len(idx)),
+                    "throughput_median_mbps": float(np.median(tp)),
+                    "throughput_p1_mbps": float(np.percentile(tp, 1)),
+                    "duration_median_ns": float(np.median(dur)),
+                    "duration_p99_ns": float(np.percentile(dur, 99)),
+                    "samp_tot": int(r["samp_tot"][idx].sum()),
+                    "samp_ok": int(r["samp_ok"][idx].sum()),
+                }
+            )
+        return rows
+
+    def replay(self, channels: List[RespChannel], speed: float = 1.0):
+        # push the records into per-interface channels at the recorded pace
+        r = self.records
+        if len(r) == 0:
+            return
+        t_rec0 = int(r["timestamp_ns"][0])
+        t0 = time.monotonic()
+        throughput = self.throughput_mbps()
+        for i in range(len(r)):
+            rec = r[i]
+            if speed > 0:
+                delay = (int(rec["timestamp_ns"]) - t_rec0) * 1e-9 / speed
+                delay -= time.monotonic() - t0
+                if delay > 0:
+                    time.sleep(delay)
+
+            mode = Mode(int(rec["mode"]))
+            tp = float(throughput[i])
+            duration_us = int(rec["duration_ns"]) / 1000
+            msg = (
+                f"replay: {mode}, {int(rec['size_bytes'])} B, {duration_us:.3f} us, "
+                f"check = {int(rec['samp_ok'])}/{int(rec['samp_tot'])}"
+            )
+            channels[int(rec["interface"])].put(
+                MsgResp(
+                    msg,
+                    tp if mode == Mode.READ else 0,
+                    tp if mode == Mode.WRITE else 0,
+                )
+            )
@@ -0,0 +1,272 @@
+import dataclasses
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from QueueMsg import TRANSFER_SIZE_MAX, TRANSFER_SIZE_MIN, Mode
+from TransferEngine import TransferEngine
+
+# Scenario file (JSON):
+#
+# {
+#   "name": "bursty mix",
+#   "seed": 1,
+#   "phases": [
+#     {
+#       "name": "background",
+#       "duration_s": 5,
+#       "rate_hz": 2000,
+#       "arrival": "poisson",                 # or "constant"
+#       "mix": {"READ": 0.7, "WRITE": 0.3},
+#       "sizes": {"dist": "choice", "values": [4096, 65536], "weights": [9, 1]},
+#       "interfaces": [0, 1]                  # optional, default all
+#     }
+#   ]
+# }
+#
+# Size distributions: {"dist": "fixed", "value": n},
+# {"dist": "choice", "values": [...], "weights": [...]},
+# {"dist": "uniform", "min": a, "max": b} and
+# {"dist": "lognormal", "median": m, "sigma": s}. Sizes are rounded to
+# "align" bytes (default 4) and clipped to the valid transfer sizes.
+
+ARRIVALS = ("poisson", "constant")
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("phase", "u1"),
+        ("interface", "u2"),
+        ("mode", "u1"),
+        ("size_bytes", "u4"),
+        # ns since the scenario start: scheduled arrival, start and end of
+        # the transfer on the interface's worker
+        ("arrival_ns", "i8"),
+        ("start_ns", "i8"),
+        ("end_ns", "i8"),
+        ("duration_ns", "u8"),
+        ("samp_tot", "u8"),
+        ("samp_ok", "u8"),
+        ("samp_expected", "u8"),
+        # requests waiting for the interface when this one arrived
+        ("queue_depth", "u4"),
+    ]
+)
+
+
+def draw_sizes(spec: dict, rng: np.random.Generator, n: int) -> np.ndarray:
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        sizes = np.full(n, spec["value"], dtype=np.float64)
+    elif dist == "choice":
+        weights = np.asarray(spec.get("weights", [1] * len(spec["values"])), float)
+        sizes = rng.choice(spec["values"], size=n, p=weights / weights.sum())
+    elif dist == "uniform":
+        sizes = rng.uniform(spec["min"], spec["max"], size=n)
+    elif dist == "lognormal":
+        sizes = rng.lognormal(np.log(spec["median"]), spec["sigma"], size=n)
+    else:
+        raise ValueError(f"unknown size distribution '{dist}'")
+
+    align = spec.get("align", 4)
+    sizes = np.round(np.asarray(sizes, dtype=np.float64) / align) * align
+    return np.clip(sizes, TRANSFER_SIZE_MIN, TRANSFER_SIZE_MAX).astype(np.uint32)
+
+
+@dataclasses.dataclass
+class Phase:
+    name: str
+    duration_s: float
+    rate_hz: float
+    arrival: str = "poisson"
+    mix: Dict[str, float] = dataclasses.field(default_factory=lambda: {"READ": 1.0})
+    sizes: dict = dataclasses.field(
+        default_factory=lambda: {"dist": "fixed", "value": 4096}
+    )
+    interfaces: Optional[List[int]] = None
+
+    def validate(self, nr_ifaces: int):
+        if self.arrival not in ARRIVALS:
+            raise ValueError(f"{self.name}: arrival must be one of {ARRIVALS}")
+        if self.duration_s <= 0 or self.rate_hz <= 0:
+            raise ValueError(f"{self.name}: duration_s and rate_hz must be positive")
+        for mode in self.mix:
+            if mode not in ("READ", "WRITE"):
+                raise ValueError(f"{self.name}: unknown mode '{mode}' in mix")
+        for idx in self.interfaces or []:
+            if not 0 <= idx < nr_ifaces:
+                raise ValueError(f"{self.name}: no interface {idx}")
+
+    def generate(self, rng: np.random.Generator, nr_ifaces: int) -> np.ndarray:
+        # arrival offsets within the phase, mode, size and interface per request
+        if self.arrival == "poisson":
+            n_max = int(self.rate_hz * self.duration_s * 1.2 + 10)
+            t = np.cumsum(rng.exponential(1 / self.rate_hz, size=n_max))
+            while t[-1] < self.duration_s:
+                more = np.cumsum(rng.exponential(1 / self.rate_hz, size=n_max))
+                t = np.concatenate((t, t[-1] + more))
+            t = t[t < self.duration_s]
+        else:
+            t = np.arange(0, self.duration_s, 1 / self.rate_hz)
+        n = len(t)
+
+        reqs = np.zeros(n, dtype=RECORD_DTYPE)
+        reqs["arrival_ns"] = np.round(t * 1e9).astype(np.int64)
+
+        names = list(self.mix)
+        weights = np.array([self.mix[m] for m in names], dtype=np.float64)
+        modes = np.array([Mode[m].value for m in names], dtype=np.uint8)
+        reqs["mode"] = modes[rng.choice(len(names), size=n, p=weights / weights.sum())]
+        reqs["size_bytes"] = draw_sizes(self.sizes, rng, n)
+
+        ifaces = np.array(self.interfaces or range(nr_ifaces), dtype=np.uint16)
+        reqs["interface"] = ifaces[np.arange(n) % len(ifaces)]
+        return reqs
+
+
+@dataclasses.dataclass
+class Scenario:
+    name: str
+    phases: List[Phase]
+    seed: Optional[int] = None
+
+    @classmethod
+    def load(cls, filename: str) -> "Scenario":
+        with open(filename) as f:
+            desc = json.load(f)
+        phases = [Phase(**p) for p in desc["phases"]]
+        if not phases:
+            raise ValueError(f"{filename}: no phases")
+        return cls(desc.get("name", filename), phases, desc.get("seed"))
+
+    def generate(self, nr_ifaces: int) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        parts = []
+        t0_ns = 0
+        for idx, phase in enumerate(self.phases):
+            phase.validate(nr_ifaces)
+            reqs = phase.generate(rng, nr_ifaces)
+            reqs["phase"] = idx
+            reqs["arrival_ns"] += t0_ns
+            parts.append(reqs)
+            t0_ns += round(phase.duration_s * 1e9)
+        return np.concatenate(parts)
+
+
+class ScenarioWorker(threading.Thread):
+    # Serves the requests of one interface in arrival order and fills in
+    # their timestamps and results
+
+    def __init__(self, engine: TransferEngine, reqs: np.ndarray):
+        self.engine = engine
+        self.reqs = reqs
+        self.queue = queue.SimpleQueue()
+        self.t0_ns = 0
+        self.error: Optional[BaseException] = None
+        super().__init__(daemon=True)
+
+    def run(self):
+        reqs = self.reqs
+        while True:
+            idx = self.queue.get()
+            if idx is None:
+                return
+            try:
+                start_ns = time.perf_counter_ns()
+                mode = Mode(int(reqs["mode"][idx]))
+                res = self.engine.transfer(mode, int(reqs["size_bytes"][idx]))
+                end_ns = time.perf_counter_ns()
+            except BaseException as exc:
+                self.error = exc
+                return
+            reqs["start_ns"][idx] = start_ns - self.t0_ns
+            reqs["end_ns"][idx] = end_ns - self.t0_ns
+            reqs["duration_ns"][idx] = res.duration_ns
+            reqs["samp_tot"][idx] = res.samp_tot
+            reqs["samp_ok"][idx] = res.samp_ok
+            if res.samp_expected is not None:
+                reqs["samp_expected"][idx] = res.samp_expected
+            else:
+                reqs["samp_expected"][idx] = res.samp_tot
+
+
+def run_scenario(scenario: Scenario, engines: List[TransferEngine]) -> np.ndarray:
+    # Open loop: requests are released at their scheduled arrival time no
+    # matter how far behind the interfaces are, and latency is measured
+    # from that time, so queueing delay is part of it.
+    reqs = scenario.generate(len(engines))
+    workers = [ScenarioWorker(engine, reqs) for engine in engines]
+    for w in workers:
+        w.start()
+
+    t0_ns = time.perf_counter_ns() + 10_000_000
+    for w in workers:
+        w.t0_ns = t0_ns
+
+    arrivals = reqs["arrival_ns"] + t0_ns
+    idx = 0
+    n = len(reqs)
+    while idx < n:
+        now = time.perf_counter_ns()
+        if arrivals[idx] > now:
+            time.sleep((arrivals[idx] - now) * 1e-9)
+            continue
+        # release everything that is due, the sleep may have overshot
+        while idx < n and arrivals[idx] <= now:
+            w = int(reqs["interface"][idx])
+            reqs["queue_depth"][idx] = workers[w].queue.qsize()
+            workers[w].queue.put(idx)
+            idx += 1
+        if any(w.error is not None for w in workers):
+            break
+
+    for w in workers:
+        w.queue.put(None)
+    for w in workers:
+        w.join()
+    for w in workers:
+        if w.error is not None:
+            raise w.error
+    return reqs
+
+
+def summarize(scenario: Scenario, reqs: np.ndarray) -> List[dict]:
+    rows = []
+    for p_idx, phase in enumerate(scenario.phases):
+        in_phase = reqs[reqs["phase"] == p_idx]
+        for iface in np.unique(in_phase["interface"]):
+            for mode in np.unique(in_phase["mode"]):
+                r = in_phase[
+                    (in_phase["interface"] == iface) & (in_phase["mode"] == mode)
+                ]
+                latency_us = (r["end_ns"] - r["arrival_ns"]) / 1000
+                queued_us = (r["start_ns"] - r["arrival_ns"]) / 1000
+                service_us = (r["end_ns"] - r["start_ns"]) / 1000
+                lat = np.percentile(latency_us, [50, 99, 99.9])
+                rows.append(
+                    {
+                        "phase": phase.name,
+                        "interface": int(iface),
+                        "mode": Mode(int(mode)).name,
+                        "count": len(r),
+                        "rate_hz": len(r) / phase.duration_s,
+                        "bytes": int(r["size_bytes"].sum()),
+                        "latency_p50_us": float(lat[0]),
+                        "latency_p99_us": float(lat[1]),
+                        "latency_p999_us": float(lat[2]),
+                        "latency_max_us": float(latency_us.max()),
+                        "queued_p99_us": float(np.percentile(queued_us, 99)),
+                        "service_p99_us": float(np.percentile(service_us, 99)),
+                        "duration_p99_us": float(
+                            np.percentile(r["duration_ns"], 99) / 1000
+                        ),
+                        "queue_depth_max": int(r["queue_depth"].max()),
+                        "samp_tot": int(r["samp_tot"].sum()),
+                        "samp_ok": int(r["samp_ok"].sum()),
+                        "samp_expected": int(r["samp_expected"].sum()),
+                    }
+                )
+    return rows
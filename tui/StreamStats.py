@@ -0,0 +1,161 @@
+import collections
+import math
+from typing import Optional, Tuple
+
+
+class StreamStats:
+    # Constant-time statistics over a stream of samples:
+    #  - min/mean/max over the last `window` samples (ring buffer, running sum
+    #    and monotonic deques),
+    #  - exponentially weighted moving average,
+    #  - percentiles over all samples from a log-spaced histogram, the relative
+    #    error is bounded by the bin width (10 ** (1 / bins_per_decade) - 1)
+
+    def __init__(
+        self,
+        window: int = 100,
+        ewma_alpha: float = 0.1,
+        hist_min: float = 1e-3,
+        hist_max: float = 1e12,
+        bins_per_decade: int = 50,
+    ):
+        self.window = window
+        self.ewma_alpha = ewma_alpha
+
+        self.hist_min = hist_min
+        self.bins_per_decade = bins_per_decade
+        self._log_min = math.log10(hist_min)
+        nr_bins = int(
+            math.ceil((math.log10(hist_max) - self._log_min) * bins_per_decade)
+        )
+        # bin 0 collects underflow (incl. zero), the last bin collects overflow
+        self.hist = [0] * (nr_bins + 2)
+
+        self.reset()
+
+    def reset(self):
+        self._ring = [0.0] * self.window
+        self._ring_idx = 0
+        self._ring_len = 0
+        self._ring_sum = 0.0
+        self._min_deque = collections.deque()
+        self._max_deque = collections.deque()
+
+        self.count = 0
+        self.last: Optional[float] = None
+        self.ewma: Optional[float] = None
+        self.total_sum = 0.0
+        self.total_min = math.inf
+        self.total_max = -math.inf
+        for i in range(len(self.hist)):
+            self.hist[i] = 0
+
+    def _bin(self, val: float) -> int:
+        if val < self.hist_min:
+            return 0
+        idx = int((math.log10(val) - self._log_min) * self.bins_per_decade) + 1
+        return min(idx, len(self.hist) - 1)
+
+    def _bin_value(self, idx: int) -> float:
+        # geometric center of the bin
+        return 10 ** (self._log_min + (idx - 0.5) / self.bins_per_decade)
+
+    def update(self, val: float):
+        seq = self.count
+        self.count += 1
+        self.last = val
+
+        # ring buffer with a running sum; resummed once per wrap to bound drift
+        old = self._ring[self._ring_idx]
+        self._ring[self._ring_idx] = val
+        self._ring_idx += 1
+        if self._ring_len < self.window:
+            self._ring_len += 1
+            self._ring_sum += val
+        else:
+            self._ring_sum += val - old
+        if self._ring_idx == self.window:
+            self._ring_idx = 0
+            self._ring_sum = math.fsum(self._ring)
+
+        # monotonic deques hold (seq, val) candidates for the window min/max
+        while self._min_deque and self._min_deque[-1][1] >= val:
+            self._min_deque.pop()
+        self._min_deque.append((seq, val))
+        while self._max_deque and self._max_deque[-1][1] <= val:
+            self._max_deque.pop()
+        self._max_deque.append((seq, val))
+        oldest = seq - self.window
+        if self._min_deque[0][0] <= oldest:
+            self._min_deque.popleft()
+        if self._max_deque[0][0] <= oldest:
+            self._max_deque.popleft()
+
+        if self.ewma is None:
+            self.ewma = val
+        else:
+            self.ewma += self.ewma_alpha * (val - self.ewma)
+
+        self.total_sum += val
+        self.total_min = min(self.total_min, val)
+        self.total_max = max(self.total_max, val)
+        self.hist[self._bin(val)] += 1
+
+    @property
+    def window_min(self) -> float:
+        return self._min_deque[0][1] if self._min_deque else math.nan
+
+    @property
+    def window_max(self) -> float:
+        return self._max_deque[0][1] if self._max_deque else math.nan
+
+    @property
+    def window_mean(self) -> float:
+        return self._ring_sum / self._ring_len if self._ring_len else math.nan
+
+    @property
+    def total_mean(self) -> float:
+        return self.total_sum / self.count if self.count else math.nan
+
+    def percentiles(self, *qs: float) -> Tuple[float, ...]:
+        # single pass over the histogram for all requested (ascending) q
+        if self.count == 0:
+            return tuple(math.nan for _ in qs)
+        res = []
+        q_iter = iter(qs)
+        q = next(q_iter, None)
+        acc = 0
+        # only the occupied span of the histogram has to be scanned
+        hist = self.hist
+        for idx in range(self._bin(self.total_min), self._bin(self.total_max) + 1):
+            nr = hist[idx]
+            if nr == 0:
+                continue
+            acc += nr
+            if idx == 0:
+                val = self.total_min
+            else:
+                val = min(max(self._bin_value(idx), self.total_min), self.total_max)
+            while q is not None and acc >= q / 100 * self.count:
+                res.append(val)
+                q = next(q_iter, None)
+            if q is None:
+                break
+        while len(res) < len(qs):
+            res.append(self.total_max)
+        return tuple(res)
+
+    def percentile(self, q: float) -> float:
+        return self.percentiles(q)[0]
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+    @property
+    def p999(self) -> float:
+        return self.percentile(99.9)
@@ -0,0 +1,156 @@
+import math
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class ThroughputHistory:
+    # Min, max and mean of a sample stream in time buckets at several
+    # resolutions. Level k has buckets of base_s * factor**k seconds in a
+    # ring of `capacity` buckets, so memory is fixed and every level covers
+    # factor times the span of the one below: with the defaults 0.1 s
+    # buckets for the last 100 s up to 27 min buckets for the last 19 days.
+    # Each sample updates one bucket per level, the min/max of a bucket keep
+    # a single slow transfer visible at any zoom level.
+
+    def __init__(
+        self,
+        base_s: float = 0.1,
+        factor: int = 4,
+        levels: int = 8,
+        capacity: int = 1024,
+        t0: Optional[float] = None,
+    ):
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.factor = factor
+        self.levels = levels
+        self.capacity = capacity
+        self.widths = [base_s * factor**k for k in range(levels)]
+
+        shape = (levels, capacity)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.sum = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+        # newest bucket index per level, since t0
+        self.head = [-1] * levels
+        self.t_last: Optional[float] = None
+
+    def _clear(self, lvl: int, first: int, last: int):
+        # buckets first..last of a level are reused for a new time range
+        if last - first + 1 >= self.capacity:
+            idx = slice(None)
+        else:
+            idx = np.arange(first, last + 1) % self.capacity
+        self.min[lvl, idx] = np.inf
+        self.max[lvl, idx] = -np.inf
+        self.sum[lvl, idx] = 0
+        self.count[lvl, idx] = 0
+
+    def add(self, val: float, t: Optional[float] = None):
+        if t is None:
+            t = time.monotonic()
+        rel = t - self.t0
+        for lvl in range(self.levels):
+            b = int(rel // self.widths[lvl])
+            head = self.head[lvl]
+            if b > head:
+                self._clear(lvl, head + 1, b)
+                self.head[lvl] = b
+            elif b <= head - self.capacity:
+                # older than the ring, only possible for late samples
+                continue
+            i = b % self.capacity
+            if val < self.min[lvl, i]:
+                self.min[lvl, i] = val
+            if val > self.max[lvl, i]:
+                self.max[lvl, i] = val
+            self.sum[lvl, i] += val
+            self.count[lvl, i] += 1
+        if self.t_last is None or t > self.t_last:
+            self.t_last = t
+
+    def oldest(self) -> Optional[float]:
+        # start of the oldest bucket still held at the coarsest level
+        if self.t_last is None:
+            return None
+        lvl = self.levels - 1
+        b = max(self.head[lvl] - self.capacity + 1, 0)
+        return self.t0 + b * self.widths[lvl]
+
+    def _level(self, t_start: float, col_s: float) -> int:
+        # coarsest level with buckets no wider than a column, or a coarser
+        # one if the finer level does not reach back to t_start any more
+        lvl = 0
+        for k in range(self.levels):
+            if self.widths[k] <= col_s:
+                lvl = k
+        while lvl < self.levels - 1:
+            first = (self.head[lvl] - self.capacity + 1) * self.widths[lvl]
+            if first <= t_start - self.t0:
+                break
+            lvl += 1
+        return lvl
+
+    def query(
+        self, t_start: float, t_end: float, ncols: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # min, max and mean per column over [t_start, t_end), NaN where a
+        # column holds no sample. Reads at most about factor * ncols
+        # buckets, independent of how much history is kept.
+        mins = np.full(ncols, np.nan)
+        maxs = np.full(ncols, np.nan)
+        means = np.full(ncols, np.nan)
+        if self.t_last is None or t_end <= t_start or ncols <= 0:
+            return mins, maxs, means
+
+        col_s = (t_end - t_start) / ncols
+        lvl = self._level(t_start, col_s)
+        w = self.widths[lvl]
+        head = self.head[lvl]
+        oldest = max(head - self.capacity + 1, 0)
+
+        if w >= col_s:
+            # zoomed in beyond the bucket width, each column looks up the
+            # bucket holding its center
+            centers = t_start - self.t0 + (np.arange(ncols) + 0.5) * col_s
+            b = np.floor(centers / w).astype(np.int64)
+            ok = (b >= oldest) & (b <= head)
+            i = b[ok] % self.capacity
+            has = self.count[lvl, i] > 0
+            cols = np.flatnonzero(ok)[has]
+            i = i[has]
+            mins[cols] = self.min[lvl, i]
+            maxs[cols] = self.max[lvl, i]
+            means[cols] = self.sum[lvl, i] / self.count[lvl, i]
+            return mins, maxs, means
+
+        # several buckets per column, fold them
+        b0 = max(math.floor((t_start - self.t0) / w), oldest)
+        b1 = min(math.ceil((t_end - self.t0) / w) - 1, head)
+        if b1 < b0:
+            return mins, maxs, means
+        b = np.arange(b0, b1 + 1)
+        i = b % self.capacity
+        cnt = self.count[lvl, i]
+        has = cnt > 0
+        b, i, cnt = b[has], i[has], cnt[has]
+        cols = ((self.t0 + (b + 0.5) * w - t_start) / col_s).astype(np.int64)
+        ok = (cols >= 0) & (cols < ncols)
+        cols, i, cnt = cols[ok], i[ok], cnt[ok]
+
+        col_min = np.full(ncols, np.inf)
+        col_max = np.full(ncols, -np.inf)
+        col_sum = np.zeros(ncols)
+        col_cnt = np.zeros(ncols, dtype=np.int64)
+        np.minimum.at(col_min, cols, self.min[lvl, i])
+        np.maximum.at(col_max, cols, self.max[lvl, i])
+        np.add.at(col_sum, cols, self.sum[lvl, i])
+        np.add.at(col_cnt, cols, cnt)
+
+        has = col_cnt > 0
+        mins[has] = col_min[has]
+        maxs[has] = col_max[has]
+        means[has] = col_sum[has] / col_cnt[has]
+        return mins, maxs, means
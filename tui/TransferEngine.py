@@ -0,0 +1,179 @@
+import collections
+import dataclasses
+from concurrent.futures import Future
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from HwModules import AVALON_ST_CHECK_OFFS, AVALON_ST_GEN_OFFS
+from HwModules import AvalonStGen, AvalonStCheck
+from IntegrityAnalyzer import IntegrityAnalyzer, IntegrityReport
+from PayloadStager import Payload, PayloadStager
+from PhaseTimer import PhaseTimer
+from PpSpDevice import DMA_BUFFER_SIZE, PpSpDevice, open_device
+from QueueMsg import Mode
+from VerifyPool import VerifyPool
+
+BYTES_PER_SAMP = 2
+
+
+# expected generator patterns, keyed by transfer size and evicted in LRU order
+class ExpectedPatternCache:
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._patterns = collections.OrderedDict()
+
+    def get(self, size_bytes: int) -> np.ndarray:
+        try:
+            self._patterns.move_to_end(size_bytes)
+            return self._patterns[size_bytes]
+        except KeyError:
+            pass
+
+        pattern = np.arange(0, size_bytes // BYTES_PER_SAMP, dtype="uint16")
+        pattern.flags.writeable = False
+        self._patterns[size_bytes] = pattern
+        if len(self._patterns) > self.max_entries:
+            self._patterns.popitem(last=False)
+        return pattern
+
+
+@dataclasses.dataclass
+class TransferResult:
+    mode: Mode
+    size_bytes: int
+    duration_ns: int
+    samp_tot: int
+    samp_ok: int
+    # host-side localization of WRITE check errors
+    integrity: Optional[IntegrityReport] = None
+    # samp_ok the checker should report for the staged READ payload
+    samp_expected: Optional[int] = None
+
+    @property
+    def throughput_mbps(self) -> float:
+        return (self.size_bytes / 1000 / 1000) / (self.duration_ns * 1e-9)
+
+
+class TransferEngine:
+    # Single transfers on one interface: sets up the generator or checker,
+    # issues the DMA and checks the result. Not thread-safe, the DMA mirror,
+    # stager and register modules are shared between transfers. IoThread
+    # drives one from its thread, the headless tools and AsyncDevice call it
+    # directly.
+
+    def __init__(
+        self,
+        char_dev_filename: Union[str, PpSpDevice],
+        payload: Optional[Payload] = None,
+        verify_pool: Optional[VerifyPool] = None,
+        timing: bool = False,
+    ):
+        if isinstance(char_dev_filename, PpSpDevice):
+            self.dev = char_dev_filename
+        else:
+            self.dev = open_device(char_dev_filename)
+        self.filename = self.dev.name
+        self.mem = self.dev.regs32
+        self.st_gen = AvalonStGen(self.mem, AVALON_ST_GEN_OFFS)
+        self.st_check = AvalonStCheck(self.mem, AVALON_ST_CHECK_OFFS)
+
+        # persistent mirror of the DMA buffer, GET_BUFFER writes into it in place
+        self.dma_mirror = bytearray(DMA_BUFFER_SIZE)
+        self.dma_mirror_u16 = np.frombuffer(self.dma_mirror, dtype="uint16")
+        self.integrity = IntegrityAnalyzer()
+        self.stager = PayloadStager(self.dev, payload)
+        self.verify_pool = verify_pool
+        self.expected_cache = ExpectedPatternCache()
+
+        # user-space time per phase of a transfer, None if disabled
+        self.timer = PhaseTimer() if timing else None
+
+    def verify_write(self, size_bytes: int) -> IntegrityReport:
+        tm = self.timer
+        self.dev.get_buffer(self.dma_mirror)
+        if tm is not None:
+            tm.mark("get_buffer")
+
+        l = size_bytes // BYTES_PER_SAMP
+        expected = self.expected_cache.get(size_bytes)
+        integrity = self.integrity.analyze(self.dma_mirror_u16[0:l], expected)
+        if tm is not None:
+            tm.mark("verify")
+        return integrity
+
+    def transfer(self, mode: Mode, size_bytes: int) -> TransferResult:
+        res, fut = self.issue(mode, size_bytes)
+        if fut is not None:
+            self.attach(res, fut.result())
+        return res
+
+    def issue(
+        self, mode: Mode, size_bytes: int
+    ) -> Tuple[TransferResult, Optional[Future]]:
+        # a single DMA in one direction, DUPLEX is resolved by the caller
+        if mode not in (Mode.READ, Mode.WRITE):
+            raise ValueError(f"cannot issue a {mode.name} transfer")
+        tm = self.timer
+        if tm is not None:
+            tm.start()
+
+        if mode == Mode.READ:
+            self.stager.stage()
+            self.st_check.clear()
+            if tm is not None:
+                tm.mark("stage")
+        elif mode == Mode.WRITE:
+            self.st_gen.start(size_bytes)
+            state, samp_tx = self.st_gen.get_state()
+            assert state == 1
+            if tm is not None:
+                tm.mark("gen_setup")
+
+        cmd_mode = 1 if mode == Mode.WRITE else 0
+        duration_ns = self.dev.start_tx(cmd_mode, size_bytes)
+        if tm is not None:
+            # command packing, syscall and interrupt wakeup around the DMA
+            tm.add("ioctl_overhead", tm.mark("ioctl") - duration_ns)
+
+        if mode == Mode.READ:
+            samp_tot, samp_ok = self.st_check.get_stats()
+            if tm is not None:
+                tm.mark("check_stats")
+            res = TransferResult(
+                mode,
+                size_bytes,
+                duration_ns,
+                samp_tot,
+                samp_ok,
+                samp_expected=self.stager.expected_check_ok(size_bytes),
+            )
+            return res, None
+
+        state, samp_tx = self.st_gen.get_state()
+        assert state == 0
+        assert samp_tx == size_bytes
+        if tm is not None:
+            tm.mark("gen_state")
+        res = TransferResult(mode, size_bytes, duration_ns, 0, 0)
+        pool = self.verify_pool
+        if pool is not None and size_bytes >= pool.min_size_bytes:
+            fut = self.verify_pool.submit(size_bytes, self.dev.get_buffer)
+            # the check result comes too late to keep a staged payload
+            self.stager.invalidate()
+            if tm is not None:
+                tm.mark("get_buffer_submit")
+            return res, fut
+
+        integrity = self.verify_write(size_bytes)
+        self.stager.card_wrote(size_bytes, integrity.ok)
+        self.attach(res, integrity)
+        return res, None
+
+    def attach(self, res: TransferResult, integrity: IntegrityReport):
+        res.samp_tot = integrity.samp_tot
+        res.samp_ok = integrity.samp_ok
+        res.integrity = integrity
+
+    def close(self):
+        self.dev.close()
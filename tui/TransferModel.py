@@ -0,0 +1,185 @@
+import dataclasses
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from QueueMsg import Mode
+from Recorder import Recording
+
+# Tukey bisquare tuning constant, 95 % efficiency for normal residuals
+BISQUARE_K = 4.685
+# MAD to standard deviation for normal residuals
+MAD_SCALE = 1.4826
+
+
+def _wls(sizes: np.ndarray, durations: np.ndarray, w: np.ndarray) -> np.ndarray:
+    sw = np.sqrt(w)
+    x = np.stack([np.ones_like(sizes), sizes], axis=1)
+    beta, *_ = np.linalg.lstsq(x * sw[:, None], durations * sw, rcond=None)
+    return beta
+
+
+def fit_line(
+    sizes: np.ndarray, durations: np.ndarray, max_iter: int = 50
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    # Fits duration = t0 + size * ns_per_byte. Durations spread roughly in
+    # proportion to their value, so residuals are taken relative to the
+    # prediction and the fit is weighted by 1 / prediction**2, otherwise
+    # the largest sizes would decide the fixed overhead. Outliers (a
+    # preempted ioctl, a stalled link) get zero weight through iteratively
+    # reweighted least squares with Tukey's bisquare, started from the
+    # per-size medians. Returns (t0, ns_per_byte), the relative residuals
+    # and their robust scale.
+    sizes = sizes.astype(np.float64)
+    durations = durations.astype(np.float64)
+    uniq, inverse = np.unique(sizes, return_inverse=True)
+    if len(uniq) < 2:
+        raise ValueError("the fit needs at least two transfer sizes")
+
+    medians = np.array([np.median(durations[inverse == i]) for i in range(len(uniq))])
+    beta = _wls(uniq, medians, 1 / medians**2)
+
+    scale = 0.0
+    for _ in range(max_iter):
+        pred = beta[0] + beta[1] * sizes
+        rel = (durations - pred) / pred
+        scale = MAD_SCALE * float(np.median(np.abs(rel)))
+        if scale == 0:
+            break
+        u = rel / (BISQUARE_K * scale)
+        w = np.where(np.abs(u) < 1, (1 - u**2) ** 2, 0.0) / pred**2
+        beta_new = _wls(sizes, durations, w)
+        done = np.allclose(beta_new, beta, rtol=1e-9, atol=1e-12)
+        beta = beta_new
+        if done:
+            break
+
+    pred = beta[0] + beta[1] * sizes
+    return beta, (durations - pred) / pred, scale
+
+
+@dataclasses.dataclass
+class SizeResidual:
+    size_bytes: int
+    count: int
+    duration_median_ns: float
+    predicted_ns: float
+    # median of (duration - predicted) / predicted
+    residual_median: float
+
+
+@dataclasses.dataclass
+class Outlier:
+    index: int
+    timestamp_ns: int
+    size_bytes: int
+    duration_ns: int
+    predicted_ns: float
+    residual: float
+
+
+@dataclasses.dataclass
+class ModelFit:
+    interface: int
+    mode: str
+    nr_transfers: int
+    # fixed setup and interrupt cost per transfer
+    t0_ns: float
+    # asymptotic streaming bandwidth
+    bandwidth_mbps: float
+    # transfer size reaching half the asymptotic bandwidth, t0 * B
+    half_bandwidth_bytes: float
+    # robust scale of the relative residuals and the RMS over the inliers
+    residual_scale: float
+    residual_rms: float
+    sizes: List[SizeResidual]
+    nr_outliers: int
+    outliers: List[Outlier]
+
+    def predict_ns(self, size_bytes: float) -> float:
+        return self.t0_ns + size_bytes * 1e3 / self.bandwidth_mbps
+
+
+def fit_records(
+    records: np.ndarray,
+    interface: int,
+    mode: Mode,
+    outlier_sigma: float = 5.0,
+    outlier_min: float = 0.01,
+    max_outliers: int = 100,
+) -> ModelFit:
+    # A transfer is an outlier if its relative residual exceeds both
+    # outlier_sigma robust standard deviations and outlier_min, so a nearly
+    # noise-free run does not flag every transfer that is off by a bit.
+    # records are recording records of one interface and mode.
+    beta, rel, scale = fit_line(records["size_bytes"], records["duration_ns"])
+    t0_ns, ns_per_byte = float(beta[0]), float(beta[1])
+    bandwidth_mbps = 1e3 / ns_per_byte if ns_per_byte > 0 else float("inf")
+
+    bad = np.abs(rel) > max(outlier_sigma * scale, outlier_min)
+    inliers = rel[~bad]
+    rms = float(np.sqrt(np.mean(inliers**2))) if len(inliers) else float("nan")
+
+    sizes = []
+    for size in np.unique(records["size_bytes"]):
+        sel = records["size_bytes"] == size
+        sizes.append(
+            SizeResidual(
+                size_bytes=int(size),
+                count=int(sel.sum()),
+                duration_median_ns=float(np.median(records["duration_ns"][sel])),
+                predicted_ns=t0_ns + ns_per_byte * float(size),
+                residual_median=float(np.median(rel[sel])),
+            )
+        )
+
+    # the worst first
+    bad_idx = np.flatnonzero(bad)
+    bad_idx = bad_idx[np.argsort(-np.abs(rel[bad_idx]), kind="stable")]
+    outliers = [
+        Outlier(
+            index=int(i),
+            timestamp_ns=int(records["timestamp_ns"][i]),
+            size_bytes=int(records["size_bytes"][i]),
+            duration_ns=int(records["duration_ns"][i]),
+            predicted_ns=t0_ns + ns_per_byte * float(records["size_bytes"][i]),
+            residual=float(rel[i]),
+        )
+        for i in bad_idx[:max_outliers]
+    ]
+
+    return ModelFit(
+        interface=interface,
+        mode=mode.name,
+        nr_transfers=len(records),
+        t0_ns=t0_ns,
+        bandwidth_mbps=bandwidth_mbps,
+        half_bandwidth_bytes=t0_ns / ns_per_byte if ns_per_byte > 0 else float("inf"),
+        residual_scale=scale,
+        residual_rms=rms,
+        sizes=sizes,
+        nr_outliers=len(bad_idx),
+        outliers=outliers,
+    )
+
+
+def fit_recording(
+    recording: Recording, interface: Optional[int] = None, **kwargs
+) -> List[ModelFit]:
+    # one fit per (interface, mode) holding at least two transfer sizes
+    r = recording.records
+    fits = []
+    for iface in np.unique(r["interface"]):
+        if interface is not None and iface != interface:
+            continue
+        for mode in np.unique(r["mode"]):
+            sel = np.flatnonzero((r["interface"] == iface) & (r["mode"] == mode))
+            records = r[sel]
+            if len(np.unique(records["size_bytes"])) < 2:
+                continue
+            fit = fit_records(records, int(iface), Mode(int(mode)), **kwargs)
+            # outlier indices refer to the whole recording
+            for o in fit.outliers:
+                o.index = int(sel[o.index])
+            fits.append(fit)
+    return fits
@@ -0,0 +1,79 @@
+import concurrent.futures
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+from typing import Callable, List
+
+import numpy as np
+
+from IntegrityAnalyzer import BYTES_PER_SAMP, IntegrityAnalyzer, IntegrityReport
+from PpSpDevice import DMA_BUFFER_SIZE
+
+# per worker process state, set up by _worker_init
+_slots: List[shared_memory.SharedMemory] = []
+_analyzer = None
+_expected = None
+
+
+def _worker_init(slot_names: List[str]):
+    global _analyzer, _expected
+    for name in slot_names:
+        # spawned workers share the parent's resource tracker, attaching
+        # registers nothing new and the parent unlinks the segments
+        _slots.append(shared_memory.SharedMemory(name))
+    _analyzer = IntegrityAnalyzer()
+    _expected = np.arange(0, DMA_BUFFER_SIZE // BYTES_PER_SAMP, dtype="uint16")
+
+
+def _worker_verify(slot_idx: int, size_bytes: int) -> IntegrityReport:
+    n = size_bytes // BYTES_PER_SAMP
+    actual = np.frombuffer(_slots[slot_idx].buf, dtype="uint16", count=n)
+    return _analyzer.analyze(actual, _expected[0:n])
+
+
+class VerifyPool:
+    # Checks WRITE buffers in worker processes. The caller fills one of
+    # nr_slots shared memory slots (GET_BUFFER writes into it directly) and
+    # gets a future of the IntegrityReport. A slot is reused once its
+    # result is in, so at most nr_slots buffers are in flight and fill()
+    # waits for a free slot when the workers fall behind. Buffers below
+    # min_size_bytes are cheaper to check in place than to hand over.
+
+    def __init__(
+        self, nr_slots: int = 4, processes: int = 2, min_size_bytes: int = 256 * 1024
+    ):
+        self.min_size_bytes = min_size_bytes
+        self.slots = [
+            shared_memory.SharedMemory(create=True, size=DMA_BUFFER_SIZE)
+            for _ in range(nr_slots)
+        ]
+        self.free = queue.Queue()
+        for idx in range(nr_slots):
+            self.free.put(idx)
+
+        # spawn, forking a process with curses and I/O threads is not safe
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+            initargs=([shm.name for shm in self.slots],),
+        )
+
+    def submit(
+        self, size_bytes: int, fill: Callable[[memoryview], None]
+    ) -> concurrent.futures.Future:
+        idx = self.free.get()
+        try:
+            fill(self.slots[idx].buf)
+            fut = self.executor.submit(_worker_verify, idx, size_bytes)
+        except BaseException:
+            self.free.put(idx)
+            raise
+        fut.add_done_callback(lambda _: self.free.put(idx))
+        return fut
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for shm in self.slots:
+            shm.close()
+            shm.unlink()
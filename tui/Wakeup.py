@@ -0,0 +1,31 @@
+import os
+
+
+class Wakeup:
+    # self-pipe used by the I/O threads to wake up the GUI's selector loop
+
+    def __init__(self):
+        self.rfd, self.wfd = os.pipe()
+        os.set_blocking(self.rfd, False)
+        os.set_blocking(self.wfd, False)
+
+    def fileno(self) -> int:
+        return self.rfd
+
+    def notify(self):
+        try:
+            os.write(self.wfd, b"\x00")
+        except BlockingIOError:
+            # pipe full, a wakeup is already pending
+            pass
+
+    def drain(self):
+        try:
+            while os.read(self.rfd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.rfd)
+        os.close(self.wfd)
@@ -0,0 +1,253 @@
+#! /usr/bin/env python3
+
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from PpSpDevice import open_device
+from PcieStats import PcieTopology
+from QueueMsg import Mode
+from TransferEngine import TransferEngine
+
+
+class AggregateWorker(threading.Thread):
+    # Runs `iters` transfers on one interface, each one released from a
+    # barrier shared with the workers of the other interfaces. In DUPLEX
+    # mode the direction alternates per round and between neighbouring
+    # interfaces, so every round has opposing transfers in flight.
+
+    def __init__(
+        self,
+        char_dev_filename: str,
+        cpus: Optional[List[int]],
+        barrier: threading.Barrier,
+        mode: Mode,
+        size_bytes: int,
+        iters: int,
+        idx: int = 0,
+    ):
+        self.char_dev_filename = char_dev_filename
+        self.cpus = cpus
+        self.barrier = barrier
+        self.mode = mode
+        self.size_bytes = size_bytes
+        self.iters = iters
+
+        if mode == Mode.DUPLEX:
+            reads = (np.arange(iters) + idx) % 2 == 0
+            self.modes = np.where(reads, Mode.READ.value, Mode.WRITE.value)
+        else:
+            self.modes = np.full(iters, mode.value)
+        self.starts_ns = np.zeros(iters, dtype=np.int64)
+        self.durations_ns = np.zeros(iters, dtype=np.int64)
+        self.samp_tot = 0
+        self.samp_ok = 0
+        self.error: Optional[BaseException] = None
+
+        super().__init__()
+
+    def run(self):
+        try:
+            if self.cpus:
+                os.sched_setaffinity(0, self.cpus)
+            # opened after pinning, so that the DMA mirror is NUMA-local
+            engine = TransferEngine(self.char_dev_filename)
+            self.barrier.wait()
+
+            for i in range(self.iters):
+                self.barrier.wait()
+                self.starts_ns[i] = time.perf_counter_ns()
+                res = engine.transfer(Mode(int(self.modes[i])), self.size_bytes)
+                self.durations_ns[i] = res.duration_ns
+                self.samp_tot += res.samp_tot
+                self.samp_ok += res.samp_ok
+        except threading.BrokenBarrierError:
+            pass
+        except BaseException as exc:
+            self.error = exc
+            self.barrier.abort()
+
+
+@dataclasses.dataclass
+class InterfaceResult:
+    char_dev: str
+    numa_node: int
+    cpus: Optional[List[int]]
+    throughput_median_mbps: float
+    samp_tot: int
+    samp_ok: int
+    # DUPLEX only
+    read_median_mbps: Optional[float] = None
+    write_median_mbps: Optional[float] = None
+
+
+@dataclasses.dataclass
+class AggregateResult:
+    mode: str
+    size_bytes: int
+    iterations: int
+    aggregate_min_mbps: float
+    aggregate_median_mbps: float
+    aggregate_max_mbps: float
+    skew_median_us: float
+    skew_p99_us: float
+    interfaces: List[InterfaceResult]
+    # DUPLEX only, per-direction share of the aggregate
+    read_median_mbps: Optional[float] = None
+    write_median_mbps: Optional[float] = None
+
+
+def _median(a: np.ndarray) -> Optional[float]:
+    # a single interface in DUPLEX mode alternates, but -n 1 has one direction
+    return float(np.median(a)) if len(a) else None
+
+
+def summarize(
+    mode: Mode, size_bytes: int, workers: List[AggregateWorker], numa_nodes
+) -> AggregateResult:
+    starts = np.stack([w.starts_ns for w in workers])
+    ends = starts + np.stack([w.durations_ns for w in workers])
+
+    # per round: all bytes over the window from the first start to the last
+    # end, the end is approximated by the start plus the driver duration
+    window_ns = ends.max(axis=0) - starts.min(axis=0)
+    aggregate_mbps = len(workers) * size_bytes * 1e3 / window_ns
+    skew_us = (starts.max(axis=0) - starts.min(axis=0)) / 1e3
+
+    duplex = mode == Mode.DUPLEX
+    modes = np.stack([w.modes for w in workers])
+    is_read = modes == Mode.READ.value
+    # per round: bytes of each direction over the same window
+    read_mbps = is_read.sum(axis=0) * size_bytes * 1e3 / window_ns
+    write_mbps = aggregate_mbps - read_mbps
+
+    interfaces = []
+    for w, numa_node, w_read in zip(workers, numa_nodes, is_read):
+        tp = size_bytes * 1e3 / w.durations_ns
+        interfaces.append(
+            InterfaceResult(
+                char_dev=w.char_dev_filename,
+                numa_node=numa_node,
+                cpus=w.cpus,
+                throughput_median_mbps=float(np.median(tp)),
+                samp_tot=w.samp_tot,
+                samp_ok=w.samp_ok,
+                read_median_mbps=_median(tp[w_read]) if duplex else None,
+                write_median_mbps=_median(tp[~w_read]) if duplex else None,
+            )
+        )
+
+    return AggregateResult(
+        mode=mode.name,
+        size_bytes=size_bytes,
+        iterations=len(window_ns),
+        aggregate_min_mbps=float(np.min(aggregate_mbps)),
+        aggregate_median_mbps=float(np.median(aggregate_mbps)),
+        aggregate_max_mbps=float(np.max(aggregate_mbps)),
+        skew_median_us=float(np.median(skew_us)),
+        skew_p99_us=float(np.percentile(skew_us, 99)),
+        interfaces=interfaces,
+        read_median_mbps=float(np.median(read_mbps)) if duplex else None,
+        write_median_mbps=float(np.median(write_mbps)) if duplex else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Synchronized aggregate bandwidth test over several interfaces"
+    )
+    parser.add_argument(
+        "char_devs",
+        type=str,
+        nargs="*",
+        help="dev filenames (e.g. /dev/pp_sp_pcie_0000:04:00.0) or sim[:opts], "
+        "all interfaces bound to the driver if omitted",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str.upper,
+        default="READ",
+        choices=["READ", "WRITE", "DUPLEX"],
+        help="READ, WRITE or DUPLEX (opposing directions on neighbouring interfaces)",
+    )
+    parser.add_argument("--size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("-n", "--iterations", type=int, default=100)
+    parser.add_argument(
+        "--no-pin",
+        action="store_true",
+        help="do not pin the workers to the CPUs local to the device",
+    )
+    parser.add_argument("--json", type=str, help="write results as JSON")
+    args = parser.parse_args()
+    if not args.char_devs:
+        args.char_devs = [iface.char_dev for iface in PcieTopology.scan()]
+    if not args.char_devs:
+        parser.error("no interfaces given and none bound to the pp_sp_pcie driver")
+
+    mode = Mode[args.mode.upper()]
+    barrier = threading.Barrier(len(args.char_devs))
+
+    workers = []
+    numa_nodes = []
+    for idx, char_dev in enumerate(args.char_devs):
+        dev = open_device(char_dev)
+        pcie_stats = dev.get_pcie_stats()
+        dev.close()
+        cpus = None if args.no_pin else pcie_stats.local_cpus
+        numa_nodes.append(pcie_stats.numa_node)
+        workers.append(
+            AggregateWorker(
+                char_dev, cpus, barrier, mode, args.size, args.iterations, idx
+            )
+        )
+
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    for w in workers:
+        if w.error is not None:
+            print(f"{w.char_dev_filename}: {w.error!r}", file=sys.stderr)
+            sys.exit(1)
+
+    res = summarize(mode, args.size, workers, numa_nodes)
+    print(
+        f"{res.mode} {res.size_bytes} B x {len(workers)}: aggregate "
+        f"{res.aggregate_median_mbps:.2f} MB/s (min {res.aggregate_min_mbps:.2f}), "
+        f"start skew median {res.skew_median_us:.3f} us, p99 {res.skew_p99_us:.3f} us"
+    )
+    if res.read_median_mbps is not None:
+        print(
+            f"  read {res.read_median_mbps:.2f} MB/s + "
+            f"write {res.write_median_mbps:.2f} MB/s"
+        )
+    for ifc in res.interfaces:
+        directions = "".join(
+            f", {name} {mbps:.2f}"
+            for name, mbps in (
+                ("read", ifc.read_median_mbps),
+                ("write", ifc.write_median_mbps),
+            )
+            if mbps is not None
+        )
+        print(
+            f"  {ifc.char_dev}: node {ifc.numa_node}, "
+            f"{ifc.throughput_median_mbps:.2f} MB/s{directions}, "
+            f"check {ifc.samp_ok}/{ifc.samp_tot}"
+        )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(dataclasses.asdict(res), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+
+import argparse
+import dataclasses
+import datetime
+import json
+import sys
+
+from AutoTuner import AutoTuner
+from PcieLinkModel import PcieLinkModel
+from QueueMsg import TRANSFER_SIZE_MAX, TRANSFER_SIZE_MIN, Mode
+from TransferEngine import TransferEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the smallest transfer size reaching a fraction of the "
+        "link bandwidth"
+    )
+    parser.add_argument(
+        "char_dev",
+        type=str,
+        help="dev filename (e.g. /dev/pp_sp_pcie_user_0000:04:00.0) or sim[:opts]",
+    )
+    parser.add_argument(
+        "--modes",
+        type=str,
+        default="READ,WRITE",
+        help="comma-separated list of modes (READ, WRITE)",
+    )
+    parser.add_argument(
+        "--percent",
+        type=float,
+        default=80.0,
+        help="target throughput in percent of the link's max_speed_GBps",
+    )
+    parser.add_argument(
+        "--rel-ci",
+        type=float,
+        default=0.01,
+        help="repeat a size until the 95 %% CI of the mean is within this "
+        "fraction of the mean",
+    )
+    parser.add_argument(
+        "--max-iters", type=int, default=1024, help="transfers per size at most"
+    )
+    parser.add_argument(
+        "--align", type=int, default=TRANSFER_SIZE_MIN, help="size resolution [B]"
+    )
+    parser.add_argument("--size-min", type=int, default=TRANSFER_SIZE_MIN)
+    parser.add_argument("--size-max", type=int, default=TRANSFER_SIZE_MAX)
+    parser.add_argument("--json", type=str, help="write results as JSON")
+    args = parser.parse_args()
+
+    modes = [m.strip().upper() for m in args.modes.split(",")]
+    if any(m not in ("READ", "WRITE") for m in modes):
+        parser.error("--modes takes a comma-separated list of READ and WRITE")
+    modes = [Mode[m] for m in modes]
+
+    engine = TransferEngine(args.char_dev)
+    pcie_stats = engine.dev.get_pcie_stats()
+    link_model = PcieLinkModel.from_stats(pcie_stats)
+    target_mbps = pcie_stats.max_speed_GBps * 1000 * args.percent / 100
+
+    try:
+        tuner = AutoTuner(
+            engine,
+            rel_ci=args.rel_ci,
+            max_iters=args.max_iters,
+            align=args.align,
+            size_min=args.size_min,
+            size_max=args.size_max,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = []
+    for mode in modes:
+        res = tuner.tune(mode, target_mbps)
+        results.append(res)
+        for p in res.points:
+            print(
+                f"{res.mode:5s} {p.size_bytes:8d} B: "
+                f"mean {p.throughput_mean_mbps:8.2f} +- {p.throughput_ci_mbps:6.2f} "
+                f"MB/s ({p.iterations} tx)",
+                file=sys.stderr,
+            )
+
+        if res.min_size_bytes is None:
+            best = max(p.throughput_mean_mbps for p in res.points)
+            msg_min = f"not reached (best {best:.2f} MB/s)"
+        else:
+            ceiling = link_model.ceiling_MBps(mode, res.min_size_bytes)
+            msg_min = (
+                f"reached at {res.min_size_bytes} B "
+                f"({target_mbps * 100 / ceiling:.1f} % of the modeled ceiling)"
+            )
+        print(
+            f"{res.mode}: target {args.percent:.1f} % of "
+            f"{pcie_stats.max_speed_GBps:.3f} GB/s = {target_mbps:.2f} MB/s "
+            f"{msg_min}, knee at {res.knee_size_bytes} B"
+        )
+
+    if args.json is not None:
+        out = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "char_dev": args.char_dev,
+            "percent": args.percent,
+            "pcie_stats": dataclasses.asdict(pcie_stats),
+            "results": [dataclasses.asdict(r) for r in results],
+        }
+        with open(args.json, "w") as f:
+            json.dump(out, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#! /usr/bin/env python3
+
+import argparse
+import csv
+import dataclasses
+import datetime
+import json
+import sys
+from typing import List, Optional
+
+import numpy as np
+
+from PayloadStager import parse_payload
+from PcieLinkModel import PcieLinkModel
+from QueueMsg import TRANSFER_SIZE_MAX, TRANSFER_SIZE_MIN, Mode
+from Recorder import Recorder
+from TransferEngine import TransferEngine
+
+
+@dataclasses.dataclass
+class BenchResult:
+    mode: str
+    size_bytes: int
+    iterations: int
+    throughput_min_mbps: float
+    throughput_mean_mbps: float
+    throughput_median_mbps: float
+    throughput_p99_mbps: float
+    duration_min_ns: float
+    duration_mean_ns: float
+    duration_median_ns: float
+    duration_p99_ns: float
+    samp_tot: int
+    samp_ok: int
+    # samp_ok of an intact transfer, below samp_tot for non-counter payloads
+    samp_expected: int
+    ceiling_mbps: Optional[float] = None
+    ceiling_percent: Optional[float] = None
+
+
+def sweep_sizes(size_min: int, size_max: int) -> List[int]:
+    sizes = []
+    size = size_min
+    while size <= size_max:
+        sizes.append(size)
+        size *= 2
+    return sizes
+
+
+def bench_point(
+    engine: TransferEngine,
+    mode: Mode,
+    size_bytes: int,
+    iters: int,
+    link_model: Optional[PcieLinkModel] = None,
+    recorder: Optional[Recorder] = None,
+) -> BenchResult:
+    durations = np.empty(iters, dtype=np.float64)
+    samp_tot = 0
+    samp_ok = 0
+    samp_expected = 0
+    for i in range(iters):
+        res = engine.transfer(mode, size_bytes)
+        if recorder is not None:
+            recorder.append(0, res)
+        durations[i] = res.duration_ns
+        samp_tot += res.samp_tot
+        samp_ok += res.samp_ok
+        if res.samp_expected is not None:
+            samp_expected += res.samp_expected
+        else:
+            samp_expected += res.samp_tot
+
+    throughputs = (size_bytes / 1000 / 1000) / (durations * 1e-9)
+
+    # the p99 of the throughput is the slow tail, i.e. the 1st percentile
+    res = BenchResult(
+        mode=mode.name,
+        size_bytes=size_bytes,
+        iterations=iters,
+        throughput_min_mbps=float(np.min(throughputs)),
+        throughput_mean_mbps=float(np.mean(throughputs)),
+        throughput_median_mbps=float(np.median(throughputs)),
+        throughput_p99_mbps=float(np.percentile(throughputs, 1)),
+        duration_min_ns=float(np.min(durations)),
+        duration_mean_ns=float(np.mean(durations)),
+        duration_median_ns=float(np.median(durations)),
+        duration_p99_ns=float(np.percentile(durations, 99)),
+        samp_tot=samp_tot,
+        samp_ok=samp_ok,
+        samp_expected=samp_expected,
+    )
+    if link_model is not None:
+        res.ceiling_mbps = link_model.ceiling_MBps(mode, size_bytes)
+        res.ceiling_percent = res.throughput_median_mbps * 100 / res.ceiling_mbps
+    return res
+
+
+def write_json(filename: str, meta: dict, results: List[BenchResult]):
+    out = dict(meta)
+    out["results"] = [dataclasses.asdict(r) for r in results]
+    with open(filename, "w") as f:
+        json.dump(out, f, indent=2)
+
+
+def write_csv(filename: str, results: List[BenchResult]):
+    fieldnames = [f.name for f in dataclasses.fields(BenchResult)]
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for r in results:
+            writer.writerow(dataclasses.asdict(r))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless throughput benchmark")
+    parser.add_argument(
+        "char_dev",
+        type=str,
+        help="dev filename (e.g. /dev/pp_sp_pcie_user_0000:04:00.0) or sim[:opts]",
+    )
+    parser.add_argument(
+        "-n", "--iterations", type=int, default=100, help="transfers per size"
+    )
+    parser.add_argument(
+        "--modes",
+        type=str,
+        default="READ,WRITE",
+        help="comma-separated list of modes (READ, WRITE)",
+    )
+    parser.add_argument("--size-min", type=int, default=TRANSFER_SIZE_MIN)
+    parser.add_argument("--size-max", type=int, default=TRANSFER_SIZE_MAX)
+    parser.add_argument("--json", type=str, help="write results as JSON")
+    parser.add_argument("--csv", type=str, help="write results as CSV")
+    parser.add_argument(
+        "--payload",
+        type=str,
+        default="counter",
+        help="READ payload: counter, prbs31[:seed] or file:<path>",
+    )
+    parser.add_argument(
+        "--phases",
+        action="store_true",
+        help="time the user-space phases of each transfer",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        help="append every transfer to this recording file, e.g. as a "
+        "baseline for pp_sp_compare.py",
+    )
+    args = parser.parse_args()
+
+    modes = [m.strip().upper() for m in args.modes.split(",")]
+    if any(m not in ("READ", "WRITE") for m in modes):
+        parser.error("--modes takes a comma-separated list of READ and WRITE")
+    modes = [Mode[m] for m in modes]
+    sizes = sweep_sizes(args.size_min, args.size_max)
+
+    try:
+        payload = parse_payload(args.payload)
+    except ValueError as e:
+        parser.error(str(e))
+
+    engine = TransferEngine(args.char_dev, payload=payload, timing=args.phases)
+    pcie_stats = engine.dev.get_pcie_stats()
+    link_model = PcieLinkModel.from_stats(pcie_stats)
+    recorder = None
+    if args.record is not None:
+        recorder = Recorder(
+            args.record,
+            {
+                "start_time": datetime.datetime.now().timestamp(),
+                "payload": payload.name,
+                "interfaces": [
+                    {
+                        "char_dev": args.char_dev,
+                        "pcie_stats": dataclasses.asdict(pcie_stats),
+                    }
+                ],
+            },
+        )
+
+    results = []
+    phases = []
+    for mode in modes:
+        for size_bytes in sizes:
+            if engine.timer is not None:
+                engine.timer.reset()
+            res = bench_point(
+                engine, mode, size_bytes, args.iterations, link_model, recorder
+            )
+            results.append(res)
+            print(
+                f"{res.mode:5s} {res.size_bytes:8d} B: "
+                f"median {res.throughput_median_mbps:8.2f} MB/s "
+                f"({res.ceiling_percent:5.1f} % of ceiling), "
+                f"p99 {res.throughput_p99_mbps:8.2f} MB/s, "
+                f"check {res.samp_ok}/{res.samp_tot} (expected {res.samp_expected})",
+                file=sys.stderr,
+            )
+            if engine.timer is not None:
+                print(
+                    f"      phases p50/p99 us: {engine.timer.format()}", file=sys.stderr
+                )
+                phases.append(
+                    {
+                        "mode": mode.name,
+                        "size_bytes": size_bytes,
+                        "phases": engine.timer.summary(),
+                    }
+                )
+
+    meta = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "char_dev": args.char_dev,
+        "iterations": args.iterations,
+        "payload": payload.name,
+        "pcie_stats": dataclasses.asdict(pcie_stats),
+    }
+    if phases:
+        meta["phases"] = phases
+    if recorder is not None:
+        recorder.close()
+    if args.json is not None:
+        write_json(args.json, meta, results)
+    if args.csv is not None:
+        write_csv(args.csv, results)
+
+
+if __name__ == "__main__":
+    main()
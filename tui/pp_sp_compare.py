@@ -0,0 +1,99 @@
+#! /usr/bin/env python3
+
+import argparse
+import dataclasses
+import json
+import sys
+
+from Baseline import Baseline, effect_size_label
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare transfer throughput against a baseline and flag "
+        "statistically significant regressions"
+    )
+    parser.add_argument(
+        "inputs",
+        type=str,
+        nargs="+",
+        help="BASELINE NEW, each a recording (--record) or a saved baseline; "
+        "with --save-baseline the recordings to pool into the baseline",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        type=str,
+        default=None,
+        help="pool the input recordings into a baseline file and exit",
+    )
+    parser.add_argument(
+        "--interface",
+        type=int,
+        default=None,
+        help="only use transfers of this interface index of the recordings",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.01,
+        help="significance level after correcting for the number of groups",
+    )
+    parser.add_argument(
+        "--min-change",
+        type=float,
+        default=0.01,
+        help="ignore median throughput changes smaller than this fraction",
+    )
+    parser.add_argument("--json", type=str, help="write the comparison as JSON")
+    args = parser.parse_args()
+
+    if args.save_baseline is not None:
+        baseline = Baseline.from_recordings(args.inputs, args.interface)
+        baseline.save(args.save_baseline)
+        for (mode, size), tp in sorted(baseline.samples.items()):
+            print(f"{mode:5s} {size:8d} B: {len(tp):8d} samples")
+        return
+
+    if len(args.inputs) != 2:
+        parser.error("expected BASELINE and NEW")
+    baseline = Baseline.load(args.inputs[0], args.interface)
+    new = Baseline.load(args.inputs[1], args.interface)
+
+    rows = baseline.compare(new, args.alpha, args.min_change)
+    for key in sorted(set(baseline.samples) ^ set(new.samples)):
+        where = "baseline" if key in baseline.samples else "new run"
+        print(f"{key[0]:5s} {key[1]:8d} B: only in the {where}", file=sys.stderr)
+
+    for r in rows:
+        print(
+            f"{r.mode:5s} {r.size_bytes:8d} B: {r.baseline_median_mbps:8.2f} -> "
+            f"{r.new_median_mbps:8.2f} MB/s, {r.change * 100:+6.2f} % "
+            f"[{r.change_ci_low * 100:+6.2f}, {r.change_ci_high * 100:+6.2f}], "
+            f"p {r.p_adjusted:.2g}, delta {r.cliffs_delta:+.2f} "
+            f"({effect_size_label(r.cliffs_delta)}): {r.verdict}"
+        )
+
+    regressions = [r for r in rows if r.verdict == "regression"]
+    print(f"{len(regressions)} of {len(rows)} groups regressed")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "alpha": args.alpha,
+                    "min_change": args.min_change,
+                    "baseline": args.inputs[0],
+                    "new": args.inputs[1],
+                    "comparisons": [dataclasses.asdict(r) for r in rows],
+                },
+                f,
+                indent=2,
+            )
+
+    # non-zero exit status gates a qualification pipeline
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
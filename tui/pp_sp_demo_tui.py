@@ -2,76 +2,213 @@
 
 import argparse
 import curses
+import dataclasses
 import queue
+import time
 
-from Gui import Gui
-from IoThread import IoThread
-from PcieStats import PcieStats
+from Gui import Gui, Interface
+from IoThread import IoThread, Pacing, duplex_round
+from MetricsExporter import MetricsExporter
+from PayloadStager import parse_payload
+from PcieStats import PcieTopology
+from QueueMsg import RespChannel
+from Recorder import Recorder
+from VerifyPool import VerifyPool
+from Wakeup import Wakeup
 
 EXPECTED_SUBSYS_VENDOR = 0x1A2
-EXPECTED_SUBSYS_DEVICE_IF0 = 0x1
-EXPECTED_SUBSYS_DEVICE_IF1 = 0x2
-
-
-def main(stdscr, char_dev_filename0, char_dev_filename1):
-    if char_dev_filename0 is not None:
-        cmd_queue0 = queue.Queue()
-        resp_queue0 = queue.Queue()
-        io_thread0 = IoThread(char_dev_filename0, cmd_queue0, resp_queue0)
-        pcie_stats0 = PcieStats.get_stats(char_dev_filename0)
-        assert pcie_stats0.subsystem_vendor == EXPECTED_SUBSYS_VENDOR
-        assert pcie_stats0.subsystem_device == EXPECTED_SUBSYS_DEVICE_IF0
-        io_thread0.start()
-    else:
-        cmd_queue0 = None
-        resp_queue0 = None
-        pcie_stats0 = None
-
-    if char_dev_filename1 is not None:
-        cmd_queue1 = queue.Queue()
-        resp_queue1 = queue.Queue()
-        io_thread1 = IoThread(char_dev_filename1, cmd_queue1, resp_queue1)
-        pcie_stats1 = PcieStats.get_stats(char_dev_filename1)
-        assert pcie_stats1.subsystem_vendor == EXPECTED_SUBSYS_VENDOR
-        assert pcie_stats1.subsystem_device == EXPECTED_SUBSYS_DEVICE_IF1
-        io_thread1.start()
-    else:
-        cmd_queue1 = None
-        resp_queue1 = None
-        pcie_stats1 = None
-
-    gui = Gui(
-        stdscr,
-        char_dev_filename0,
-        pcie_stats0,
-        cmd_queue0,
-        resp_queue0,
-        char_dev_filename1,
-        pcie_stats1,
-        cmd_queue1,
-        resp_queue1,
-    )
+EXPECTED_SUBSYS_DEVICES = (0x1, 0x2)
+
+
+def main(
+    stdscr,
+    char_dev_filenames,
+    pacing,
+    record_filename=None,
+    metrics_port=None,
+    payload_spec="counter",
+    verify_procs=0,
+    timing=False,
+):
+    wakeup = Wakeup()
+    verify_pool = VerifyPool(processes=verify_procs) if verify_procs > 0 else None
+    exporter = MetricsExporter(metrics_port) if metrics_port is not None else None
+
+    interfaces = []
+    io_threads = []
+    for char_dev_filename in char_dev_filenames:
+        cmd_queue = queue.Queue()
+        resp_queue = RespChannel(wakeup=wakeup)
+        io_thread = IoThread(
+            char_dev_filename,
+            cmd_queue,
+            resp_queue,
+            pacing,
+            payload=parse_payload(payload_spec),
+            verify_pool=verify_pool,
+            timing=timing,
+        )
+        if exporter is not None:
+            io_thread.metrics = exporter.add_interface(char_dev_filename, resp_queue)
+        pcie_stats = io_thread.engine.dev.get_pcie_stats()
+        assert pcie_stats.subsystem_vendor == EXPECTED_SUBSYS_VENDOR
+        assert pcie_stats.subsystem_device in EXPECTED_SUBSYS_DEVICES
+        io_threads.append(io_thread)
+        interfaces.append(
+            Interface(char_dev_filename, pcie_stats, cmd_queue, resp_queue)
+        )
+
+    recorder = None
+    if record_filename is not None:
+        recorder = Recorder(
+            record_filename,
+            {
+                "start_time": time.time(),
+                "interfaces": [
+                    {
+                        "char_dev": iface.char_dev_filename,
+                        "pcie_stats": dataclasses.asdict(iface.pcie_stats),
+                    }
+                    for iface in interfaces
+                ],
+            },
+        )
+    for idx, io_thread in enumerate(io_threads):
+        io_thread.recorder = recorder
+        io_thread.rec_interface = idx
+        # neighbouring interfaces start DUPLEX rounds in opposing directions
+        io_thread.duplex_phase = idx
+        io_thread.start()
+
+    if exporter is not None:
+        exporter.start()
+
+    gui = Gui(stdscr, interfaces, wakeup)
     gui.run()
 
+    if exporter is not None:
+        exporter.close()
+
+    # the threads may still finish one transfer after the stop command
+    for io_thread in io_threads:
+        io_thread.join()
+    if recorder is not None:
+        recorder.close()
+    if verify_pool is not None:
+        verify_pool.close()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="")
     parser.add_argument(
-        "char_dev0",
+        "char_devs",
         type=str,
-        help="dev filename (e.g. /dev/pp_sp_pcie_user_0000:04:00.0)",
+        nargs="*",
+        help="dev filenames (e.g. /dev/pp_sp_pcie_0000:04:00.0) or sim[:opts], "
+        "all interfaces bound to the driver if omitted",
     )
 
     parser.add_argument(
-        "char_dev1",
+        "--saturate",
+        action="store_true",
+        help="issue transfers back-to-back and report aggregated throughput",
+    )
+    parser.add_argument(
+        "--duty-cycle",
+        type=float,
+        default=1.0,
+        help="fraction of time spent in transfers in saturation mode",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="target transfer rate in saturation mode [1/s]",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=0.5,
+        help="reporting interval in saturation mode [s]",
+    )
+    parser.add_argument(
+        "--duplex-ratio",
         type=str,
-        default="None",
-        nargs="?",
-        help="dev filename (e.g. /dev/pp_sp_pcie_user_0000:05:00.0)",
+        default="1:1",
+        help="READ:WRITE transfers per round in Duplex mode",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        help="append every transfer to this recording file",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve OpenMetrics on http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--payload",
+        type=str,
+        default="counter",
+        help="payload the card reads in READ mode: counter, prbs31[:seed] or "
+        "file:<path>",
+    )
+    parser.add_argument(
+        "--verify-procs",
+        type=int,
+        default=0,
+        help="check large WRITE buffers in this many worker processes",
+    )
+    parser.add_argument(
+        "--phases",
+        action="store_true",
+        help="time the user-space phases of each transfer and log them",
     )
 
     args = parser.parse_args()
-    char_dev0 = None if args.char_dev0 == "None" else args.char_dev0
-    char_dev1 = None if args.char_dev1 == "None" else args.char_dev1
+    char_devs = [d for d in args.char_devs if d != "None"]
+    if not char_devs:
+        char_devs = [iface.char_dev for iface in PcieTopology.scan()]
+    if not char_devs:
+        parser.error("no interfaces given and none bound to the pp_sp_pcie driver")
+
+    if not 0 < args.duty_cycle <= 1:
+        parser.error("--duty-cycle must be in (0, 1]")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.report_interval <= 0:
+        parser.error("--report-interval must be positive")
+
+    try:
+        reads, _, writes = args.duplex_ratio.partition(":")
+        duplex_ratio = (int(reads), int(writes))
+        duplex_round(*duplex_ratio)
+    except ValueError as e:
+        parser.error(f"--duplex-ratio: {e}")
 
-    curses.wrapper(main, char_dev0, char_dev1)
+    pacing = Pacing(
+        saturate=args.saturate,
+        duty_cycle=args.duty_cycle,
+        target_rate_hz=args.rate,
+        report_interval_s=args.report_interval,
+        duplex_ratio=duplex_ratio,
+    )
+
+    try:
+        parse_payload(args.payload)
+    except ValueError as e:
+        parser.error(str(e))
+
+    curses.wrapper(
+        main,
+        char_devs,
+        pacing,
+        args.record,
+        args.metrics_port,
+        args.payload,
+        args.verify_procs,
+        args.phases,
+    )
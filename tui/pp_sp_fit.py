@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+
+import argparse
+import dataclasses
+import json
+
+from Recorder import Recording
+from TransferModel import fit_recording
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit duration = t0 + size / bandwidth to the transfers of a "
+        "size sweep, per interface and direction"
+    )
+    parser.add_argument(
+        "recording",
+        type=str,
+        help="file written with --record, e.g. by pp_sp_bench.py over a sweep",
+    )
+    parser.add_argument(
+        "--interface", type=int, default=None, help="only fit this interface index"
+    )
+    parser.add_argument(
+        "--outlier-sigma",
+        type=float,
+        default=5.0,
+        help="flag transfers off the model by more than this many robust "
+        "standard deviations",
+    )
+    parser.add_argument(
+        "--outlier-min",
+        type=float,
+        default=0.01,
+        help="and by more than this fraction of the predicted duration",
+    )
+    parser.add_argument(
+        "--show-outliers", type=int, default=5, help="outliers printed per fit"
+    )
+    parser.add_argument("--json", type=str, help="write the fits as JSON")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    fits = fit_recording(
+        recording,
+        args.interface,
+        outlier_sigma=args.outlier_sigma,
+        outlier_min=args.outlier_min,
+    )
+    if not fits:
+        parser.error(f"{args.recording}: no interface and mode with two sizes")
+
+    for fit in fits:
+        print(
+            f"if{fit.interface} {fit.mode:5s}: t0 {fit.t0_ns / 1000:.3f} us, "
+            f"bandwidth {fit.bandwidth_mbps:.2f} MB/s, "
+            f"half bandwidth at {fit.half_bandwidth_bytes:.0f} B, "
+            f"residual rms {fit.residual_rms * 100:.2f} %, "
+            f"{fit.nr_outliers} of {fit.nr_transfers} transfers off the model"
+        )
+        for s in fit.sizes:
+            print(
+                f"  {s.size_bytes:8d} B: median {s.duration_median_ns / 1000:10.3f} us, "
+                f"model {s.predicted_ns / 1000:10.3f} us, "
+                f"{s.residual_median * 100:+6.2f} % ({s.count} transfers)"
+            )
+        for o in fit.outliers[: args.show_outliers]:
+            print(
+                f"  outlier #{o.index}: {o.size_bytes} B, "
+                f"{o.duration_ns / 1000:.3f} us vs. {o.predicted_ns / 1000:.3f} us "
+                f"({o.residual * 100:+.1f} %)"
+            )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "metadata": recording.metadata,
+                    "fits": [dataclasses.asdict(fit) for fit in fits],
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+
+import argparse
+import asyncio
+
+import numpy as np
+
+from AsyncDevice import AsyncDevice, default_executor
+from PcieStats import PcieTopology
+from QueueMsg import Mode
+
+
+async def run_device(dev: AsyncDevice, mode: Mode, size_bytes: int, iters: int):
+    durations_ns = np.zeros(iters, dtype=np.int64)
+    samp_tot = 0
+    samp_ok = 0
+    for i in range(iters):
+        res = await dev.transfer(mode, size_bytes)
+        durations_ns[i] = res.duration_ns
+        samp_tot += res.samp_tot
+        samp_ok += res.samp_ok
+
+    throughput_mbps = np.median(size_bytes * 1e3 / durations_ns)
+    print(
+        f"{dev.name}: {mode.name} {size_bytes} B, median {throughput_mbps:.2f} MB/s, "
+        f"check {samp_ok}/{samp_tot}"
+    )
+
+
+async def main(args):
+    default_executor(args.max_workers)
+    mode = Mode[args.mode.upper()]
+    devs = await asyncio.gather(*(AsyncDevice.open(d) for d in args.char_devs))
+    try:
+        await asyncio.gather(
+            *(run_device(dev, mode, args.size, args.iterations) for dev in devs)
+        )
+    finally:
+        for dev in devs:
+            dev.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive many interfaces from one asyncio event loop"
+    )
+    parser.add_argument(
+        "char_devs",
+        type=str,
+        nargs="*",
+        help="dev filenames (e.g. /dev/pp_sp_pcie_0000:04:00.0) or sim[:opts], "
+        "all interfaces bound to the driver if omitted",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str.upper,
+        default="READ",
+        choices=["READ", "WRITE"],
+        help="READ or WRITE",
+    )
+    parser.add_argument("--size", type=int, default=1024 * 1024)
+    parser.add_argument("-n", "--iterations", type=int, default=100)
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=16,
+        help="size of the executor running the blocking ioctls",
+    )
+    args = parser.parse_args()
+    if not args.char_devs:
+        args.char_devs = [iface.char_dev for iface in PcieTopology.scan()]
+    if not args.char_devs:
+        parser.error("no interfaces given and none bound to the pp_sp_pcie driver")
+
+    asyncio.run(main(args))
@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+
+import argparse
+import curses
+import json
+import queue
+import sys
+import threading
+
+from Gui import Gui, Interface
+from PcieStats import PcieStatsResult
+from QueueMsg import RespChannel
+from Recorder import Recording
+from Wakeup import Wakeup
+
+
+def replay_tui(stdscr, recording: Recording, speed: float):
+    wakeup = Wakeup()
+
+    interfaces = []
+    for iface in recording.metadata.get("interfaces", []):
+        interfaces.append(
+            Interface(
+                iface["char_dev"],
+                PcieStatsResult(**iface["pcie_stats"]),
+                queue.Queue(),
+                RespChannel(wakeup=wakeup),
+            )
+        )
+
+    thread = threading.Thread(
+        target=recording.replay,
+        args=([iface.resp_queue for iface in interfaces], speed),
+        daemon=True,
+    )
+    thread.start()
+
+    gui = Gui(stdscr, interfaces, wakeup)
+    gui.run()
+
+
+def print_summary(recording: Recording):
+    for row in recording.summarize():
+        print(
+            f"if{row['interface']} {row['mode']:5s} {row['size_bytes']:8d} B: "
+            f"{row['count']:8d} transfers, "
+            f"median {row['throughput_median_mbps']:8.2f} MB/s, "
+            f"p1 {row['throughput_p1_mbps']:8.2f} MB/s, "
+            f"p99 {row['duration_p99_ns'] / 1000:9.3f} us, "
+            f"check {row['samp_ok']}/{row['samp_tot']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="summarize a transfer recording or replay it into the TUI"
+    )
+    parser.add_argument("recording", type=str, help="file written with --record")
+    parser.add_argument(
+        "--summary", action="store_true", help="print a summary instead of replaying"
+    )
+    parser.add_argument("--json", type=str, help="write the summary as JSON")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="replay speed relative to the recording, 0 replays at once",
+    )
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    if args.summary or args.json is not None:
+        print_summary(recording)
+        if args.json is not None:
+            with open(args.json, "w") as f:
+                json.dump(
+                    {"metadata": recording.metadata, "summary": recording.summarize()},
+                    f,
+                    indent=2,
+                )
+        return
+
+    if not recording.metadata.get("interfaces"):
+        print(f"{args.recording}: no interfaces in the metadata", file=sys.stderr)
+        sys.exit(1)
+    curses.wrapper(replay_tui, recording, args.speed)
+
+
+if __name__ == "__main__":
+    main()
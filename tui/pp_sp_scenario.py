@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+
+import argparse
+import dataclasses
+import datetime
+import json
+import sys
+
+import numpy as np
+
+from PayloadStager import parse_payload
+from PcieStats import PcieTopology
+from Scenario import Scenario, run_scenario, summarize
+from TransferEngine import TransferEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run an open-loop workload scenario against one or more "
+        "interfaces"
+    )
+    parser.add_argument("scenario", type=str, help="scenario description (JSON)")
+    parser.add_argument(
+        "char_devs",
+        type=str,
+        nargs="*",
+        help="dev filenames (e.g. /dev/pp_sp_pcie_0000:04:00.0) or sim[:opts], "
+        "all interfaces bound to the driver if omitted",
+    )
+    parser.add_argument(
+        "--payload",
+        type=str,
+        default="counter",
+        help="READ payload: counter, prbs31[:seed] or file:<path>",
+    )
+    parser.add_argument("--json", type=str, help="write the summary as JSON")
+    parser.add_argument(
+        "--raw", type=str, help="write all requests as a NumPy .npy record array"
+    )
+    args = parser.parse_args()
+    if not args.char_devs:
+        args.char_devs = [iface.char_dev for iface in PcieTopology.scan()]
+    if not args.char_devs:
+        parser.error("no interfaces given and none bound to the pp_sp_pcie driver")
+
+    try:
+        scenario = Scenario.load(args.scenario)
+        payload = parse_payload(args.payload)
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        parser.error(f"{args.scenario}: {e!r}")
+
+    engines = [TransferEngine(char_dev, payload=payload) for char_dev in args.char_devs]
+    try:
+        reqs = run_scenario(scenario, engines)
+    except ValueError as e:
+        print(f"{args.scenario}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    rows = summarize(scenario, reqs)
+    for row in rows:
+        print(
+            f"{row['phase']:12s} if{row['interface']} {row['mode']:5s} "
+            f"{row['count']:7d} req ({row['rate_hz']:8.1f}/s): latency "
+            f"p50 {row['latency_p50_us']:9.1f} p99 {row['latency_p99_us']:9.1f} "
+            f"p99.9 {row['latency_p999_us']:9.1f} us, "
+            f"queued p99 {row['queued_p99_us']:9.1f} us, "
+            f"depth max {row['queue_depth_max']}, "
+            f"check {row['samp_ok']}/{row['samp_tot']}"
+        )
+
+    if args.raw is not None:
+        np.save(args.raw, reqs)
+    if args.json is not None:
+        out = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "scenario": scenario.name,
+            "char_devs": args.char_devs,
+            "phases": [dataclasses.asdict(p) for p in scenario.phases],
+            "summary": rows,
+        }
+        with open(args.json, "w") as f:
+            json.dump(out, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import pytest
+
+from AutoTuner import AutoTuner
+from TransferEngine import TransferEngine
+from PpSpDevice import SimDevice
+from QueueMsg import Mode
+
+
+@pytest.fixture
+def engine():
+    return TransferEngine(SimDevice(bandwidth_mbps=1000, latency_us=10, realtime=False))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"align": 130},
+        {"align": 0},
+        {"size_min": 130},
+        {"size_min": 8192, "size_max": 4096},
+    ],
+)
+def test_rejects_bad_sizes(engine, kwargs):
+    with pytest.raises(ValueError):
+        AutoTuner(engine, **kwargs)
+
+
+def test_measure_caches_per_mode_and_size(engine):
+    tuner = AutoTuner(engine, batch=4, max_iters=4)
+    read = tuner.measure(Mode.READ, 4096)
+    assert tuner.measure(Mode.READ, 4096) is read
+    assert tuner.measure(Mode.WRITE, 4096) is not read
+
+
+def test_tune(engine):
+    # the sim is noise-free, 10 us + 1 ns/B reaches 800 MB/s at 40000 B
+    tuner = AutoTuner(engine, batch=2, max_iters=2, align=128, size_max=1 << 20)
+    res = tuner.tune(Mode.WRITE, 800)
+    assert res.min_size_bytes == 40064
+    assert res.mode == "WRITE"
+    sizes = [p.size_bytes for p in res.points]
+    assert sizes == sorted(sizes)
+    assert sizes[-1] == 1 << 20
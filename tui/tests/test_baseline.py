@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from Baseline import Baseline, holm, rank_test
+from TransferEngine import TransferResult
+from QueueMsg import Mode
+from Recorder import Recorder
+
+
+def samples(median, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return median * rng.lognormal(0, 0.02, n)
+
+
+def test_rank_test():
+    rng = np.random.default_rng(0)
+    a = rng.normal(0, 1, 300)
+    p, delta = rank_test(a, a.copy())
+    assert p == pytest.approx(1.0)
+    assert delta == pytest.approx(0.0)
+
+    p, delta = rank_test(a, a + 10)
+    assert p < 1e-10
+    assert delta == 1.0
+
+
+def test_rank_test_all_tied():
+    assert rank_test(np.ones(10), np.ones(10)) == (1.0, 0.0)
+
+
+def test_holm():
+    assert holm([0.01, 0.04, 0.03]) == pytest.approx([0.03, 0.06, 0.06])
+    assert holm([]) == []
+
+
+def test_compare_verdicts():
+    base = Baseline(
+        {
+            ("READ", 4096): samples(1000, seed=1),
+            ("WRITE", 4096): samples(1000, seed=2),
+            ("WRITE", 8192): samples(1000, seed=3),
+        }
+    )
+    new = Baseline(
+        {
+            ("READ", 4096): samples(900, seed=4),
+            ("WRITE", 4096): samples(1100, seed=5),
+            ("WRITE", 8192): samples(1000, seed=6),
+            # only in one of them, not compared
+            ("READ", 1024): samples(1000, seed=7),
+        }
+    )
+    rows = {(r.mode, r.size_bytes): r for r in base.compare(new)}
+    assert set(rows) == {("READ", 4096), ("WRITE", 4096), ("WRITE", 8192)}
+    assert rows[("READ", 4096)].verdict == "regression"
+    row = rows[("READ", 4096)]
+    assert row.change == pytest.approx(-0.1, abs=0.01)
+    assert row.change_ci_low <= row.change <= row.change_ci_high
+    assert row.change_ci_high < -0.01
+    assert rows[("WRITE", 4096)].verdict == "improvement"
+    assert rows[("WRITE", 8192)].verdict == "unchanged"
+
+
+def test_save_load(tmp_path):
+    filename = str(tmp_path / "base.npz")
+    base = Baseline({("READ", 4096): samples(1000)}, {"note": "x"})
+    base.save(filename)
+    loaded = Baseline.load(filename)
+    assert loaded.metadata == {"note": "x"}
+    np.testing.assert_array_equal(
+        loaded.samples[("READ", 4096)], base.samples[("READ", 4096)]
+    )
+
+
+def test_load_recording(tmp_path):
+    filename = str(tmp_path / "run.rec")
+    rec = Recorder(filename)
+    for iface, mode, duration_ns in (
+        (0, Mode.READ, 1000),
+        (1, Mode.READ, 2000),
+        (0, Mode.WRITE, 4000),
+    ):
+        rec.append(iface, TransferResult(mode, 4096, duration_ns, 0, 0), timestamp_ns=1)
+    rec.close()
+
+    base = Baseline.load(filename)
+    assert sorted(base.samples) == [("READ", 4096), ("WRITE", 4096)]
+    assert sorted(base.samples[("READ", 4096)]) == pytest.approx([2048, 4096])
+
+    base = Baseline.load(filename, interface=1)
+    assert list(base.samples) == [("READ", 4096)]
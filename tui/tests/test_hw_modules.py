@@ -0,0 +1,46 @@
+from HwModules import AVALON_ST_GEN_OFFS, AvalonStCheck, AvalonStGen
+from PpSpDevice import SimRegs
+
+
+class SpyRegs(SimRegs):
+    # records every word index read
+    def __init__(self, nr_words: int):
+        super().__init__(nr_words)
+        self.read = []
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            self.read.extend(range(*idx.indices(len(self))))
+        else:
+            self.read.append(idx)
+        return super().__getitem__(idx)
+
+
+def test_snapshot_reads_only_mapped_registers():
+    regs = SpyRegs(AVALON_ST_GEN_OFFS // 4 + 64)
+    base = AVALON_ST_GEN_OFFS // 4
+    for i in range(16):
+        regs.words[base + i] = 100 + i
+    gen = AvalonStGen(regs, AVALON_ST_GEN_OFFS)
+
+    regs.read.clear()
+    snap = gen.snapshot()
+    assert snap == {
+        "ID_REG": 100,
+        "VERSION": 101,
+        "STATUS": 104,
+        "CTRL": 105,
+        "SAMPLES": 108,
+        "SAMPLES_TX": 109,
+    }
+    assert sorted(regs.read) == [base + i for i in (0, 1, 4, 5, 8, 9)]
+
+
+def test_register_accessors():
+    regs = SpyRegs(64)
+    check = AvalonStCheck(regs, 0)
+    check.write_regs((("SAMP_OK", 7), ("VERSION", 2)))
+    assert check.read_regs("SAMP_OK", "VERSION") == (7, 2)
+    assert check.read_reg("SAMP_OK") == regs.words[5] == 7
+    check.write_reg("SAMP_TOT", 3)
+    assert check.get_stats() == (3, 7)
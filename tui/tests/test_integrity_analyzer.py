@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from IntegrityAnalyzer import IntegrityAnalyzer
+
+
+def counter(n):
+    return np.arange(n, dtype="uint16")
+
+
+@pytest.fixture
+def analyzer():
+    # small chunks so that runs cross chunk boundaries
+    return IntegrityAnalyzer(chunk_samples=64)
+
+
+def test_clean(analyzer):
+    rep = analyzer.analyze(counter(1000), counter(1000))
+    assert rep.ok
+    assert rep.samp_ok == rep.samp_tot == 2000
+    assert rep.summary() == "ok"
+
+
+def test_runs_across_chunks(analyzer):
+    exp = counter(1000)
+    act = exp.copy()
+    act[60:200] ^= 0x100
+    act[500] ^= 0x100
+    rep = analyzer.analyze(act, exp)
+    assert rep.mismatches == 141
+    assert rep.samp_ok == 2000 - 282
+    assert rep.runs == [(120, 280), (1000, 2)]
+    assert rep.longest_run_bytes == 280
+    assert rep.first_bad_offset == 120
+    assert rep.last_bad_offset == 1000
+    # 140 samples fall in 2**7..2**8-1, 1 sample in 2**0
+    assert rep.run_length_hist[7] == 1
+    assert rep.run_length_hist[0] == 1
+    assert rep.diagnosis() == "stuck bit 8"
+
+
+def test_tail_truncation(analyzer):
+    exp = counter(1000)
+    act = exp.copy()
+    act[600:] = 0
+    rep = analyzer.analyze(act, exp)
+    assert rep.diagnosis() == "tail truncation after 1200 B"
+
+
+def test_whole_tlp_runs(analyzer):
+    exp = counter(1024)
+    act = exp.copy()
+    act[128:256] = 0xFFFF
+    act[512:576] = 0xFFFF
+    rep = analyzer.analyze(act, exp)
+    assert rep.nr_runs == 2
+    assert rep.diagnosis(tlp_bytes=128) == "2 run(s) of whole 128 B payloads"
+    assert rep.diagnosis() == "mixed errors"
+
+
+def test_scattered(analyzer):
+    exp = counter(1000)
+    act = exp.copy()
+    act[[10, 300, 700]] ^= 0x3
+    rep = analyzer.analyze(act, exp)
+    assert rep.nr_runs == 3
+    assert list(np.flatnonzero(rep.bit_flips)) == [0, 1]
+    assert rep.diagnosis() == "scattered single-sample errors"
+    assert rep.segments.sum() == 3
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import PcieStats
+from PcieStats import PcieStats as Stats, PcieTopology, parse_cpulist
+
+
+def make_device(driver, pci_addr, char_dev, width="8", speed="8.0 GT/s PCIe"):
+    path = driver / pci_addr
+    (path / "pp_sp_pcie" / char_dev).mkdir(parents=True)
+    for name, val in (
+        ("current_link_width", width),
+        ("current_link_speed", speed),
+        ("subsystem_vendor", "0x1a2"),
+        ("subsystem_device", "0x0001"),
+        ("numa_node", "-1"),
+        ("local_cpulist", "0-3"),
+    ):
+        (path / name).write_text(val + "\n")
+    (path / "config").write_bytes(bytes(64))
+
+
+@pytest.fixture
+def driver(tmp_path, monkeypatch):
+    monkeypatch.setattr(PcieStats, "SYSFS_DRIVER_PATH", str(tmp_path))
+    monkeypatch.setattr(PcieTopology, "_interfaces", None)
+    Stats.get_stats_by_addr.cache_clear()
+    yield tmp_path
+    Stats.get_stats_by_addr.cache_clear()
+
+
+def test_get_stats_looks_up_the_char_dev(driver, tmp_path):
+    make_device(driver, "0000:01:00.0", "ppsp0", width="4")
+    make_device(driver, "0000:02:00.0", "ppsp1", width="8")
+
+    # the char dev name does not hold the address, and may be a link
+    link = tmp_path / "card1"
+    os.symlink("/dev/ppsp1", link)
+    assert PcieTopology.pci_addr(str(link)) == "0000:02:00.0"
+    assert Stats.get_stats("/dev/ppsp0").link_width == "4"
+    assert Stats.get_stats(str(link)).link_width == "8"
+    assert Stats.get_stats("/dev/ppsp0").local_cpus == [0, 1, 2, 3]
+
+
+def test_get_stats_falls_back_to_the_name(driver):
+    make_device(driver, "0000:03:00.0", "ppsp0")
+    PcieTopology.scan()
+    # bound after the scan, found by the address in the driver's naming
+    make_device(driver, "0000:04:00.0", "ppsp1", width="16")
+    assert PcieTopology.pci_addr("/dev/pp_sp_pcie_0000:04:00.0") is None
+    assert Stats.get_stats("/dev/pp_sp_pcie_0000:04:00.0").link_width == "16"
+
+
+def test_parse_cpulist():
+    assert parse_cpulist("0-2,8,10-11\n") == [0, 1, 2, 8, 10, 11]
+    assert parse_cpulist("") == []
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from TransferEngine import TransferResult
+from QueueMsg import Mode, RespChannel
+from Recorder import Recorder, Recording
+
+
+def result(mode=Mode.READ, size_bytes=4096, duration_ns=2000):
+    return TransferResult(mode, size_bytes, duration_ns, size_bytes, size_bytes)
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / "run.rec")
+
+
+def test_round_trip(filename):
+    rec = Recorder(filename, {"interfaces": ["sim"]}, chunk=4)
+    for i in range(10):
+        rec.append(i % 2, result(duration_ns=1000 + i), timestamp_ns=100 + i)
+    rec.close()
+
+    recording = Recording(filename)
+    assert recording.metadata == {"interfaces": ["sim"]}
+    assert len(recording) == 10
+    r = recording.records
+    assert list(r["timestamp_ns"]) == list(range(100, 110))
+    assert list(r["duration_ns"]) == list(range(1000, 1010))
+    assert list(r["interface"]) == [0, 1] * 5
+    assert np.all(r["mode"] == Mode.READ.value)
+    assert recording.throughput_mbps()[0] == pytest.approx(4096)
+
+
+def test_close_drops_preallocated_tail(filename):
+    rec = Recorder(filename, chunk=1000)
+    rec.append(0, result())
+    rec.close()
+    recording = Recording(filename)
+    assert len(recording) == 1
+
+
+def test_empty(filename):
+    Recorder(filename).close()
+    recording = Recording(filename)
+    assert len(recording) == 0
+    assert recording.summarize() == []
+
+
+def test_recovers_records_after_unclean_close(filename):
+    rec = Recorder(filename, chunk=16)
+    for i in range(3):
+        rec.append(0, result(), timestamp_ns=1 + i)
+    rec.flush()
+    # appended after the last flush and never closed, e.g. a crash; the
+    # shared mapping makes them visible to readers of the file right away
+    for i in range(3, 7):
+        rec.append(0, result(), timestamp_ns=1 + i)
+
+    recording = Recording(filename)
+    assert len(recording) == 7
+    assert list(recording.records["timestamp_ns"]) == list(range(1, 8))
+    rec.close()
+
+
+def test_not_a_recording(tmp_path):
+    filename = tmp_path / "junk"
+    filename.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        Recording(str(filename))
+
+
+def test_summarize(filename):
+    rec = Recorder(filename)
+    for d in (1000, 2000, 3000):
+        rec.append(0, result(Mode.WRITE, 1024, d), timestamp_ns=d)
+    rec.append(1, result(Mode.READ, 2048, 1000), timestamp_ns=4000)
+    rec.close()
+
+    rows = Recording(filename).summarize()
+    assert [(r["interface"], r["mode"], r["size_bytes"], r["count"]) for r in rows] == [
+        (0, "WRITE", 1024, 3),
+        (1, "READ", 2048, 1),
+    ]
+    assert rows[0]["duration_median_ns"] == 2000
+    assert rows[0]["samp_tot"] == 3 * 1024
+
+
+def test_replay(filename):
+    rec = Recorder(filename)
+    rec.append(0, result(Mode.WRITE, 1000, 1000), timestamp_ns=1)
+    rec.append(1, result(Mode.READ, 2000, 1000), timestamp_ns=2)
+    rec.close()
+
+    channels = [RespChannel(), RespChannel()]
+    Recording(filename).replay(channels, speed=0)
+    assert channels[0].latest.write_throughput == pytest.approx(1000)
+    assert channels[0].latest.read_throughput == 0
+    assert channels[1].latest.read_throughput == pytest.approx(2000)
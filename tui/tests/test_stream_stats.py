@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pytest
+
+from StreamStats import StreamStats
+
+
+def test_empty():
+    s = StreamStats()
+    assert s.count == 0
+    assert math.isnan(s.window_mean)
+    assert math.isnan(s.window_min)
+    assert math.isnan(s.total_mean)
+    assert all(math.isnan(p) for p in s.percentiles(50, 99))
+
+
+def test_window_matches_brute_force():
+    rng = np.random.default_rng(1)
+    vals = rng.uniform(1, 1000, 1000)
+    s = StreamStats(window=37)
+    for i, v in enumerate(vals):
+        s.update(v)
+        win = vals[max(0, i - 36) : i + 1]
+        assert s.window_min == win.min()
+        assert s.window_max == win.max()
+        assert s.window_mean == pytest.approx(win.mean())
+    assert s.total_min == vals.min()
+    assert s.total_max == vals.max()
+    assert s.total_mean == pytest.approx(vals.mean())
+
+
+def test_ewma():
+    s = StreamStats(ewma_alpha=0.5)
+    for v in (10, 20, 40):
+        s.update(v)
+    assert s.ewma == pytest.approx(27.5)
+
+
+def test_percentiles_within_bin_width():
+    rng = np.random.default_rng(2)
+    vals = rng.lognormal(10, 1, 20000)
+    s = StreamStats(bins_per_decade=50)
+    for v in vals:
+        s.update(v)
+    rel = 10 ** (1 / 50) - 1
+    for q, got in zip((1, 50, 99, 99.9), s.percentiles(1, 50, 99, 99.9)):
+        assert got == pytest.approx(np.percentile(vals, q), rel=rel)
+    assert s.p50 <= s.p99 <= s.p999 <= s.total_max
+
+
+def test_percentiles_of_underflow_and_overflow():
+    s = StreamStats(hist_min=1, hist_max=100)
+    for v in (0, 0, 0, 1000):
+        s.update(v)
+    p50, p100 = s.percentiles(50, 100)
+    assert p50 == 0
+    # the overflow bin only tells that a sample was beyond hist_max
+    assert 100 <= p100 <= 1000
+
+
+def test_reset():
+    s = StreamStats()
+    s.update(5)
+    s.reset()
+    assert s.count == 0
+    assert s.last is None
+    assert sum(s.hist) == 0
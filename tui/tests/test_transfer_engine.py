@@ -0,0 +1,117 @@
+import errno
+
+import numpy as np
+import pytest
+
+from HwModules import AVALON_ST_CHECK_OFFS, AVALON_ST_GEN_OFFS
+from TransferEngine import TransferEngine
+from PayloadStager import PrbsPayload
+from PpSpDevice import DMA_BUFFER_SIZE, SimDevice
+from QueueMsg import Mode
+
+
+@pytest.fixture
+def dev():
+    return SimDevice(realtime=False)
+
+
+def test_sim_register_model(dev):
+    gen = AVALON_ST_GEN_OFFS // 4
+    check = AVALON_ST_CHECK_OFFS // 4
+    regs = dev.regs32
+
+    # CTRL start sets the busy bit and clears the transmitted count
+    regs[gen + 0x24 // 4] = 123
+    regs[gen + 0x20 // 4] = 4096
+    regs[gen + 0x14 // 4] = 1
+    assert regs[gen + 0x10 // 4] == 1
+    assert regs[gen + 0x24 // 4] == 0
+
+    # any write to SAMP_TOT clears both checker counters
+    regs[check + 0x10 // 4] = 5
+    regs[check + 0x14 // 4] = 7
+    regs[check + 0x10 // 4] = 1
+    assert (regs[check + 0x10 // 4], regs[check + 0x14 // 4]) == (0, 0)
+
+
+def test_sim_start_tx_and_buffers(dev):
+    buf = bytearray(DMA_BUFFER_SIZE)
+    u16 = np.frombuffer(buf, dtype="uint16")
+    u16[:] = np.arange(len(u16), dtype="uint16")
+    dev.set_buffer(buf)
+    assert dev.dma_buf == buf
+
+    assert dev.start_tx(0, 1024) == dev.model_duration_ns(1024)
+
+    # a WRITE without a started generator leaves host memory alone
+    dev.start_tx(1, 1024)
+    out = bytearray(DMA_BUFFER_SIZE)
+    dev.get_buffer(out)
+    assert out == buf
+
+
+@pytest.mark.parametrize("size_bytes", [2, 1026, 0, DMA_BUFFER_SIZE + 4])
+def test_sim_start_tx_rejects_bad_sizes(dev, size_bytes):
+    with pytest.raises(OSError) as exc:
+        dev.start_tx(0, size_bytes)
+    assert exc.value.errno == errno.EINVAL
+
+
+def test_transfer_write(dev):
+    engine = TransferEngine(dev)
+    res = engine.transfer(Mode.WRITE, 4096)
+    assert res.mode == Mode.WRITE
+    assert res.duration_ns == dev.model_duration_ns(4096)
+    assert (res.samp_tot, res.samp_ok) == (4096, 4096)
+    assert res.integrity.ok
+
+
+def test_transfer_write_localizes_errors(dev):
+    engine = TransferEngine(dev)
+    get_buffer = dev.get_buffer
+
+    def corrupt(buf):
+        get_buffer(buf)
+        buf[256:512] = b"\xff" * 256
+
+    dev.get_buffer = corrupt
+    res = engine.transfer(Mode.WRITE, 4096)
+    assert res.samp_tot == 4096
+    assert res.samp_ok == 4096 - 256
+    assert res.integrity.first_bad_offset == 256
+    assert res.integrity.last_bad_offset == 510
+    assert res.integrity.nr_runs == 1
+
+
+def test_transfer_read(dev):
+    engine = TransferEngine(dev)
+    res = engine.transfer(Mode.READ, 8192)
+    assert res.mode == Mode.READ
+    assert (res.samp_tot, res.samp_ok) == (8192, 8192)
+    assert res.samp_expected == 8192
+
+    # the checker counters are cleared before every transfer
+    res = engine.transfer(Mode.READ, 1024)
+    assert (res.samp_tot, res.samp_ok) == (1024, 1024)
+
+
+def test_transfer_read_of_other_payload(dev):
+    engine = TransferEngine(dev, payload=PrbsPayload())
+    res = engine.transfer(Mode.READ, 8192)
+    assert res.samp_tot == 8192
+    assert res.samp_ok < 8192
+    assert res.samp_ok == res.samp_expected
+
+
+def test_transfer_rejects_size_not_multiple_of_4(dev):
+    engine = TransferEngine(dev)
+    with pytest.raises(OSError) as exc:
+        engine.transfer(Mode.READ, 1026)
+    assert exc.value.errno == errno.EINVAL
+
+
+@pytest.mark.parametrize("mode", [Mode.IDLE, Mode.DUPLEX])
+def test_transfer_rejects_non_directions(dev, mode):
+    engine = TransferEngine(dev)
+    with pytest.raises(ValueError):
+        engine.transfer(mode, 1024)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from TransferEngine import TransferResult
+from QueueMsg import Mode
+from Recorder import Recorder, Recording
+from TransferModel import fit_line, fit_recording
+
+
+def synthetic(t0_ns=5000.0, mbps=3000.0, n=50, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = np.repeat([1024, 4096, 16384, 65536, 262144], n)
+    durations = (t0_ns + sizes * 1e3 / mbps) * (1 + rng.normal(0, noise, len(sizes)))
+    return sizes, durations
+
+
+def test_fit_line():
+    sizes, durations = synthetic()
+    beta, rel, scale = fit_line(sizes, durations)
+    assert beta[0] == pytest.approx(5000, rel=0.02)
+    assert 1e3 / beta[1] == pytest.approx(3000, rel=0.01)
+    assert scale == pytest.approx(0.01, rel=0.2)
+
+
+def test_fit_line_ignores_outliers():
+    sizes, durations = synthetic()
+    durations[::25] *= 20
+    beta, rel, scale = fit_line(sizes, durations)
+    assert beta[0] == pytest.approx(5000, rel=0.02)
+    assert 1e3 / beta[1] == pytest.approx(3000, rel=0.01)
+
+
+def test_fit_line_needs_two_sizes():
+    with pytest.raises(ValueError):
+        fit_line(np.full(10, 4096), np.full(10, 1000.0))
+
+
+def test_fit_recording(tmp_path):
+    filename = str(tmp_path / "run.rec")
+    rec = Recorder(filename)
+    sizes, durations = synthetic(noise=0.001)
+    for i, (size, duration) in enumerate(zip(sizes, durations)):
+        res = TransferResult(Mode.READ, int(size), int(duration), 0, 0)
+        rec.append(0, res, timestamp_ns=1 + i)
+    # a single stalled transfer
+    rec.append(0, TransferResult(Mode.READ, 4096, 10**6, 0, 0), timestamp_ns=10**6)
+    # a single size, nothing to fit
+    rec.append(1, TransferResult(Mode.WRITE, 4096, 2000, 0, 0), timestamp_ns=10**6)
+    rec.close()
+
+    fits = fit_recording(Recording(filename))
+    assert len(fits) == 1
+    fit = fits[0]
+    assert (fit.interface, fit.mode, fit.nr_transfers) == (0, "READ", len(sizes) + 1)
+    assert fit.t0_ns == pytest.approx(5000, rel=0.01)
+    assert fit.bandwidth_mbps == pytest.approx(3000, rel=0.01)
+    assert fit.half_bandwidth_bytes == pytest.approx(5000 * 3000 / 1e3, rel=0.02)
+    assert fit.nr_outliers == 1
+    assert fit.outliers[0].index == len(sizes)
+    assert fit.predict_ns(4096) == pytest.approx(5000 + 4096 / 3, rel=0.01)
+    assert [s.size_bytes for s in fit.sizes] == [1024, 4096, 16384, 65536, 262144]